@@ -1,9 +1,11 @@
 from django.contrib import admin
+from audit.mixins import AuditoriaAdminMixin
+from permuta_aulas.admin import ContagemLimitadaPaginator
 from .models import Professor
 
 
 @admin.register(Professor)
-class ProfessorAdmin(admin.ModelAdmin):
+class ProfessorAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = (
         "nome",
         "matricula_siape",
@@ -20,5 +22,12 @@ class ProfessorAdmin(admin.ModelAdmin):
         "matricula_siape",
         "cpf",
     )
-    list_filter = ("coordenacao", "usuario_admin")
+    # Só os administradores que de fato cadastraram professores
+    list_filter = ("coordenacao", ("usuario_admin", admin.RelatedOnlyFieldListFilter))
+    list_select_related = ("user", "usuario_admin")
+    autocomplete_fields = ("user",)
+    date_hierarchy = "data_cadastro"
     ordering = ("user__first_name", "user__last_name")
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
@@ -0,0 +1,39 @@
+"""
+Backend de autenticação que guarda no cache o usuário da sessão.
+
+O ModelBackend carrega o User do banco em toda requisição autenticada
+(get_user). Aqui o User fica no cache por alguns minutos e é descartado
+sempre que o usuário é salvo ou excluído (ver accounts.signals), o que
+inclui troca de senha, desativação e o last_login do login.
+
+O descarte só chega aos outros processos se o cache for compartilhado entre
+eles; por isso SESSAO_EM_CACHE recusa o LocMemCache (ver settings).
+"""
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+TEMPO_CACHE = 300
+
+
+def _chave(usuario_id):
+    return f"accounts:usuario:{usuario_id}"
+
+
+class ModelBackendEmCache(ModelBackend):
+    """
+    ModelBackend com get_user lido do cache.
+    """
+
+    def get_user(self, user_id):
+        chave = _chave(user_id)
+        usuario = cache.get(chave)
+        if usuario is None:
+            # Usuário inexistente ou inativo não vai para o cache
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                cache.set(chave, usuario, TEMPO_CACHE)
+        return usuario
+
+
+def invalidar_usuario(usuario_id):
+    cache.delete(_chave(usuario_id))
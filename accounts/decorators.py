@@ -0,0 +1,26 @@
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+
+def professor_required(view):
+    """
+    Exige usuário logado com cadastro de Professor.
+
+    Sem cadastro, mostra a página explicando como vincular o professor ao
+    usuário. A view usa ``request.professor`` (ver ProfessorMiddleware).
+    """
+
+    @login_required
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.professor is None:
+            return render(
+                request,
+                "professor/sem_professor.html",
+                {"usuario": request.user},
+            )
+        return view(request, *args, **kwargs)
+
+    return _view
@@ -0,0 +1,15 @@
+from .perfil import obter_professor
+
+
+class ProfessorMiddleware:
+    """
+    Disponibiliza ``request.professor``: o cadastro de Professor do usuário
+    logado, ou None.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.professor = obter_professor(getattr(request, "user", None))
+        return self.get_response(request)
@@ -0,0 +1,46 @@
+"""
+Cadastro de Professor do usuário logado.
+
+O professor é resolvido uma vez por requisição (ver ProfessorMiddleware).
+Com PROFESSOR_EM_CACHE, fica também no cache por alguns minutos, já com o
+User carregado, e é invalidado sempre que o Professor ou o User é salvo ou
+excluído. A invalidação só chega aos outros processos se o cache for
+compartilhado entre eles; por isso a opção recusa o LocMemCache (ver
+settings).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Professor
+
+TEMPO_CACHE = 300
+
+# Marca de "usuário sem professor" no cache (None significa "não está no cache")
+_SEM_PROFESSOR = 0
+
+
+def _chave(usuario_id):
+    return f"accounts:professor_do_usuario:{usuario_id}"
+
+
+def obter_professor(usuario):
+    """
+    Retorna o Professor vinculado ao usuário, ou None.
+    """
+    if usuario is None or not usuario.is_authenticated:
+        return None
+
+    consulta = Professor.objects.select_related("user").filter(user_id=usuario.pk)
+    if not getattr(settings, "PROFESSOR_EM_CACHE", False):
+        return consulta.first()
+
+    chave = _chave(usuario.pk)
+    professor = cache.get(chave)
+    if professor is None:
+        professor = consulta.first()
+        cache.set(chave, professor or _SEM_PROFESSOR, TEMPO_CACHE)
+    return professor or None
+
+
+def invalidar_professor(usuario_id):
+    cache.delete(_chave(usuario_id))
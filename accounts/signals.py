@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidar_usuario
+from .models import Professor
+from .perfil import invalidar_professor
+
+
+@receiver(post_save, sender=Professor)
+@receiver(post_delete, sender=Professor)
+def invalidar_cache_professor(sender, instance, **kwargs):
+    invalidar_professor(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    invalidar_professor(instance.pk)
+    invalidar_usuario(instance.pk)
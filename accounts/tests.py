@@ -1,3 +1,111 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from accounts.models import Professor
+from accounts.perfil import obter_professor
+
+SESSAO_BANCO = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+}
+SESSAO_CACHE = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+    "AUTHENTICATION_BACKENDS": ["accounts.backends.ModelBackendEmCache"],
+}
+
+
+class SessaoEmCacheTest(TestCase):
+    """
+    Compara as consultas de uma página autenticada com sessão e usuário
+    lidos do banco (padrão do Django) e do cache (SESSAO_EM_CACHE).
+    """
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser("coord", "coord@exemplo.com", "senha")
+        self.usuario = User.objects.create_user("professor", password="senha")
+        Professor.objects.create(
+            user=self.usuario,
+            matricula_siape="1000",
+            cpf="52998224725",
+            coordenacao="Informática",
+            usuario_admin=admin,
+        )
+
+    def _consultas(self, configuracao):
+        """
+        Consultas da segunda requisição à página de horários (a primeira
+        aquece os caches): (total, consultas à sessão e ao usuário).
+        """
+        with override_settings(**configuracao):
+            cliente = Client()
+            cliente.force_login(self.usuario)
+            self.assertEqual(cliente.get("/professor/horarios/").status_code, 200)
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(cliente.get("/professor/horarios/").status_code, 200)
+        sessao_usuario = [
+            consulta["sql"]
+            for consulta in consultas.captured_queries
+            if '"django_session"' in consulta["sql"] or 'FROM "auth_user"' in consulta["sql"]
+        ]
+        return len(consultas), sessao_usuario
+
+    def test_sessao_e_usuario_sem_consultas(self):
+        total_banco, sessao_banco = self._consultas(SESSAO_BANCO)
+        total_cache, sessao_cache = self._consultas(SESSAO_CACHE)
+
+        # Banco: uma consulta para a sessão e outra para o usuário
+        self.assertEqual(len(sessao_banco), 2, sessao_banco)
+        self.assertEqual(sessao_cache, [])
+        self.assertEqual(total_cache, total_banco - 2)
+
+    def test_usuario_salvo_sai_do_cache(self):
+        with override_settings(**SESSAO_CACHE):
+            cliente = Client()
+            cliente.force_login(self.usuario)
+            cliente.get("/professor/horarios/")
+
+            self.usuario.is_active = False
+            self.usuario.save()
+
+            resposta = cliente.get("/professor/horarios/")
+        # Usuário desativado: volta para o login
+        self.assertEqual(resposta.status_code, 302)
+
+
+class ProfessorEmCacheTest(TestCase):
+    """
+    O professor do usuário só fica no cache com PROFESSOR_EM_CACHE; sem a
+    opção, é lido do banco a cada chamada.
+    """
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser("coord", "coord@exemplo.com", "senha")
+        self.usuario = User.objects.create_user("professor")
+        self.professor = Professor.objects.create(
+            user=self.usuario,
+            matricula_siape="1000",
+            cpf="52998224725",
+            coordenacao="Informática",
+            usuario_admin=admin,
+        )
+
+    def test_sem_a_opcao_le_do_banco(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(obter_professor(self.usuario), self.professor)
+
+    @override_settings(PROFESSOR_EM_CACHE=True)
+    def test_com_a_opcao_usa_o_cache_ate_a_alteracao(self):
+        with self.assertNumQueries(1):
+            obter_professor(self.usuario)
+        with self.assertNumQueries(0):
+            self.assertEqual(obter_professor(self.usuario).coordenacao, "Informática")
+
+        self.professor.coordenacao = "Matemática"
+        self.professor.save()
+        self.assertEqual(obter_professor(self.usuario).coordenacao, "Matemática")
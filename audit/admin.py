@@ -1,3 +1,34 @@
 from django.contrib import admin
+from permuta_aulas.admin import ContagemLimitadaPaginator
+from .models import EventoAuditoria
 
-# Register your models here.
+
+@admin.register(EventoAuditoria)
+class EventoAuditoriaAdmin(admin.ModelAdmin):
+    list_display = (
+        "data_hora",
+        "acao",
+        "modelo",
+        "objeto_id",
+        "permuta_id",
+        "status_anterior",
+        "status_novo",
+        "usuario",
+    )
+    list_filter = ("acao", "modelo")
+    list_select_related = ("usuario",)
+    search_fields = ("=permuta_id", "=objeto_id", "usuario__username")
+    date_hierarchy = "data_hora"
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    # O log é somente inclusão: nada pode ser criado, alterado ou excluído aqui
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
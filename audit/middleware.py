@@ -0,0 +1,18 @@
+from . import registro
+
+
+class AuditoriaMiddleware:
+    """
+    Associa os eventos de auditoria ao usuário da requisição e grava o
+    buffer de eventos ao final de cada requisição.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registro.iniciar_requisicao(getattr(request, "user", None))
+        try:
+            return self.get_response(request)
+        finally:
+            registro.finalizar_requisicao()
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 06:34
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_hora', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data/hora do evento')),
+                ('acao', models.CharField(choices=[('CRIACAO', 'Criação'), ('ALTERACAO', 'Alteração'), ('TRANSICAO', 'Mudança de status'), ('EXCLUSAO', 'Exclusão'), ('ADMIN', 'Ação no admin')], max_length=10, verbose_name='Ação')),
+                ('modelo', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID do objeto')),
+                ('permuta_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID da permuta')),
+                ('status_anterior', models.CharField(blank=True, max_length=20, verbose_name='Status anterior')),
+                ('status_novo', models.CharField(blank=True, max_length=20, verbose_name='Status novo')),
+                ('alteracoes', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Campos alterados no formato {campo: [valor anterior, valor novo]}.', verbose_name='Alterações')),
+                ('descricao', models.TextField(blank=True, verbose_name='Descrição')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos_auditoria', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Evento de auditoria',
+                'verbose_name_plural': 'Eventos de auditoria',
+                'ordering': ['-data_hora', '-id'],
+                'indexes': [models.Index(fields=['permuta_id', '-data_hora'], name='audit_evento_permuta_idx'), models.Index(fields=['usuario', '-data_hora'], name='audit_evento_usuario_idx'), models.Index(fields=['modelo', 'objeto_id'], name='audit_evento_objeto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from . import registro
+
+
+class AuditoriaAdminMixin:
+    """
+    Registra na auditoria as inclusões, alterações e exclusões feitas pelo admin.
+    Deve vir antes de admin.ModelAdmin na lista de bases.
+    """
+
+    def _auditar_admin(self, request, obj, descricao, mensagem=None):
+        if obj._meta.label == "permuta.Permuta":
+            permuta_id = obj.pk
+        else:
+            permuta_id = getattr(obj, "permuta_id", None)
+        registro.registrar(
+            "ADMIN",
+            obj,
+            usuario=request.user,
+            permuta_id=permuta_id,
+            alteracoes={"admin": mensagem} if mensagem else None,
+            descricao=descricao,
+        )
+
+    def log_addition(self, request, obj, message):
+        self._auditar_admin(request, obj, f"Incluído pelo admin: {obj}", message)
+        return super().log_addition(request, obj, message)
+
+    def log_change(self, request, obj, message):
+        self._auditar_admin(request, obj, f"Alterado pelo admin: {obj}", message)
+        return super().log_change(request, obj, message)
+
+    def log_deletions(self, request, queryset):
+        for obj in queryset:
+            self._auditar_admin(request, obj, f"Excluído pelo admin: {obj}")
+        return super().log_deletions(request, queryset)
@@ -1,3 +1,116 @@
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class EventoAuditoriaQuerySet(models.QuerySet):
+    def da_permuta(self, permuta_id):
+        """
+        Linha do tempo de uma permuta (inclui a reposição), mais recentes primeiro.
+        """
+        return self.filter(permuta_id=permuta_id).order_by("-data_hora", "-id")
+
+    def do_usuario(self, usuario):
+        """
+        Linha do tempo das ações de um usuário, mais recentes primeiro.
+        """
+        return self.filter(usuario=usuario).order_by("-data_hora", "-id")
+
+    def update(self, **kwargs):
+        raise ValueError("Eventos de auditoria não podem ser alterados.")
+
+    def delete(self):
+        raise ValueError("Eventos de auditoria não podem ser excluídos.")
+
+
+class EventoAuditoria(models.Model):
+    """
+    Registro imutável (somente inclusão) de uma mudança em permutas,
+    reposições ou cadastros feitos pelo admin.
+    """
+
+    ACAO_CHOICES = [
+        ("CRIACAO", "Criação"),
+        ("ALTERACAO", "Alteração"),
+        ("TRANSICAO", "Mudança de status"),
+        ("EXCLUSAO", "Exclusão"),
+        ("ADMIN", "Ação no admin"),
+    ]
+
+    data_hora = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Data/hora do evento"
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="eventos_auditoria",
+        verbose_name="Usuário"
+    )
+    acao = models.CharField(
+        max_length=10,
+        choices=ACAO_CHOICES,
+        verbose_name="Ação"
+    )
+    modelo = models.CharField(
+        max_length=100,
+        verbose_name="Modelo"
+    )
+    objeto_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="ID do objeto"
+    )
+    # Sem chave estrangeira: o histórico precisa sobreviver à exclusão da permuta
+    permuta_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="ID da permuta"
+    )
+    status_anterior = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name="Status anterior"
+    )
+    status_novo = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name="Status novo"
+    )
+    alteracoes = models.JSONField(
+        default=dict,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+        verbose_name="Alterações",
+        help_text="Campos alterados no formato {campo: [valor anterior, valor novo]}."
+    )
+    descricao = models.TextField(
+        blank=True,
+        verbose_name="Descrição"
+    )
+
+    objects = EventoAuditoriaQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Evento de auditoria"
+        verbose_name_plural = "Eventos de auditoria"
+        ordering = ["-data_hora", "-id"]
+        indexes = [
+            models.Index(fields=["permuta_id", "-data_hora"], name="audit_evento_permuta_idx"),
+            models.Index(fields=["usuario", "-data_hora"], name="audit_evento_usuario_idx"),
+            models.Index(fields=["modelo", "objeto_id"], name="audit_evento_objeto_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_acao_display()} em {self.modelo} #{self.objeto_id} ({self.data_hora:%d/%m/%Y %H:%M})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Eventos de auditoria não podem ser alterados.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Eventos de auditoria não podem ser excluídos.")
@@ -0,0 +1,170 @@
+"""
+Gravação em lote dos eventos de auditoria.
+
+Os eventos não são inseridos um a um: ficam em um buffer por thread e são
+gravados com bulk_create.
+
+- Dentro de uma transação, os eventos são gravados no commit (on_commit).
+  Se a transação (ou o savepoint) for desfeita, os eventos são descartados.
+- Fora de transação, durante uma requisição, o buffer é gravado ao fim da
+  requisição (middleware) ou ao atingir TAMANHO_LOTE eventos.
+- Fora de transação e fora de requisição (comandos, shell), o evento é
+  gravado imediatamente.
+"""
+import logging
+import threading
+import time
+import weakref
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 200
+TENTATIVAS_GRAVACAO = 10
+
+_local = threading.local()
+
+
+def iniciar_requisicao(usuario):
+    """
+    Passa a acumular os eventos desta thread até finalizar_requisicao(),
+    atribuindo-os ao usuário informado.
+    """
+    _local.usuario = usuario
+    _local.buffer = []
+
+
+def finalizar_requisicao():
+    """
+    Grava os eventos acumulados e volta ao modo de gravação imediata.
+    """
+    try:
+        descarregar()
+    finally:
+        _local.usuario = None
+        _local.buffer = None
+
+
+def usuario_atual():
+    return getattr(_local, "usuario", None)
+
+
+def _gravar(eventos, using=DEFAULT_DB_ALIAS):
+    """
+    Insere os eventos; tenta de novo se o banco estiver bloqueado.
+
+    A gravação costuma acontecer depois do commit da operação auditada, que
+    já foi aplicada: nesse caso uma falha é informada, mas não propagada,
+    para não fazer a operação parecer ter falhado.
+    """
+    from .models import EventoAuditoria
+
+    if not eventos:
+        return
+    for tentativa in range(TENTATIVAS_GRAVACAO):
+        try:
+            EventoAuditoria.objects.using(using).bulk_create(eventos, batch_size=TAMANHO_LOTE)
+            return
+        except OperationalError:
+            if transaction.get_connection(using).in_atomic_block:
+                raise
+            if tentativa == TENTATIVAS_GRAVACAO - 1:
+                logger.exception("Erro ao gravar %d evento(s) de auditoria", len(eventos))
+                return
+            time.sleep(min(0.01 * 2 ** tentativa, 0.2))
+
+
+def _buffer_da_transacao(using):
+    """
+    Lista de eventos do savepoint atual, gravada uma única vez no commit.
+
+    Cada lista é registrada pelo alias e pelo savepoint mais interno (os IDs
+    de savepoint não se repetem na mesma conexão). A gravação fica com o
+    on_commit; a lista guarda só uma referência fraca à função, que deixa de
+    existir quando o Django a executa ou a descarta (rollback). Assim uma
+    transação desfeita não deixa eventos para a próxima.
+    """
+    conexao = transaction.get_connection(using)
+    transacoes = getattr(_local, "transacoes", None)
+    if transacoes is None:
+        transacoes = _local.transacoes = {}
+
+    savepoint = conexao.savepoint_ids[-1] if conexao.savepoint_ids else None
+    chave = (using, savepoint)
+    estado = transacoes.get(chave)
+    if estado is not None and estado[0]() is not None:
+        return estado[1]
+
+    # Descarta estados de savepoints encerrados e transações desfeitas
+    for outra, (referencia, _) in list(transacoes.items()):
+        if referencia() is None or (outra[1] is not None and outra[1] not in conexao.savepoint_ids):
+            del transacoes[outra]
+
+    eventos = []
+
+    def gravar():
+        if transacoes.get(chave, (None,))[0] is referencia:
+            del transacoes[chave]
+        _gravar(eventos, using)
+
+    referencia = weakref.ref(gravar)
+    transaction.on_commit(gravar, using=using)
+    transacoes[chave] = (referencia, eventos)
+    return eventos
+
+
+def registrar(acao, instancia=None, *, usuario=None, modelo="", objeto_id=None,
+              permuta_id=None, status_anterior="", status_novo="", alteracoes=None,
+              descricao="", using=DEFAULT_DB_ALIAS):
+    """
+    Enfileira um evento de auditoria.
+
+    Quando ``instancia`` é informada, modelo e objeto_id são obtidos dela.
+    Sem ``usuario``, usa o usuário da requisição atual (ver middleware).
+    """
+    from .models import EventoAuditoria
+
+    if instancia is not None:
+        modelo = modelo or instancia._meta.label
+        objeto_id = instancia.pk if objeto_id is None else objeto_id
+
+    if usuario is None:
+        usuario = usuario_atual()
+    usuario_id = usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+    evento = EventoAuditoria(
+        data_hora=timezone.now(),
+        usuario_id=usuario_id,
+        acao=acao,
+        modelo=modelo,
+        objeto_id=objeto_id,
+        permuta_id=permuta_id,
+        status_anterior=status_anterior or "",
+        status_novo=status_novo or "",
+        alteracoes=alteracoes or {},
+        descricao=descricao,
+    )
+
+    if transaction.get_connection(using).in_atomic_block:
+        _buffer_da_transacao(using).append(evento)
+        return
+
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        _gravar([evento], using)
+        return
+    buffer.append(evento)
+    if len(buffer) >= TAMANHO_LOTE:
+        descarregar()
+
+
+def descarregar():
+    """
+    Grava os eventos acumulados fora de transação nesta thread.
+    """
+    buffer = getattr(_local, "buffer", None)
+    if buffer:
+        _local.buffer = []
+        _gravar(buffer)
@@ -0,0 +1,128 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from permuta.models import Permuta, Reposicao
+from permuta.signals import permutas_criadas, status_alterado
+
+from . import registro
+
+# Campos acompanhados em cada modelo auditado
+CAMPOS_AUDITADOS = {
+    Permuta: (
+        "status",
+        "data_aula",
+        "motivo",
+        "professor_substituto_id",
+        "horario_id",
+        "data_decisao",
+        "usuario_decisor_id",
+    ),
+    Reposicao: (
+        "data_reposicao",
+        "observacao",
+    ),
+}
+
+
+def _permuta_id(instancia):
+    return instancia.pk if isinstance(instancia, Permuta) else instancia.permuta_id
+
+
+def _valores(instancia):
+    # __dict__, como em permuta.signals: um getattr em campo adiado
+    # (.only()/.defer()) recarregaria a instância e dispararia post_init de
+    # novo. Campos não carregados ficam de fora.
+    valores = instancia.__dict__
+    return {
+        campo: valores[campo]
+        for campo in CAMPOS_AUDITADOS[type(instancia)]
+        if campo in valores
+    }
+
+
+@receiver(post_init, sender=Permuta)
+@receiver(post_init, sender=Reposicao)
+def guardar_valores_originais(sender, instance, **kwargs):
+    instance._auditoria_original = _valores(instance)
+
+
+@receiver(post_save, sender=Permuta)
+@receiver(post_save, sender=Reposicao)
+def auditar_gravacao(sender, instance, created, using, **kwargs):
+    atuais = _valores(instance)
+    originais = {} if created else instance._auditoria_original
+    # Campo que não estava carregado na leitura não tem valor original para comparar
+    alteracoes = {
+        campo: [originais.get(campo), valor]
+        for campo, valor in atuais.items()
+        if created or (campo in originais and originais[campo] != valor)
+    }
+    instance._auditoria_original = {**originais, **atuais}
+    if not alteracoes:
+        return
+
+    status_anterior = status_novo = ""
+    if created:
+        acao = "CRIACAO"
+        status_novo = atuais.get("status", "")
+    elif "status" in alteracoes:
+        acao = "TRANSICAO"
+        status_anterior, status_novo = alteracoes["status"]
+    else:
+        acao = "ALTERACAO"
+
+    registro.registrar(
+        acao,
+        instance,
+        permuta_id=_permuta_id(instance),
+        status_anterior=status_anterior,
+        status_novo=status_novo,
+        alteracoes=alteracoes,
+        using=using,
+    )
+
+
+@receiver(post_delete, sender=Permuta)
+@receiver(post_delete, sender=Reposicao)
+def auditar_exclusao(sender, instance, using, **kwargs):
+    registro.registrar(
+        "EXCLUSAO",
+        instance,
+        permuta_id=_permuta_id(instance),
+        alteracoes={campo: [valor, None] for campo, valor in _valores(instance).items()},
+        using=using,
+    )
+
+
+@receiver(status_alterado, sender=Permuta)
+def auditar_transicao(sender, permuta, status_anterior, usuario, **kwargs):
+    alteracoes = {
+        "status": [status_anterior, permuta.status],
+        "data_decisao": [permuta._auditoria_original.get("data_decisao"), permuta.data_decisao],
+        "usuario_decisor_id": [permuta._auditoria_original.get("usuario_decisor_id"), permuta.usuario_decisor_id],
+    }
+    permuta._auditoria_original.update({campo: valores[1] for campo, valores in alteracoes.items()})
+    registro.registrar(
+        "TRANSICAO",
+        permuta,
+        usuario=usuario,
+        permuta_id=permuta.pk,
+        status_anterior=status_anterior,
+        status_novo=permuta.status,
+        alteracoes=alteracoes,
+    )
+
+
+@receiver(permutas_criadas, sender=Permuta)
+def auditar_criacao_em_lote(sender, permutas, usuario, **kwargs):
+    for permuta in permutas:
+        atuais = _valores(permuta)
+        permuta._auditoria_original = atuais
+        registro.registrar(
+            "CRIACAO",
+            permuta,
+            usuario=usuario,
+            permuta_id=permuta.pk,
+            status_novo=permuta.status,
+            alteracoes={campo: [None, valor] for campo, valor in atuais.items()},
+        )
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import date, time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from accounts.models import Professor
+from audit import registro
+from audit.models import EventoAuditoria
+from cadastros.models import Disciplina, HorarioAula, Turma
+from permuta.models import Permuta, Reposicao
+
+
+class RegistroTransacaoTest(TransactionTestCase):
+    """
+    Eventos registrados em transação só são gravados no commit, uma vez, e
+    os de transações ou savepoints desfeitos são descartados.
+    """
+
+    def _descricoes(self):
+        return sorted(EventoAuditoria.objects.values_list("descricao", flat=True))
+
+    def test_savepoint_desfeito_descarta_so_os_seus_eventos(self):
+        with transaction.atomic():
+            registro.registrar("ALTERACAO", descricao="externo")
+            try:
+                with transaction.atomic():
+                    registro.registrar("ALTERACAO", descricao="desfeito")
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                registro.registrar("ALTERACAO", descricao="interno")
+            registro.registrar("ALTERACAO", descricao="externo 2")
+            self.assertEqual(self._descricoes(), [])
+        self.assertEqual(self._descricoes(), ["externo", "externo 2", "interno"])
+
+    def test_transacao_desfeita_nao_passa_eventos_para_a_seguinte(self):
+        try:
+            with transaction.atomic():
+                registro.registrar("ALTERACAO", descricao="desfeito")
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            registro.registrar("ALTERACAO", descricao="gravado")
+        self.assertEqual(self._descricoes(), ["gravado"])
+
+
+class CamposAdiadosTest(TestCase):
+    """
+    Instâncias lidas com .only()/.defer() não recarregam os campos adiados
+    para a auditoria (antes, o post_init entrava em recursão).
+    """
+
+    def setUp(self):
+        coord = User.objects.create_superuser("coord", "", "senha")
+        professores = [
+            Professor.objects.create(
+                user=User.objects.create_user(f"professor{i}"),
+                matricula_siape=f"{1000 + i}",
+                cpf=f"{52998224700 + i}",
+                coordenacao="Informática",
+                usuario_admin=coord,
+            )
+            for i in range(2)
+        ]
+        horario = HorarioAula.objects.create(
+            professor=professores[0],
+            disciplina=Disciplina.objects.create(
+                nome="Banco de Dados", carga_horaria=60,
+                professor_responsavel=professores[0], usuario_admin=coord,
+            ),
+            turma=Turma.objects.create(
+                codigo_turma="TSI1", curso="TSI", periodo="1", turno="NOITE", usuario_admin=coord
+            ),
+            dia_semana="SEG",
+            hora_inicio=time(19, 0),
+            hora_fim=time(20, 40),
+            usuario_admin=coord,
+        )
+        # Grava já os eventos de criação, para não misturá-los aos do teste
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permuta = Permuta.objects.create(
+                data_aula=date(2026, 3, 2),
+                motivo="Congresso",
+                professor_solicitante=professores[0],
+                professor_substituto=professores[1],
+                horario=horario,
+            )
+            Reposicao.objects.create(permuta=self.permuta, data_reposicao=date(2026, 3, 9))
+
+    def test_only_nao_recarrega_a_instancia(self):
+        with self.assertNumQueries(1):
+            permutas = list(Permuta.objects.only("id"))
+        self.assertEqual([p.pk for p in permutas], [self.permuta.pk])
+        with self.assertNumQueries(1):
+            list(Reposicao.objects.defer("observacao"))
+
+        permuta = Permuta.objects.get(pk=self.permuta.pk)
+        permuta.refresh_from_db(fields=["status"])
+        self.assertEqual(permuta.status, "PENDENTE")
+
+    def test_gravacao_de_instancia_parcial_audita_so_o_carregado(self):
+        permuta = Permuta.objects.only("id", "motivo").get(pk=self.permuta.pk)
+        permuta.motivo = "Banca"
+        with self.captureOnCommitCallbacks(execute=True):
+            permuta.save(update_fields=["motivo"])
+        evento = EventoAuditoria.objects.filter(acao="ALTERACAO").get()
+        self.assertEqual(evento.alteracoes, {"motivo": ["Congresso", "Banca"]})
@@ -1,3 +1,77 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
 
-# Create your views here.
+from permuta.models import Permuta
+
+from .models import EventoAuditoria
+
+LIMITE_EVENTOS = 100
+
+
+def _serializar(eventos):
+    return [
+        {
+            'id': evento.id,
+            'data_hora': evento.data_hora.isoformat(),
+            'acao': evento.acao,
+            'acao_display': evento.get_acao_display(),
+            'modelo': evento.modelo,
+            'objeto_id': evento.objeto_id,
+            'permuta_id': evento.permuta_id,
+            'status_anterior': evento.status_anterior,
+            'status_novo': evento.status_novo,
+            'alteracoes': evento.alteracoes,
+            'descricao': evento.descricao,
+            'usuario': evento.usuario.username if evento.usuario else None,
+        }
+        for evento in eventos
+    ]
+
+
+def _paginar(request, eventos):
+    """
+    Paginação por cursor: ?antes=<id do último evento recebido>.
+    """
+    antes = request.GET.get('antes')
+    if antes and antes.isdigit():
+        eventos = eventos.filter(id__lt=int(antes))
+    return list(eventos.select_related('usuario')[:LIMITE_EVENTOS])
+
+
+@login_required
+def historico_permuta(request, permuta_id):
+    """
+    API REST com a linha do tempo de auditoria de uma permuta.
+    """
+    usuario = request.user
+
+    if not usuario.is_staff:
+        professor = request.professor
+        if professor is None:
+            return JsonResponse({'error': 'Professor não encontrado'}, status=404)
+        permitido = Permuta.objects.filter(
+            Q(id=permuta_id) & (
+                Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+            )
+        ).exists()
+        if not permitido:
+            return JsonResponse({'error': 'Permuta não encontrada'}, status=404)
+
+    eventos = _paginar(request, EventoAuditoria.objects.da_permuta(permuta_id))
+    return JsonResponse({'permuta_id': permuta_id, 'count': len(eventos), 'eventos': _serializar(eventos)})
+
+
+@login_required
+def historico_usuario(request, usuario_id):
+    """
+    API REST com as ações registradas de um usuário. Apenas para staff.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Acesso restrito'}, status=403)
+
+    alvo = get_object_or_404(User, id=usuario_id)
+    eventos = _paginar(request, EventoAuditoria.objects.do_usuario(alvo))
+    return JsonResponse({'usuario': alvo.username, 'count': len(eventos), 'eventos': _serializar(eventos)})
@@ -1,25 +1,39 @@
 from django.contrib import admin
+from audit.mixins import AuditoriaAdminMixin
+from permuta_aulas.admin import ContagemLimitadaPaginator, FiltroCodigoTurma, FiltroNomeProfessor
 from .models import Turma, Disciplina, HorarioAula
 
 
+class FiltroProfessorResponsavel(FiltroNomeProfessor):
+    title = "professor responsável"
+    campo_professor = "professor_responsavel"
+
+
 @admin.register(Turma)
-class TurmaAdmin(admin.ModelAdmin):
+class TurmaAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = ("codigo_turma", "curso", "periodo", "turno", "usuario_admin", "data_cadastro")
     search_fields = ("codigo_turma", "curso", "periodo")
     list_filter = ("turno", "curso")
+    list_select_related = ("usuario_admin",)
     ordering = ("curso", "codigo_turma")
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
 
 
 @admin.register(Disciplina)
-class DisciplinaAdmin(admin.ModelAdmin):
+class DisciplinaAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = ("nome", "carga_horaria", "professor_responsavel", "usuario_admin", "data_cadastro")
     search_fields = ("nome", "professor_responsavel__user__first_name", "professor_responsavel__user__last_name")
-    list_filter = ("professor_responsavel",)
+    list_filter = (FiltroProfessorResponsavel,)
+    list_select_related = ("professor_responsavel__user", "usuario_admin")
+    autocomplete_fields = ("professor_responsavel",)
     ordering = ("nome",)
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
 
 
 @admin.register(HorarioAula)
-class HorarioAulaAdmin(admin.ModelAdmin):
+class HorarioAulaAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = (
         "turma",
         "disciplina",
@@ -30,7 +44,10 @@ class HorarioAulaAdmin(admin.ModelAdmin):
         "usuario_admin",
         "data_cadastro",
     )
-    list_filter = ("dia_semana", "turma", "professor")
+    # Turma e professor com caixa de texto: listar todos deixaria a página enorme
+    list_filter = ("dia_semana", FiltroCodigoTurma, FiltroNomeProfessor)
+    list_select_related = ("turma", "disciplina", "professor__user", "usuario_admin")
+    autocomplete_fields = ("professor", "disciplina", "turma")
     search_fields = (
         "turma__codigo_turma",
         "disciplina__nome",
@@ -38,3 +55,6 @@ class HorarioAulaAdmin(admin.ModelAdmin):
         "professor__user__last_name",
     )
     ordering = ("turma", "dia_semana", "hora_inicio")
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
@@ -154,6 +154,11 @@ class HorarioAula(models.Model):
         auto_now_add=True,
         verbose_name="Data de cadastro"
     )
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Última atualização"
+    )
 
     class Meta:
         verbose_name = "Horário de aula"
@@ -1,10 +1,20 @@
 from django.contrib import admin
+from audit.mixins import AuditoriaAdminMixin
+from django.db.models import Q
 from django.utils import timezone
-from .models import Permuta, Reposicao
+from permuta_aulas.admin import ContagemLimitadaPaginator, FiltroNomeProfessor
+from . import busca
+from .models import PeriodoLetivo, Permuta, Reposicao
+
+
+class FiltroSolicitante(FiltroNomeProfessor):
+    title = "professor solicitante"
+    parameter_name = "solicitante"
+    campo_professor = "professor_solicitante"
 
 
 @admin.register(Permuta)
-class PermutaAdmin(admin.ModelAdmin):
+class PermutaAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "professor_solicitante",
@@ -13,11 +23,22 @@ class PermutaAdmin(admin.ModelAdmin):
         "data_solicitacao",
         "data_decisao",
     )
-    list_filter = ("status", "data_solicitacao")
+    list_filter = ("periodo", "status", "data_solicitacao", FiltroSolicitante)
+    list_select_related = (
+        "professor_solicitante__user",
+        "professor_substituto__user",
+    )
+    date_hierarchy = "data_solicitacao"
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    # Usados apenas quando a busca FTS5 não está disponível (banco não SQLite)
     search_fields = (
-        "id",
-        "professor_solicitante__nome",
-        "professor_substituto__nome",
+        "=id",
+        "professor_solicitante__user__first_name",
+        "professor_solicitante__user__last_name",
+        "professor_substituto__user__first_name",
+        "professor_substituto__user__last_name",
         "horario__turma__codigo_turma",
         "horario__disciplina__nome",
     )
@@ -32,8 +53,19 @@ class PermutaAdmin(admin.ModelAdmin):
         "usuario_decisor",
         "data_aula",
         "status",
+        "periodo",
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not busca.disponivel():
+            return super().get_search_results(request, queryset, search_term)
+
+        # Busca pelo índice FTS5; um número também é aceito como ID da permuta
+        filtro = Q(id__in=busca.subconsulta_ids(search_term))
+        if search_term.strip().isdigit():
+            filtro |= Q(id=int(search_term.strip()))
+        return queryset.filter(filtro), False
+
     def has_add_permission(self, request):
         # Não criar permutas pelo admin, apenas pelas telas do sistema
         return False
@@ -55,10 +87,18 @@ class PermutaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Reposicao)
-class ReposicaoAdmin(admin.ModelAdmin):
+class ReposicaoAdmin(AuditoriaAdminMixin, admin.ModelAdmin):
     list_display = ("id", "permuta", "data_reposicao")
     list_filter = ("data_reposicao",)
-    search_fields = ("permuta__id",)
+    search_fields = ("=permuta__id",)
+    list_select_related = (
+        "permuta__professor_solicitante__user",
+        "permuta__professor_substituto__user",
+    )
+    date_hierarchy = "data_reposicao"
+    paginator = ContagemLimitadaPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
     readonly_fields = (
         "permuta",
@@ -79,4 +119,12 @@ class ReposicaoAdmin(admin.ModelAdmin):
         return False
 
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(PeriodoLetivo)
+class PeriodoLetivoAdmin(admin.ModelAdmin):
+    list_display = ("nome", "inicio", "fim", "arquivado_em")
+    ordering = ("-inicio",)
+    # Preenchido pelo comando arquivar_periodos
+    readonly_fields = ("arquivado_em",)
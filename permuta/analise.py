@@ -0,0 +1,215 @@
+"""
+Indicadores das permutas para os painéis da coordenação.
+
+Em vez de uma consulta agregada por indicador, as permutas são lidas uma
+única vez (um values_list) para um retrato em colunas: arrays NumPy com o
+código do status, as datas e o dia da semana de cada permuta. Os
+indicadores saem desses arrays com operações vetorizadas (bincount,
+histogram, percentile); os rankings de professores e disciplinas vêm dos
+contadores mantidos por permuta.contadores.
+
+O retrato fica em memória no processo e só é refeito quando a versão dos
+dados muda: a marca d'água (ver permuta.condicional) das permutas, que
+também muda com as reposições, e dos horários de aula.
+"""
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+from django.utils import timezone
+
+from cadastros.models import HorarioAula
+
+from . import contadores
+from .condicional import marca_dagua
+from .models import Permuta
+from .services import DIAS_DA_SEMANA
+
+STATUS = [codigo for codigo, _ in Permuta.STATUS_CHOICES]
+CODIGOS_STATUS = {codigo: indice for indice, codigo in enumerate(STATUS)}
+NOMES_DIAS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
+
+MESES_HISTORICO = 6
+TAMANHO_RANKING = 5
+PERCENTIS = (50, 90, 95)
+# Faixas (em dias entre a aula e a reposição) da distribuição de atraso
+FAIXAS_ATRASO = [
+    ("Antes da aula", -np.inf, 0),
+    ("Até 7 dias", 0, 8),
+    ("8 a 14 dias", 8, 15),
+    ("15 a 30 dias", 15, 31),
+    ("Mais de 30 dias", 31, np.inf),
+]
+
+_lock = threading.Lock()
+_cache = {}
+
+
+@dataclass(frozen=True)
+class Retrato:
+    """
+    As permutas em colunas; a posição i de cada array é a mesma permuta.
+    Datas ausentes (decisão, reposição) são NaT.
+    """
+
+    ids: np.ndarray
+    status: np.ndarray
+    solicitacao: np.ndarray
+    decisao: np.ndarray
+    data_aula: np.ndarray
+    reposicao: np.ndarray
+    dia_semana: np.ndarray
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _horarios_locais(valores):
+    # datetime64 não guarda fuso: converte para o horário local sem tzinfo
+    fuso = timezone.get_current_timezone()
+    return np.array(
+        [None if valor is None else valor.astimezone(fuso).replace(tzinfo=None) for valor in valores],
+        dtype="datetime64[s]",
+    )
+
+
+def carregar_retrato():
+    """
+    Lê todas as permutas em uma consulta e monta o retrato em colunas.
+    """
+    linhas = list(
+        Permuta.objects.order_by().values_list(
+            "id",
+            "status",
+            "data_solicitacao",
+            "data_decisao",
+            "data_aula",
+            "reposicao__data_reposicao",
+            "horario__dia_semana",
+        )
+    )
+    colunas = list(zip(*linhas)) if linhas else [()] * 7
+    ids, status, solicitacao, decisao, data_aula, reposicao, dia = colunas
+    return Retrato(
+        ids=np.array(ids, dtype=np.int64),
+        status=np.array([CODIGOS_STATUS[valor] for valor in status], dtype=np.int8),
+        solicitacao=_horarios_locais(solicitacao),
+        decisao=_horarios_locais(decisao),
+        data_aula=np.array(data_aula, dtype="datetime64[D]"),
+        reposicao=np.array(reposicao, dtype="datetime64[D]"),
+        dia_semana=np.array([DIAS_DA_SEMANA[valor] for valor in dia], dtype=np.int8),
+    )
+
+
+def versao_dos_dados():
+    """
+    Marcas d'água das permutas e dos horários: mudam a cada alteração.
+    """
+    return (marca_dagua(Permuta.objects.all()), marca_dagua(HorarioAula.objects.all()))
+
+
+def obter_retrato(versao=None):
+    """
+    Retrato da versão atual dos dados, refeito só quando ela muda.
+    """
+    versao = versao or versao_dos_dados()
+    with _lock:
+        if _cache.get("versao") == versao:
+            return _cache["retrato"]
+    retrato = carregar_retrato()
+    with _lock:
+        _cache["versao"] = versao
+        _cache["retrato"] = retrato
+    return retrato
+
+
+def _percentis(valores):
+    if not len(valores):
+        return {f"p{p}": None for p in PERCENTIS}
+    return {
+        f"p{p}": round(float(valor), 1)
+        for p, valor in zip(PERCENTIS, np.percentile(valores, PERCENTIS))
+    }
+
+
+def indicadores(retrato, hoje):
+    """
+    Todos os indicadores dos painéis a partir do retrato.
+
+    Os rankings são uma leitura indexada dos contadores cada; o restante
+    não acessa o banco.
+    """
+    por_status = np.bincount(retrato.status, minlength=len(STATUS))
+    total_status = {codigo: int(por_status[indice]) for indice, codigo in enumerate(STATUS)}
+
+    # Por mês de solicitação, nos últimos MESES_HISTORICO meses (inclusive o atual)
+    mes_atual = np.datetime64(hoje, "M")
+    deslocamento = (mes_atual - retrato.solicitacao.astype("datetime64[M]")).astype(np.int64)
+    no_periodo = (deslocamento >= 0) & (deslocamento < MESES_HISTORICO)
+    por_mes = np.bincount(deslocamento[no_periodo], minlength=MESES_HISTORICO)
+    permutas_por_mes = [
+        {
+            "mes": (mes_atual - indice).astype(object),
+            "quantidade": int(por_mes[indice]),
+        }
+        for indice in range(MESES_HISTORICO - 1, -1, -1)
+    ]
+
+    por_dia = np.bincount(retrato.dia_semana, minlength=len(NOMES_DIAS))
+    permutas_por_dia = [
+        {"dia": nome, "quantidade": int(por_dia[indice])}
+        for indice, nome in enumerate(NOMES_DIAS)
+    ]
+
+    # Tempo entre a solicitação e a decisão (aprovação ou recusa), em horas
+    decididas = (
+        np.isin(retrato.status, [CODIGOS_STATUS["APROVADA"], CODIGOS_STATUS["RECUSADA"]])
+        & ~np.isnat(retrato.decisao)
+    )
+    latencia = (retrato.decisao[decididas] - retrato.solicitacao[decididas]).astype(np.int64) / 3600
+
+    # Dias entre a aula permutada e a reposição
+    com_reposicao = ~np.isnat(retrato.reposicao)
+    atraso = (retrato.reposicao[com_reposicao] - retrato.data_aula[com_reposicao]).astype(np.int64)
+    limites = [inicio for _, inicio, _ in FAIXAS_ATRASO] + [FAIXAS_ATRASO[-1][2]]
+    distribuicao, _ = np.histogram(atraso, bins=limites)
+
+    # Sem reposição (canceladas não precisam), mais recentes primeiro
+    sem_reposicao = ~com_reposicao & (retrato.status != CODIGOS_STATUS["CANCELADA"])
+    ordem = np.argsort(retrato.solicitacao[sem_reposicao], kind="stable")[::-1]
+
+    total = len(retrato)
+    return {
+        "total_permutas": total,
+        "por_status": total_status,
+        "taxa_aprovacao": round(total_status["APROVADA"] / total * 100, 2) if total else 0,
+        "permutas_por_mes": permutas_por_mes,
+        "permutas_por_dia": permutas_por_dia,
+        "top_professores": contadores.top_professores(TAMANHO_RANKING),
+        "top_disciplinas": contadores.top_disciplinas(TAMANHO_RANKING),
+        "total_sem_reposicao": int(sem_reposicao.sum()),
+        "ids_sem_reposicao": retrato.ids[sem_reposicao][ordem].tolist(),
+        "latencia_decisao_horas": {"total": int(decididas.sum()), **_percentis(latencia)},
+        "atraso_reposicao_dias": {
+            "total": int(com_reposicao.sum()),
+            **_percentis(atraso),
+            "distribuicao": [
+                {"faixa": nome, "quantidade": int(quantidade)}
+                for (nome, _, _), quantidade in zip(FAIXAS_ATRASO, distribuicao)
+            ],
+        },
+    }
+
+
+def permutas_sem_reposicao(dados, quantidade=5):
+    """
+    As primeiras ``quantidade`` permutas sem reposição, como instâncias.
+    """
+    ids = dados["ids_sem_reposicao"][:quantidade]
+    permutas = Permuta.objects.select_related(
+        "professor_solicitante__user",
+        "professor_substituto__user",
+        "horario__turma",
+        "horario__disciplina",
+    ).in_bulk(ids)
+    return [permutas[pk] for pk in ids if pk in permutas]
@@ -1,5 +1,28 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def _atende_requisicoes():
+    """
+    True nos processos que atendem requisições (servidor WSGI/ASGI ou
+    runserver) e False nos outros comandos do manage.py (migrate, test...),
+    que não geram gráficos e esperariam o aquecimento do pool ao terminar.
+    """
+    if os.path.basename(sys.argv[0]) != "manage.py":
+        return True
+    if sys.argv[1:2] != ["runserver"]:
+        return False
+    # Com o autoreload, só o processo filho atende requisições
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
 class PermutaConfig(AppConfig):
     name = 'permuta'
+
+    def ready(self):
+        from . import checks, graficos, signals  # noqa: F401
+
+        if _atende_requisicoes():
+            graficos.iniciar_pool()
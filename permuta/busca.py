@@ -0,0 +1,125 @@
+"""
+Busca textual das permutas usando a tabela virtual FTS5 do SQLite.
+
+A tabela ``permuta_busca`` (criada na migração 0003) guarda, para cada
+permuta, o motivo, os nomes dos professores, turma, disciplina e observação
+da reposição. Ela é mantida por triggers no próprio banco, de modo que
+bulk_create, update() e alterações pelo admin também são refletidos.
+
+A tabela e os triggers existem só nas migrações. As que recriam tabelas
+usadas pelos triggers (permuta, reposição, horário, turma, disciplina,
+professor, usuário) removem os triggers antes e os recriam depois, com o
+SQL congelado em permuta/migrations/_busca_v1.py: migrações antigas não
+podem mudar quando o código muda. Mudanças em SELECT_PERMUTA precisam de um
+novo módulo (_busca_v2.py) e de uma migração que recrie os triggers com ele.
+O check permuta.E001 (checks.py) acusa triggers faltando no banco.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+TABELA_BUSCA = "permuta_busca"
+
+TERMO_RE = re.compile(r"\w+", re.UNICODE)
+
+# Nome exibido do professor, igual a Professor.nome (nome completo ou username)
+NOME = "COALESCE(NULLIF(TRIM({u}.first_name || ' ' || {u}.last_name), ''), {u}.username)"
+
+SELECT_PERMUTA = f"""
+    SELECT
+        p.id,
+        p.motivo,
+        {NOME.format(u="us")},
+        {NOME.format(u="ub")},
+        t.codigo_turma,
+        d.nome,
+        COALESCE(r.observacao, ''),
+        p.professor_solicitante_id,
+        p.professor_substituto_id
+    FROM permuta_permuta p
+    JOIN accounts_professor ps ON ps.id = p.professor_solicitante_id
+    JOIN auth_user us ON us.id = ps.user_id
+    JOIN accounts_professor pb ON pb.id = p.professor_substituto_id
+    JOIN auth_user ub ON ub.id = pb.user_id
+    JOIN cadastros_horarioaula h ON h.id = p.horario_id
+    JOIN cadastros_turma t ON t.id = h.turma_id
+    JOIN cadastros_disciplina d ON d.id = h.disciplina_id
+    LEFT JOIN permuta_reposicao r ON r.permuta_id = p.id
+"""
+
+INSERIR = f"""
+    INSERT INTO {TABELA_BUSCA} (
+        rowid, motivo, solicitante, substituto, turma, disciplina, observacao,
+        solicitante_id, substituto_id
+    )
+"""
+
+SQL_REINDEXAR = INSERIR + SELECT_PERMUTA
+
+
+def disponivel():
+    """
+    A busca FTS5 só existe quando o banco é SQLite.
+    """
+    return connection.vendor == "sqlite"
+
+
+def montar_consulta(termo):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra vira um termo entre aspas com busca por prefixo, e todas
+    precisam aparecer (AND implícito). Operadores do FTS5 digitados pelo
+    usuário são tratados como texto comum.
+    """
+    palavras = TERMO_RE.findall(termo or "")
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+
+def buscar_permutas_ids(termo, professor=None, limite=50):
+    """
+    Retorna os IDs das permutas que casam com o termo, ordenados por relevância.
+
+    Se ``professor`` for informado, considera apenas as permutas em que ele é
+    solicitante ou substituto.
+    """
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return []
+
+    sql = f"SELECT rowid FROM {TABELA_BUSCA} WHERE {TABELA_BUSCA} MATCH %s"
+    parametros = [consulta]
+    if professor is not None:
+        sql += " AND (solicitante_id = %s OR substituto_id = %s)"
+        parametros += [professor.id, professor.id]
+    sql += " ORDER BY rank"
+    if limite:
+        sql += " LIMIT %s"
+        parametros.append(limite)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def subconsulta_ids(termo):
+    """
+    Subconsulta SQL com os IDs das permutas que casam com o termo, para
+    filtros como ``Permuta.objects.filter(id__in=subconsulta_ids(termo))``.
+    Ao contrário de buscar_permutas_ids, não traz os IDs para o Python, então
+    não há limite de resultados nem de parâmetros na consulta.
+    """
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return RawSQL(f"SELECT rowid FROM {TABELA_BUSCA} WHERE 0", [])
+    return RawSQL(f"SELECT rowid FROM {TABELA_BUSCA} WHERE {TABELA_BUSCA} MATCH %s", [consulta])
+
+
+def reindexar():
+    """
+    Reconstrói a tabela de busca a partir das tabelas principais.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_BUSCA}")
+        cursor.execute(SQL_REINDEXAR)
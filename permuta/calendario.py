@@ -0,0 +1,337 @@
+"""
+Feed iCalendar (ICS) da agenda de cada professor, para assinatura em
+aplicativos de calendário.
+
+O feed tem os horários de aula como eventos semanais (RRULE), sem as datas
+cedidas em permutas aprovadas (EXDATE), e as permutas pendentes ou aprovadas
+(como solicitante ou substituto) e as reposições como eventos avulsos. O
+acesso é pelo token de AssinaturaCalendario, sem login.
+
+Os clientes consultam o feed com frequência, então o conteúdo pronto fica no
+cache por professor, com ETag (hash do conteúdo) e Last-Modified. Os sinais
+de permutas, reposições e horários descartam o cache dos professores
+envolvidos; mudanças em nomes de professores, turmas e disciplinas aparecem
+quando o cache expira (TEMPO_CACHE).
+
+O feed é gerado na réplica de leitura (ver permuta_aulas.replica), exceto
+quando os dados do professor mudaram depois da última cópia da réplica:
+nesse caso é gerado no banco principal, para não guardar no cache um feed
+sem a alteração.
+"""
+import hashlib
+import secrets
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Professor
+from cadastros.models import HorarioAula
+from permuta_aulas import replica
+
+from .models import AssinaturaCalendario, Permuta
+
+TEMPO_CACHE = 6 * 60 * 60
+# Permutas e reposições com data anterior a isso ficam fora do feed
+DIAS_HISTORICO = 120
+
+DOMINIO_UID = "permuta-aulas"
+# HorarioAula.dia_semana -> (date.weekday(), BYDAY da RRULE)
+DIAS_RRULE = {
+    "SEG": (0, "MO"),
+    "TER": (1, "TU"),
+    "QUA": (2, "WE"),
+    "QUI": (3, "TH"),
+    "SEX": (4, "FR"),
+    "SAB": (5, "SA"),
+}
+STATUS_PERMUTA = {"PENDENTE": "TENTATIVE", "APROVADA": "CONFIRMED"}
+TAMANHO_LINHA = 75
+
+
+# ----------------------------------------------------------------------------
+# Assinatura
+# ----------------------------------------------------------------------------
+
+def obter_assinatura(professor):
+    """
+    Assinatura do professor, criada no primeiro acesso.
+    """
+    assinatura, _ = AssinaturaCalendario.objects.get_or_create(
+        professor=professor, defaults={"token": secrets.token_urlsafe(32)}
+    )
+    return assinatura
+
+
+def trocar_token(professor):
+    """
+    Gera um novo endereço para o feed; o anterior deixa de funcionar.
+    """
+    assinatura = obter_assinatura(professor)
+    assinatura.token = secrets.token_urlsafe(32)
+    assinatura.save(update_fields=["token", "atualizado_em"])
+    return assinatura
+
+
+# ----------------------------------------------------------------------------
+# Formato iCalendar (RFC 5545)
+# ----------------------------------------------------------------------------
+
+def _texto(valor):
+    return (
+        str(valor)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _dobrar(linha):
+    """
+    Quebra a linha em pedaços de até TAMANHO_LINHA bytes (sem partir
+    caracteres UTF-8); as continuações começam com espaço.
+    """
+    if len(linha.encode()) <= TAMANHO_LINHA:
+        return [linha]
+    partes, atual, tamanho = [], "", 0
+    for caractere in linha:
+        bytes_caractere = len(caractere.encode())
+        limite = TAMANHO_LINHA if not partes else TAMANHO_LINHA - 1
+        if tamanho + bytes_caractere > limite:
+            partes.append(atual)
+            atual, tamanho = "", 0
+        atual += caractere
+        tamanho += bytes_caractere
+    partes.append(atual)
+    return [partes[0]] + [" " + parte for parte in partes[1:]]
+
+
+def _data_hora(data, hora):
+    return datetime.combine(data, hora).strftime("%Y%m%dT%H%M%S")
+
+
+def _utc(valor):
+    return valor.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _vtimezone(fuso, agora):
+    # Fuso sem horário de verão (America/Recife): uma única regra STANDARD
+    deslocamento = agora.astimezone(fuso).utcoffset()
+    minutos = int(deslocamento.total_seconds() // 60)
+    sinal = "-" if minutos < 0 else "+"
+    offset = f"{sinal}{abs(minutos) // 60:02d}{abs(minutos) % 60:02d}"
+    return [
+        "BEGIN:VTIMEZONE",
+        f"TZID:{settings.TIME_ZONE}",
+        "BEGIN:STANDARD",
+        "DTSTART:19700101T000000",
+        f"TZOFFSETFROM:{offset}",
+        f"TZOFFSETTO:{offset}",
+        f"TZNAME:{agora.astimezone(fuso).tzname()}",
+        "END:STANDARD",
+        "END:VTIMEZONE",
+    ]
+
+
+def _evento(uid, dtstamp, data, horario, resumo, descricao="", status=None, transparente=False, extras=()):
+    tzid = settings.TIME_ZONE
+    linhas = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{DOMINIO_UID}",
+        f"DTSTAMP:{_utc(dtstamp)}",
+        f"DTSTART;TZID={tzid}:{_data_hora(data, horario.hora_inicio)}",
+        f"DTEND;TZID={tzid}:{_data_hora(data, horario.hora_fim)}",
+        *extras,
+        f"SUMMARY:{_texto(resumo)}",
+    ]
+    if descricao:
+        linhas.append(f"DESCRIPTION:{_texto(descricao)}")
+    if status:
+        linhas.append(f"STATUS:{status}")
+    if transparente:
+        linhas.append("TRANSP:TRANSPARENT")
+    linhas.append("END:VEVENT")
+    return linhas
+
+
+def _aula(horario):
+    return f"{horario.disciplina.nome} - {horario.turma.codigo_turma}"
+
+
+# ----------------------------------------------------------------------------
+# Geração
+# ----------------------------------------------------------------------------
+
+def gerar_calendario(professor, hoje=None):
+    """
+    Monta o feed do professor. Retorna (conteúdo em bytes, maior
+    atualizado_em dos dados usados ou None).
+    """
+    hoje = hoje or timezone.localdate()
+    limite = hoje - timedelta(days=DIAS_HISTORICO)
+    fuso = timezone.get_current_timezone()
+    agora = timezone.now()
+
+    horarios = list(
+        HorarioAula.objects.filter(professor=professor)
+        .select_related("turma", "disciplina")
+        .order_by("dia_semana", "hora_inicio")
+    )
+    permutas = list(
+        Permuta.objects.filter(
+            Q(professor_solicitante=professor) | Q(professor_substituto=professor),
+            Q(data_aula__gte=limite) | Q(reposicao__data_reposicao__gte=limite),
+        )
+        .select_related(
+            "professor_solicitante__user",
+            "professor_substituto__user",
+            "horario__turma",
+            "horario__disciplina",
+            "reposicao",
+        )
+        .order_by("data_aula", "id")
+    )
+
+    atualizacoes = [horario.atualizado_em for horario in horarios]
+    atualizacoes += [permuta.atualizado_em for permuta in permutas]
+
+    # Datas em que a aula foi cedida: saem da recorrência
+    cedidas = {}
+    for permuta in permutas:
+        if permuta.status == "APROVADA" and permuta.professor_solicitante_id == professor.pk:
+            cedidas.setdefault(permuta.horario_id, []).append(permuta.data_aula)
+
+    linhas = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:-//{DOMINIO_UID}//Agenda do professor//PT",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_texto(f'Aulas - {professor.nome}')}",
+        f"X-WR-TIMEZONE:{settings.TIME_ZONE}",
+        *_vtimezone(fuso, agora),
+    ]
+
+    for horario in horarios:
+        # Primeira ocorrência: o dia da semana da aula a partir do cadastro
+        dia, byday = DIAS_RRULE[horario.dia_semana]
+        cadastro = timezone.localdate(horario.data_cadastro)
+        inicio = cadastro + timedelta(days=(dia - cadastro.weekday()) % 7)
+        extras = [f"RRULE:FREQ=WEEKLY;BYDAY={byday}"]
+        if horario.id in cedidas:
+            datas = ",".join(_data_hora(data, horario.hora_inicio) for data in sorted(cedidas[horario.id]))
+            extras.append(f"EXDATE;TZID={settings.TIME_ZONE}:{datas}")
+        linhas += _evento(
+            f"horario-{horario.id}",
+            horario.atualizado_em,
+            inicio,
+            horario,
+            _aula(horario),
+            extras=extras,
+        )
+
+    for permuta in permutas:
+        if permuta.status not in STATUS_PERMUTA:
+            continue
+        horario = permuta.horario
+        solicitante = permuta.professor_solicitante_id == professor.pk
+        if permuta.data_aula >= limite:
+            if solicitante:
+                resumo = f"Permuta: {_aula(horario)} (substituto: {permuta.professor_substituto.nome})"
+            else:
+                resumo = f"Substituição: {_aula(horario)} (por {permuta.professor_solicitante.nome})"
+            linhas += _evento(
+                f"permuta-{permuta.id}",
+                permuta.atualizado_em,
+                permuta.data_aula,
+                horario,
+                resumo,
+                descricao=f"Permuta #{permuta.id} - {permuta.get_status_display()}",
+                status=STATUS_PERMUTA[permuta.status],
+                # Quem cedeu a aula não está ocupado nesse horário
+                transparente=solicitante,
+            )
+        if solicitante and permuta.tem_reposicao() and permuta.reposicao.data_reposicao >= limite:
+            reposicao = permuta.reposicao
+            linhas += _evento(
+                f"reposicao-{reposicao.id}",
+                reposicao.atualizado_em,
+                reposicao.data_reposicao,
+                horario,
+                f"Reposição: {_aula(horario)}",
+                descricao=reposicao.observacao or f"Reposição da permuta #{permuta.id}",
+                status=STATUS_PERMUTA[permuta.status],
+            )
+
+    linhas.append("END:VCALENDAR")
+    conteudo = "".join(
+        parte + "\r\n" for linha in linhas for parte in _dobrar(linha)
+    ).encode()
+    return conteudo, max(atualizacoes) if atualizacoes else None
+
+
+# ----------------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------------
+
+def _chave(professor_id):
+    return f"permuta:calendario:{professor_id}"
+
+
+def _chave_alteracao(professor_id):
+    return f"permuta:calendario:alterado:{professor_id}"
+
+
+def obter_feed(professor_id):
+    """
+    Feed do professor, do cache ou gerado agora. Retorna um dicionário com
+    ``conteudo``, ``etag`` e ``ultima_modificacao`` (timestamp ou None).
+    """
+    hoje = timezone.localdate()
+    chave = _chave(professor_id)
+    feed = cache.get(chave)
+    # O histórico exibido depende da data: o feed de ontem não serve
+    if feed is not None and feed["data"] == hoje:
+        return feed
+
+    alterado = cache.get(_chave_alteracao(professor_id))
+    atualizada = alterado is None or replica.atualizada_desde(alterado)
+    with replica.em_replica() if atualizada else nullcontext():
+        professor = Professor.objects.select_related("user").get(pk=professor_id)
+        conteudo, ultima = gerar_calendario(professor, hoje)
+    feed = {
+        "data": hoje,
+        "conteudo": conteudo,
+        "etag": f'"{hashlib.sha256(conteudo).hexdigest()[:32]}"',
+        "ultima_modificacao": int(ultima.timestamp()) if ultima else None,
+    }
+    cache.set(chave, feed, TEMPO_CACHE)
+    return feed
+
+
+def invalidar_feeds(professor_ids):
+    """
+    Descarta o feed em cache dos professores. Repete a remoção após o
+    commit, para não ficar no cache um feed gerado com os dados antigos
+    enquanto a transação estava aberta, e anota o momento da alteração
+    (o feed só volta para a réplica depois que ela for copiada de novo).
+    """
+    ids = {professor_id for professor_id in professor_ids if professor_id}
+    if not ids:
+        return
+
+    def descartar():
+        cache.delete_many([_chave(professor_id) for professor_id in ids])
+        agora = time.time()
+        cache.set_many({_chave_alteracao(professor_id): agora for professor_id in ids}, TEMPO_CACHE)
+
+    descartar()
+    transaction.on_commit(descartar)
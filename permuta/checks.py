@@ -0,0 +1,40 @@
+"""
+Verificações do app permuta para o ``manage.py check --database``.
+"""
+from django.core.checks import Error, Tags, register
+from django.db import connections
+
+from .busca import TABELA_BUSCA
+from .migrations._busca_v1 import NOMES_GATILHOS
+
+
+@register(Tags.database)
+def verificar_gatilhos_busca(app_configs, databases=None, **kwargs):
+    """
+    Confere se os triggers da busca existem nos bancos SQLite que já têm a
+    tabela permuta_busca. Sem eles a busca deixa de acompanhar as alterações
+    sem erro algum (por exemplo, após uma migração que recriou uma tabela e
+    esqueceu de recriá-los).
+    """
+    erros = []
+    for alias in databases or []:
+        conexao = connections[alias]
+        if conexao.vendor != "sqlite":
+            continue
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+            )
+            existentes = cursor.fetchall()
+        if ("table", TABELA_BUSCA) not in existentes:
+            continue
+        gatilhos = {nome for tipo, nome in existentes if tipo == "trigger"}
+        faltando = [nome for nome in NOMES_GATILHOS if nome not in gatilhos]
+        if faltando:
+            erros.append(Error(
+                f"Faltam triggers da busca no banco '{alias}': {', '.join(faltando)}.",
+                hint="Rode o manage.py migrate; se já estiver em dia, alguma migração "
+                     "recriou uma tabela sem recriar os triggers.",
+                id="permuta.E001",
+            ))
+    return erros
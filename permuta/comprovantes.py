@@ -0,0 +1,468 @@
+"""
+Geração e cache em disco dos comprovantes de permuta (PDF).
+
+O comprovante é gerado a partir de um dicionário simples com todos os textos
+que aparecem no documento. O hash desse dicionário é a chave do cache: se
+nenhum dado visível mudou, o mesmo arquivo é reaproveitado.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+# Aumente sempre que o layout do PDF mudar, para não servir arquivos antigos.
+VERSAO_LAYOUT = 2
+
+STATUS_CORES = {
+    'PENDENTE': '#ffc107',
+    'APROVADA': '#28a745',
+    'CANCELADA': '#dc3545',
+}
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Pools de processos da exportação em ZIP, por número de workers
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Relações usadas no comprovante (para select_related)
+RELACOES_COMPROVANTE = (
+    "professor_solicitante__user",
+    "professor_substituto__user",
+    "horario__turma",
+    "horario__disciplina",
+    "usuario_decisor",
+    "reposicao",
+)
+
+
+def diretorio_cache():
+    """
+    Diretório onde os comprovantes gerados ficam guardados.
+    """
+    return Path(getattr(settings, "COMPROVANTES_CACHE_DIR", settings.BASE_DIR / "cache" / "comprovantes"))
+
+
+def dados_comprovante(permuta):
+    """
+    Extrai da permuta todos os dados que aparecem no comprovante.
+
+    Espera uma permuta carregada com select_related(*RELACOES_COMPROVANTE),
+    para não gerar consultas extras.
+    """
+    decisor = None
+    if permuta.usuario_decisor:
+        decisor = permuta.usuario_decisor.get_full_name() or permuta.usuario_decisor.username
+
+    reposicao = None
+    if permuta.tem_reposicao():
+        reposicao = {
+            "data": permuta.reposicao.data_reposicao.strftime('%d/%m/%Y'),
+            "observacao": permuta.reposicao.observacao[:80],
+        }
+
+    return {
+        "versao": VERSAO_LAYOUT,
+        "id": permuta.id,
+        "status": permuta.status,
+        "status_display": permuta.get_status_display(),
+        "solicitante": {
+            "nome": permuta.professor_solicitante.nome,
+            "siape": permuta.professor_solicitante.matricula_siape,
+        },
+        "substituto": {
+            "nome": permuta.professor_substituto.nome,
+            "siape": permuta.professor_substituto.matricula_siape,
+        },
+        "turma": permuta.horario.turma.codigo_turma,
+        "disciplina": permuta.horario.disciplina.nome,
+        "dia_semana": permuta.horario.get_dia_semana_display(),
+        "horario": f"{permuta.horario.hora_inicio} - {permuta.horario.hora_fim}",
+        "data_aula": permuta.data_aula.strftime('%d/%m/%Y'),
+        "data_solicitacao": permuta.data_solicitacao.strftime('%d/%m/%Y %H:%M'),
+        "data_decisao": permuta.data_decisao.strftime('%d/%m/%Y %H:%M') if permuta.data_decisao else None,
+        "decisor": decisor,
+        "reposicao": reposicao,
+        "motivo": permuta.motivo or "Não informado",
+        # Última alteração da permuta, e não o momento da geração: a mesma
+        # chave (ETag) corresponde sempre ao mesmo arquivo
+        "emissao": timezone.localtime(permuta.atualizado_em).strftime('%d/%m/%Y %H:%M'),
+    }
+
+
+def chave_comprovante(dados):
+    """
+    Hash (sha256) dos dados do comprovante, usado como nome do arquivo e ETag.
+    """
+    conteudo = json.dumps(dados, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def renderizar_comprovante(dados):
+    """
+    Gera o PDF do comprovante e devolve os bytes.
+
+    Não acessa o banco: recebe apenas o dicionário de dados_comprovante().
+    """
+    buffer = io.BytesIO()
+    # invariant: sem data de criação nem ID aleatório nos metadados do PDF
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    width, height = A4
+
+    # Cabeçalho com gradiente
+    p.setFillColor(colors.HexColor('#28a745'))
+    p.rect(0, height-100, width, 100, fill=1)
+
+    p.setFillColor(colors.white)
+    p.setFont("Helvetica-Bold", 24)
+    p.drawString(50, height-50, "Sistema de Permuta de Aulas")
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height-75, "Comprovante de Permuta")
+
+    # Data de emissão
+    p.setFont("Helvetica", 10)
+    p.drawRightString(width-50, height-40, f"Emissão: {dados['emissao']}")
+
+    # Código da permuta
+    p.setFillColor(colors.HexColor('#dc3545'))
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(50, height-150, f"Permuta #{dados['id']}")
+
+    # Status
+    status_color = STATUS_CORES.get(dados["status"], '#6c757d')
+    p.setFillColor(colors.HexColor(status_color))
+    p.setFont("Helvetica-Bold", 14)
+    p.drawRightString(width-50, height-150, f"Status: {dados['status_display']}")
+
+    y = height - 200
+
+    # Função para desenhar seções
+    def draw_section(title, y_pos):
+        p.setFillColor(colors.HexColor('#28a745'))
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(50, y_pos, title)
+        p.setFillColor(colors.HexColor('#dc3545'))
+        p.line(50, y_pos-5, width-50, y_pos-5)
+        return y_pos - 30
+
+    # Seção: Professor Solicitante
+    y = draw_section("Professor Solicitante", y)
+    p.setFillColor(colors.black)
+    p.setFont("Helvetica", 11)
+    p.drawString(70, y, f"Nome: {dados['solicitante']['nome']}")
+    y -= 20
+    p.drawString(70, y, f"Matrícula SIAPE: {dados['solicitante']['siape']}")
+    y -= 30
+
+    # Seção: Professor Substituto
+    y = draw_section("Professor Substituto", y)
+    p.setFont("Helvetica", 11)
+    p.drawString(70, y, f"Nome: {dados['substituto']['nome']}")
+    y -= 20
+    p.drawString(70, y, f"Matrícula SIAPE: {dados['substituto']['siape']}")
+    y -= 30
+
+    # Seção: Dados da Aula
+    y = draw_section("Dados da Aula", y)
+    p.setFont("Helvetica", 11)
+    p.drawString(70, y, f"Turma: {dados['turma']}")
+    y -= 20
+    p.drawString(70, y, f"Disciplina: {dados['disciplina']}")
+    y -= 20
+    p.drawString(70, y, f"Dia da semana: {dados['dia_semana']}")
+    y -= 20
+    p.drawString(70, y, f"Horário: {dados['horario']}")
+    y -= 20
+    p.drawString(70, y, f"Data da aula permutada: {dados['data_aula']}")
+    y -= 30
+
+    # Seção: Datas
+    y = draw_section("Datas", y)
+    p.setFont("Helvetica", 11)
+    p.drawString(70, y, f"Data da solicitação: {dados['data_solicitacao']}")
+    y -= 20
+    if dados["data_decisao"]:
+        p.drawString(70, y, f"Data da decisão: {dados['data_decisao']}")
+        y -= 20
+    if dados["decisor"]:
+        p.drawString(70, y, f"Decidida por: {dados['decisor']}")
+        y -= 20
+    y -= 10
+
+    # Seção: Reposição
+    y = draw_section("Reposição", y)
+    p.setFont("Helvetica", 11)
+    if dados["reposicao"]:
+        p.drawString(70, y, f"Data da reposição: {dados['reposicao']['data']}")
+        y -= 20
+        if dados["reposicao"]["observacao"]:
+            p.drawString(70, y, f"Observações: {dados['reposicao']['observacao']}")
+            y -= 20
+    else:
+        p.drawString(70, y, "Não há reposição registrada para esta permuta.")
+        y -= 20
+
+    # Seção: Motivo
+    y = draw_section("Motivo da Permuta", y)
+    p.setFont("Helvetica", 11)
+
+    # Quebrar motivo em linhas
+    palavras = dados["motivo"].split()
+    linha = ""
+    for palavra in palavras:
+        if len(linha) + len(palavra) + 1 <= 80:
+            linha += (" " if linha else "") + palavra
+        else:
+            p.drawString(70, y, linha)
+            y -= 15
+            linha = palavra
+    if linha:
+        p.drawString(70, y, linha)
+        y -= 20
+
+    # Rodapé
+    p.setFillColor(colors.HexColor('#6c757d'))
+    p.setFont("Helvetica-Oblique", 8)
+    p.drawString(50, 50, "Este documento é um comprovante oficial do Sistema de Permuta de Aulas.")
+    p.drawRightString(width-50, 50, "Página 1 de 1")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def caminho_comprovante(permuta_id, chave):
+    return diretorio_cache() / str(permuta_id) / f"{chave}.pdf"
+
+
+def gravar_comprovante(caminho, conteudo):
+    """
+    Grava o PDF de forma atômica (arquivo temporário + rename), para que
+    requisições simultâneas nunca leiam um arquivo pela metade.
+    """
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+
+
+def obter_comprovante(permuta):
+    """
+    Devolve (caminho, chave) do comprovante da permuta, gerando o PDF apenas
+    se ainda não existir no cache.
+    """
+    dados = dados_comprovante(permuta)
+    chave = chave_comprovante(dados)
+    caminho = caminho_comprovante(permuta.id, chave)
+    if not caminho.exists():
+        gravar_comprovante(caminho, renderizar_comprovante(dados))
+    return caminho, chave
+
+
+def invalidar_comprovantes(permuta_id):
+    """
+    Remove do disco todos os comprovantes já gerados para a permuta.
+    """
+    shutil.rmtree(diretorio_cache() / str(permuta_id), ignore_errors=True)
+
+
+def _intervalo_solicitado(cabecalho, tamanho):
+    """
+    Interpreta um cabeçalho Range com um único intervalo de bytes.
+
+    Retorna (inicio, fim) inclusivos, None se o cabeçalho deve ser ignorado
+    ou False se o intervalo não pode ser atendido (416).
+    """
+    match = RANGE_RE.match(cabecalho.strip())
+    if not match:
+        return None
+    inicio, fim = match.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # bytes=-N: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0:
+            return False
+        return max(tamanho - sufixo, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+def resposta_comprovante(request, caminho, chave, nome_arquivo):
+    """
+    Serve o PDF do cache com ETag, If-None-Match e suporte a Range.
+    """
+    etag = f'"{chave}"'
+    resposta_condicional = get_conditional_response(request, etag=etag)
+    if resposta_condicional is not None:
+        return resposta_condicional
+
+    tamanho = caminho.stat().st_size
+    intervalo = None
+    if "HTTP_RANGE" in request.META:
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if not if_range or if_range == etag:
+            intervalo = _intervalo_solicitado(request.META["HTTP_RANGE"], tamanho)
+
+    if intervalo is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{tamanho}"
+    elif intervalo:
+        inicio, fim = intervalo
+        with open(caminho, "rb") as arquivo:
+            arquivo.seek(inicio)
+            conteudo = arquivo.read(fim - inicio + 1)
+        response = HttpResponse(conteudo, status=206, content_type="application/pdf")
+        response["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+    else:
+        response = FileResponse(open(caminho, "rb"), content_type="application/pdf")
+
+    response["Content-Disposition"] = f'attachment; filename="{nome_arquivo}"'
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class _SaidaZip:
+    """
+    Destino de escrita do ZipFile que apenas acumula os bytes produzidos,
+    para que sejam repassados ao cliente em pedaços.
+    Não implementa tell()/seek(): o zipfile passa a gravar em modo streaming.
+    """
+
+    def __init__(self):
+        self._pedacos = []
+
+    def write(self, dados):
+        self._pedacos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        conteudo = b"".join(self._pedacos)
+        self._pedacos = []
+        return conteudo
+
+
+def _obter_pool(workers):
+    """
+    Pool de processos do tamanho pedido, criado na primeira exportação e
+    reaproveitado pelas seguintes (ver permuta.graficos).
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def _descartar_pool(workers, pool):
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _concluidos(em_andamento, bloquear):
+    if bloquear:
+        prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+    else:
+        prontos = [futuro for futuro in em_andamento if futuro.done()]
+    for futuro in prontos:
+        permuta_id, caminho = em_andamento.pop(futuro)
+        conteudo = futuro.result()
+        gravar_comprovante(caminho, conteudo)
+        yield permuta_id, conteudo
+
+
+def _comprovantes_gerados(permutas, workers):
+    """
+    Produz (permuta_id, bytes do PDF) à medida que cada comprovante fica pronto.
+
+    Comprovantes já presentes no cache são lidos do disco; os demais são
+    enviados ao pool de processos assim que a permuta é lida, já que o
+    reportlab é limitado pela CPU e roda em uma única thread.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = _obter_pool(workers) if workers > 1 else None
+    # Limita as tarefas em andamento para não acumular PDFs na memória
+    # quando o cliente consome a resposta mais devagar que o pool produz.
+    limite = workers * 4
+    em_andamento = {}
+    try:
+        for permuta in permutas:
+            dados = dados_comprovante(permuta)
+            caminho = caminho_comprovante(permuta.id, chave_comprovante(dados))
+            if caminho.exists():
+                yield permuta.id, caminho.read_bytes()
+            elif pool is None:
+                conteudo = renderizar_comprovante(dados)
+                gravar_comprovante(caminho, conteudo)
+                yield permuta.id, conteudo
+            else:
+                em_andamento[pool.submit(renderizar_comprovante, dados)] = (permuta.id, caminho)
+            if em_andamento:
+                yield from _concluidos(em_andamento, bloquear=len(em_andamento) >= limite)
+        while em_andamento:
+            yield from _concluidos(em_andamento, bloquear=True)
+    except BrokenProcessPool:
+        _descartar_pool(workers, pool)
+        raise
+    finally:
+        # Cliente desconectado ou erro: não renderizar o que ninguém vai ler
+        for futuro in em_andamento:
+            futuro.cancel()
+
+
+def gerar_zip_comprovantes(permutas, workers=None):
+    """
+    Gera um arquivo ZIP com os comprovantes das permutas, em pedaços de bytes.
+
+    Cada comprovante é adicionado ao ZIP assim que fica pronto, de modo que os
+    primeiros bytes podem ser enviados antes de todo o lote ser renderizado.
+    As permutas devem vir com select_related(*RELACOES_COMPROVANTE).
+    """
+    saida = _SaidaZip()
+    # Os PDFs do reportlab já são comprimidos; armazenar sem compressão
+    # evita gastar CPU à toa.
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_STORED) as arquivo_zip:
+        for permuta_id, conteudo in _comprovantes_gerados(permutas, workers):
+            info = zipfile.ZipInfo(
+                f"comprovante_permuta_{permuta_id}.pdf",
+                date_time=datetime.now().timetuple()[:6],
+            )
+            arquivo_zip.writestr(info, conteudo)
+            yield saida.esvaziar()
+    yield saida.esvaziar()
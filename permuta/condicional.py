@@ -0,0 +1,72 @@
+"""
+Respostas condicionais (ETag / Last-Modified) para as APIs JSON.
+
+A "marca d'água" de um conjunto de dados é o maior ``atualizado_em`` das
+linhas junto com a quantidade delas (para perceber exclusões), obtidos em
+uma única consulta agregada. Enquanto a marca não muda, o cliente que envia
+If-None-Match / If-Modified-Since recebe 304 sem o corpo, e o payload nem
+chega a ser montado.
+
+Os payloads também mostram nomes de professores, turmas e disciplinas.
+Renomeá-los atualiza o atualizado_em das permutas e horários afetados (ver
+permuta.signals), então a marca d'água das permutas também cobre esses dados.
+
+If-None-Match é a validação completa. If-Modified-Since (resolução de um
+segundo) não percebe exclusões, que não alteram o maior atualizado_em.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Mudar quando o formato dos payloads mudar, para invalidar os ETags antigos
+VERSAO_PAYLOAD = 3
+
+
+def marca_dagua(queryset):
+    """
+    Retorna (maior atualizado_em ou None, quantidade de linhas).
+    """
+    dados = queryset.order_by().aggregate(ultima=Max("atualizado_em"), total=Count("pk"))
+    return dados["ultima"], dados["total"]
+
+
+def marca_dagua_do_professor(queryset, professor):
+    """
+    marca_dagua das permutas do queryset em que o professor é solicitante ou
+    substituto. Em vez de um OR, que o SQLite resolve lendo as linhas, são
+    duas consultas respondidas só pelos índices (professor, período,
+    atualizado_em) da permuta.
+    """
+    marcas = [
+        marca_dagua(queryset.filter(professor_solicitante=professor)),
+        marca_dagua(queryset.filter(professor_substituto=professor)),
+    ]
+    ultimas = [ultima for ultima, _ in marcas if ultima is not None]
+    return (max(ultimas) if ultimas else None, sum(total for _, total in marcas))
+
+
+def resposta_condicional(request, marcas, gerar_resposta, *extras):
+    """
+    Responde 304 se o cliente já tem a versão atual; senão chama
+    ``gerar_resposta()`` e acrescenta ETag e Last-Modified.
+
+    ``marcas`` é uma lista de marcas d'água (ver marca_dagua) e ``extras``
+    são outros valores que alteram o payload (usuário, data de hoje etc.).
+    """
+    ultimas = [ultima for ultima, _ in marcas if ultima is not None]
+    ultima_modificacao = max(ultimas) if ultimas else None
+
+    assinatura = repr((VERSAO_PAYLOAD, request.path, request.GET.urlencode(), marcas, extras))
+    etag = f'W/"{hashlib.sha256(assinatura.encode()).hexdigest()[:32]}"'
+    timestamp = int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+
+    resposta = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if resposta is None:
+        resposta = gerar_resposta()
+    resposta["ETag"] = etag
+    if timestamp is not None:
+        resposta["Last-Modified"] = http_date(timestamp)
+    resposta["Cache-Control"] = "private, no-cache"
+    return resposta
@@ -0,0 +1,150 @@
+"""
+Contadores de permutas por professor solicitante e por disciplina.
+
+Cada permuta conta em quatro linhas: (professor, status), (professor,
+TOTAL), (disciplina, status) e (disciplina, TOTAL). Os sinais das permutas
+(criação, alteração, mudança de status, exclusão e criação em lote) chamam
+registrar_alteracao com o estado anterior e o atual de cada permuta, e as
+linhas afetadas recebem UPDATE total = total + n na mesma transação da
+alteração. Os rankings leem as linhas TOTAL pelo índice (status, -total).
+
+Mudanças que não disparam sinais (QuerySet.update, alteração da disciplina
+de um horário) deixam os contadores defasados até o comando
+reconciliar_contadores.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from cadastros.models import HorarioAula
+
+from .models import ContadorDisciplina, ContadorProfessor, Permuta
+
+TOTAL = "TOTAL"
+
+# Modelo do contador -> (campo no contador, campo de agrupamento na permuta)
+CONTADORES = {
+    ContadorProfessor: ("professor_id", "professor_solicitante_id"),
+    ContadorDisciplina: ("disciplina_id", "horario__disciplina_id"),
+}
+
+
+def estado(permuta):
+    """
+    (professor solicitante, horário, status) da permuta, ou None se algum
+    deles não estiver carregado (campos adiados com .only()/.defer()).
+    """
+    valores = permuta.__dict__
+    atual = (
+        valores.get("professor_solicitante_id"),
+        valores.get("horario_id"),
+        valores.get("status"),
+    )
+    return None if None in atual else atual
+
+
+def registrar_alteracao(anteriores=(), atuais=()):
+    """
+    Retira dos contadores os estados ``anteriores`` e soma os ``atuais``
+    (tuplas de estado()). Estados None são ignorados.
+    """
+    anteriores = [item for item in anteriores if item is not None]
+    atuais = [item for item in atuais if item is not None]
+    if Counter(anteriores) == Counter(atuais):
+        return
+
+    disciplinas = dict(
+        HorarioAula.objects.filter(
+            pk__in={horario_id for _, horario_id, _ in anteriores + atuais}
+        ).values_list("id", "disciplina_id")
+    )
+    variacoes = Counter()
+    for itens, sinal in ((anteriores, -1), (atuais, 1)):
+        for professor_id, horario_id, status in itens:
+            for chave_status in (status, TOTAL):
+                variacoes[(ContadorProfessor, professor_id, chave_status)] += sinal
+                if horario_id in disciplinas:
+                    variacoes[(ContadorDisciplina, disciplinas[horario_id], chave_status)] += sinal
+    aplicar(variacoes)
+
+
+def aplicar(variacoes):
+    """
+    Soma ``variacoes`` ({(modelo, referência, status): n}) aos contadores,
+    criando as linhas que ainda não existem.
+    """
+    variacoes = {chave: n for chave, n in variacoes.items() if n}
+    if not variacoes:
+        return
+    with transaction.atomic():
+        for modelo, (campo, _) in CONTADORES.items():
+            modelo.objects.bulk_create(
+                [
+                    modelo(**{campo: referencia}, status=status)
+                    for (modelo_chave, referencia, status) in variacoes
+                    if modelo_chave is modelo
+                ],
+                ignore_conflicts=True,
+            )
+        for (modelo, referencia, status), n in variacoes.items():
+            campo = CONTADORES[modelo][0]
+            modelo.objects.filter(**{campo: referencia}, status=status).update(total=F("total") + n)
+
+
+def _ranking(modelo, relacao, quantidade):
+    linhas = (
+        modelo.objects.filter(status=TOTAL, total__gt=0)
+        .order_by("-total", CONTADORES[modelo][0])
+        .select_related(relacao)[:quantidade]
+    )
+    ranking = []
+    for linha in linhas:
+        objeto = getattr(linha, relacao.split("__")[0])
+        objeto.total_permutas = linha.total
+        ranking.append(objeto)
+    return ranking
+
+
+def top_professores(quantidade=5):
+    """
+    Professores que mais solicitaram permutas, com ``total_permutas``.
+    """
+    return _ranking(ContadorProfessor, "professor__user", quantidade)
+
+
+def top_disciplinas(quantidade=5):
+    """
+    Disciplinas mais permutadas, com ``total_permutas``.
+    """
+    return _ranking(ContadorDisciplina, "disciplina", quantidade)
+
+
+def reconciliar(corrigir=True):
+    """
+    Recalcula os contadores a partir das permutas e corrige as linhas
+    divergentes (ou só as conta, com ``corrigir=False``).
+
+    Retorna {modelo: quantidade de linhas divergentes}.
+    """
+    divergencias = {}
+    with transaction.atomic():
+        for modelo, (campo, agrupamento) in CONTADORES.items():
+            esperados = Counter()
+            linhas = Permuta.objects.order_by().values(agrupamento, "status").annotate(n=Count("id"))
+            for linha in linhas:
+                esperados[(linha[agrupamento], linha["status"])] += linha["n"]
+                esperados[(linha[agrupamento], TOTAL)] += linha["n"]
+            atuais = {
+                (referencia, status): total
+                for referencia, status, total in modelo.objects.values_list(campo, "status", "total")
+            }
+            diferencas = {
+                chave: esperados.get(chave, 0) - atuais.get(chave, 0)
+                for chave in set(esperados) | set(atuais)
+                if esperados.get(chave, 0) != atuais.get(chave, 0)
+            }
+            divergencias[modelo] = len(diferencas)
+            if corrigir:
+                aplicar({(modelo, referencia, status): n for (referencia, status), n in diferencas.items()})
+    return divergencias
@@ -0,0 +1,171 @@
+"""
+Sugestão de horários livres para a reposição de uma permuta.
+
+O dia é dividido em faixas de MINUTOS_POR_FAIXA minutos. A grade semanal
+(HorarioAula) da turma e do professor vira uma matriz booleana de ocupação
+(dia da semana x faixa); repetida ao longo do horizonte, ela dá a ocupação
+de cada data (data x faixa), sobre a qual são marcadas as exceções: aulas
+que o professor assume como substituto e reposições já registradas da turma
+ou do professor.
+
+Os inícios candidatos são os horários de início das aulas do mesmo turno da
+turma. A duração da reposição é a da aula permutada, e uma janela está livre
+se nenhuma faixa dela estiver ocupada (verificado para todas as datas e
+inícios de uma vez com somas acumuladas). São quatro consultas ao banco, e
+o custo do resto não depende da quantidade de aulas e permutas.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.db.models import Q
+
+from cadastros.models import HorarioAula
+
+from .models import Permuta, Reposicao
+from .services import DIAS_DA_SEMANA
+
+MINUTOS_POR_FAIXA = 5
+FAIXAS_POR_DIA = 24 * 60 // MINUTOS_POR_FAIXA
+
+HORIZONTE_PADRAO = 60
+HORIZONTE_MAXIMO = 366
+SUGESTOES_PADRAO = 5
+SUGESTOES_MAXIMO = 50
+
+CODIGOS_DIAS = {numero: codigo for codigo, numero in DIAS_DA_SEMANA.items()}
+DOMINGO = 6
+
+
+def _faixas(inicios, fins):
+    """
+    Converte horários de início e fim em índices de faixa [inicio, fim).
+    """
+    inicios = np.array([hora.hour * 60 + hora.minute for hora in inicios], dtype=np.int64)
+    fins = np.array([hora.hour * 60 + hora.minute for hora in fins], dtype=np.int64)
+    return inicios // MINUTOS_POR_FAIXA, -(-fins // MINUTOS_POR_FAIXA)
+
+
+def _marcar(matriz, linhas, inicios, fins):
+    """
+    Marca como ocupadas, em cada linha, as faixas de cada intervalo.
+    """
+    if not len(linhas):
+        return
+    inicios, fins = _faixas(inicios, fins)
+    faixas = np.arange(FAIXAS_POR_DIA)
+    intervalos = (faixas >= inicios[:, None]) & (faixas < fins[:, None])
+    np.logical_or.at(matriz, np.asarray(linhas), intervalos)
+
+
+def ocupacao_semanal(horarios):
+    """
+    Matriz (7 x FAIXAS_POR_DIA) com as faixas ocupadas em cada dia da
+    semana (0 = segunda). ``horarios``: tuplas (dia_semana, inicio, fim).
+    """
+    semana = np.zeros((7, FAIXAS_POR_DIA), dtype=bool)
+    semana[DOMINGO] = True
+    if horarios:
+        dias, inicios, fins = zip(*horarios)
+        _marcar(semana, [DIAS_DA_SEMANA[dia] for dia in dias], inicios, fins)
+    return semana
+
+
+def ocupacao_no_periodo(semana, inicio, dias, excecoes=()):
+    """
+    Matriz (dias x FAIXAS_POR_DIA) de ocupação a partir de ``inicio``,
+    com as ``excecoes`` (tuplas data, início, fim) marcadas por cima.
+    """
+    dias_semana = (inicio.weekday() + np.arange(dias)) % 7
+    periodo = semana[dias_semana]
+    excecoes = [
+        ((data - inicio).days, hora_inicio, hora_fim)
+        for data, hora_inicio, hora_fim in excecoes
+        if 0 <= (data - inicio).days < dias
+    ]
+    if excecoes:
+        linhas, inicios, fins = zip(*excecoes)
+        _marcar(periodo, linhas, inicios, fins)
+    return periodo
+
+
+def janelas_livres(ocupacao, inicios, duracao):
+    """
+    Matriz (dias x inícios): True onde as ``duracao`` faixas a partir de
+    cada início estão todas livres.
+    """
+    acumulado = np.zeros((ocupacao.shape[0], FAIXAS_POR_DIA + 1), dtype=np.int32)
+    np.cumsum(ocupacao, axis=1, out=acumulado[:, 1:])
+    return (acumulado[:, inicios + duracao] - acumulado[:, inicios]) == 0
+
+
+def horarios_livres(permuta, quantidade=SUGESTOES_PADRAO, dias=HORIZONTE_PADRAO, inicio=None):
+    """
+    Próximas ``quantidade`` datas/horários, nos ``dias`` a partir de
+    ``inicio`` (padrão: amanhã), em que a turma da aula permutada e o
+    professor solicitante estão livres pela duração da aula.
+    """
+    horario = permuta.horario
+    turma = horario.turma
+    professor_id = permuta.professor_solicitante_id
+    inicio = inicio or date.today() + timedelta(days=1)
+    fim = inicio + timedelta(days=dias - 1)
+    nao_cancelada = ~Q(permuta__status="CANCELADA")
+
+    # Grade semanal da turma e do professor
+    grade = list(
+        HorarioAula.objects.filter(Q(turma=turma) | Q(professor_id=professor_id))
+        .values_list("dia_semana", "hora_inicio", "hora_fim")
+    )
+
+    # Aulas em que o professor é substituto (permutas não canceladas)
+    substituicoes = list(
+        Permuta.objects.filter(
+            professor_substituto_id=professor_id,
+            data_aula__range=(inicio, fim),
+        )
+        .exclude(status="CANCELADA")
+        .values_list("data_aula", "horario__hora_inicio", "horario__hora_fim")
+    )
+
+    # Reposições já marcadas para a turma ou dadas pelo professor
+    reposicoes = list(
+        Reposicao.objects.filter(
+            Q(permuta__horario__turma=turma) | Q(permuta__professor_solicitante_id=professor_id),
+            nao_cancelada,
+            data_reposicao__range=(inicio, fim),
+        ).values_list("data_reposicao", "permuta__horario__hora_inicio", "permuta__horario__hora_fim")
+    )
+
+    # Inícios candidatos: os horários de aula do turno da turma
+    horas_inicio = sorted(set(
+        HorarioAula.objects.filter(turma__turno=turma.turno)
+        .values_list("hora_inicio", flat=True)
+    ))
+
+    duracao_minutos = (
+        datetime.combine(inicio, horario.hora_fim) - datetime.combine(inicio, horario.hora_inicio)
+    ).seconds // 60
+    duracao = -(-duracao_minutos // MINUTOS_POR_FAIXA)
+    inicios, _ = _faixas(horas_inicio, horas_inicio)
+    validos = inicios + duracao <= FAIXAS_POR_DIA
+    inicios = inicios[validos]
+    horas_inicio = [hora for hora, valido in zip(horas_inicio, validos) if valido]
+    if not horas_inicio:
+        return []
+
+    ocupacao = ocupacao_no_periodo(ocupacao_semanal(grade), inicio, dias, substituicoes + reposicoes)
+    livres = janelas_livres(ocupacao, inicios, duracao)
+
+    # np.nonzero percorre por data e, dentro da data, por horário
+    linhas, colunas = np.nonzero(livres)
+    sugestoes = []
+    for linha, coluna in zip(linhas[:quantidade].tolist(), colunas[:quantidade].tolist()):
+        data = inicio + timedelta(days=linha)
+        hora_inicio = horas_inicio[coluna]
+        sugestoes.append({
+            "data": data,
+            "dia_semana": CODIGOS_DIAS[data.weekday()],
+            "hora_inicio": hora_inicio,
+            "hora_fim": (datetime.combine(data, hora_inicio) + timedelta(minutes=duracao_minutos)).time(),
+        })
+    return sugestoes
@@ -0,0 +1,90 @@
+"""
+Exportação das permutas em CSV e JSON Lines para análise externa (BI).
+
+Cada linha é um dicionário montado pelo próprio SQL: as junções com
+professores, usuários, horário, turma, disciplina e reposição viram colunas
+de um único values(), lido do cursor em pedaços (iterator), sem criar
+instâncias de modelo. As linhas são produzidas uma a uma para o
+StreamingHttpResponse: o download começa na hora e a memória usada não
+depende da quantidade de permutas.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+
+TAMANHO_PEDACO = 2000
+
+
+def _nome(prefixo):
+    # Mesmo critério de Professor.nome: nome completo ou, se vazio, o username
+    return Coalesce(
+        NullIf(
+            Trim(Concat(f"{prefixo}__user__first_name", Value(" "), f"{prefixo}__user__last_name")),
+            Value(""),
+        ),
+        F(f"{prefixo}__user__username"),
+        output_field=CharField(),
+    )
+
+
+# Colunas na ordem do arquivo: nome da coluna -> campo ou expressão
+COLUNAS = {
+    "id": F("id"),
+    "status": F("status"),
+    "data_aula": F("data_aula"),
+    "data_solicitacao": F("data_solicitacao"),
+    "data_decisao": F("data_decisao"),
+    "motivo": F("motivo"),
+    "solicitante_id": F("professor_solicitante_id"),
+    "solicitante_nome": _nome("professor_solicitante"),
+    "solicitante_siape": F("professor_solicitante__matricula_siape"),
+    "substituto_id": F("professor_substituto_id"),
+    "substituto_nome": _nome("professor_substituto"),
+    "substituto_siape": F("professor_substituto__matricula_siape"),
+    "turma": F("horario__turma__codigo_turma"),
+    "disciplina": F("horario__disciplina__nome"),
+    "dia_semana": F("horario__dia_semana"),
+    "hora_inicio": F("horario__hora_inicio"),
+    "hora_fim": F("horario__hora_fim"),
+    "data_reposicao": F("reposicao__data_reposicao"),
+    "decisor": F("usuario_decisor__username"),
+    "atualizado_em": F("atualizado_em"),
+}
+
+
+def linhas(permutas):
+    """
+    Dicionários (uma linha por permuta) do queryset ``permutas``, lidos em
+    pedaços de TAMANHO_PEDACO.
+    """
+    # Prefixo nos aliases: values() não aceita expressão com o nome de um campo do modelo
+    expressoes = {f"_{coluna}": expressao for coluna, expressao in COLUNAS.items()}
+    for linha in permutas.values(**expressoes).iterator(chunk_size=TAMANHO_PEDACO):
+        yield {coluna: linha[f"_{coluna}"] for coluna in COLUNAS}
+
+
+class _Eco:
+    """
+    "Arquivo" cujo write devolve o texto, para o csv.writer produzir strings.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(permutas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(list(COLUNAS))
+    for linha in linhas(permutas):
+        yield escritor.writerow([
+            "" if valor is None else valor.isoformat() if hasattr(valor, "isoformat") else valor
+            for valor in linha.values()
+        ])
+
+
+def gerar_jsonl(permutas):
+    for linha in linhas(permutas):
+        yield json.dumps(linha, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
@@ -1,7 +1,12 @@
 from django import forms
-from .models import Permuta, Reposicao
+from django.db.models import Q
+from .models import PeriodoLetivo, Permuta, Reposicao
+from .services import datas_das_aulas
 from accounts.models import Professor
 
+# Maior período aceito em uma solicitação de ausência
+LIMITE_DIAS_AUSENCIA = 93
+
 
 class PermutaSolicitacaoForm(forms.ModelForm):
     class Meta:
@@ -21,13 +26,101 @@ class PermutaSolicitacaoForm(forms.ModelForm):
         professor_solicitante = kwargs.pop("professor_solicitante", None)
         super().__init__(*args, **kwargs)
 
-        qs = Professor.objects.all()
+        qs = Professor.objects.select_related("user")
         if professor_solicitante is not None:
             qs = qs.exclude(id=professor_solicitante.id)
 
         self.fields["professor_substituto"].queryset = qs
 
 
+class AusenciaForm(forms.Form):
+    """
+    Ausência do professor em um período: gera uma permuta para cada aula.
+
+    Cada horário pode ter seu próprio substituto; os horários sem substituto
+    usam o "substituto para todas as aulas", e os que ficarem sem nenhum
+    não entram na ausência.
+    """
+
+    data_inicio = forms.DateField(
+        label="Primeiro dia de ausência",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+    )
+    data_fim = forms.DateField(
+        label="Último dia de ausência",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+    )
+    substituto_geral = forms.ModelChoiceField(
+        queryset=Professor.objects.none(),
+        required=False,
+        label="Substituto para todas as aulas",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    motivo = forms.CharField(
+        label="Motivo da ausência",
+        widget=forms.Textarea(attrs={"rows": 4, "class": "form-control"}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.horarios = kwargs.pop("horarios")
+        professor_solicitante = kwargs.pop("professor_solicitante", None)
+        super().__init__(*args, **kwargs)
+
+        qs = Professor.objects.select_related("user")
+        if professor_solicitante is not None:
+            qs = qs.exclude(id=professor_solicitante.id)
+
+        self.fields["substituto_geral"].queryset = qs
+        # As listas de todos os horários são iguais: uma consulta só para renderizá-las
+        opcoes = None
+        for horario in self.horarios:
+            self.fields[f"substituto_{horario.id}"] = forms.ModelChoiceField(
+                queryset=qs,
+                required=False,
+                label=str(horario),
+                empty_label="Usar o substituto para todas as aulas",
+                widget=forms.Select(attrs={"class": "form-select"}),
+            )
+            if opcoes is None:
+                opcoes = list(self.fields[f"substituto_{horario.id}"].choices)
+            self.fields[f"substituto_{horario.id}"].widget.choices = opcoes
+
+    def campos_horarios(self):
+        """
+        Pares (horário, campo do substituto) para o template.
+        """
+        return [(horario, self[f"substituto_{horario.id}"]) for horario in self.horarios]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        data_inicio = cleaned_data.get("data_inicio")
+        data_fim = cleaned_data.get("data_fim")
+        if not data_inicio or not data_fim:
+            return cleaned_data
+        if data_inicio > data_fim:
+            raise forms.ValidationError("A data inicial deve ser anterior à data final.")
+        if (data_fim - data_inicio).days >= LIMITE_DIAS_AUSENCIA:
+            raise forms.ValidationError(
+                f"O período de ausência deve ter no máximo {LIMITE_DIAS_AUSENCIA} dias."
+            )
+
+        geral = cleaned_data.get("substituto_geral")
+        substitutos = {}
+        for horario in self.horarios:
+            substituto = cleaned_data.get(f"substituto_{horario.id}") or geral
+            if substituto is not None:
+                substitutos[horario] = substituto
+        if not substitutos:
+            raise forms.ValidationError(
+                "Indique um substituto para todas as aulas ou para cada horário."
+            )
+        if not any(datas_das_aulas(horario, data_inicio, data_fim) for horario in substitutos):
+            raise forms.ValidationError("Não há aulas desses horários no período informado.")
+
+        cleaned_data["substitutos"] = substitutos
+        return cleaned_data
+
+
 class ReposicaoForm(forms.ModelForm):
     class Meta:
         model = Reposicao
@@ -40,3 +133,64 @@ class ReposicaoForm(forms.ModelForm):
             "data_reposicao": forms.DateInput(attrs={"type": "date"}),
             "observacao": forms.Textarea(attrs={"rows": 4}),
         }
+
+
+class FiltroPermutasForm(forms.Form):
+    """
+    Filtros usados nas exportações e relatórios da coordenação.
+    """
+
+    status = forms.ChoiceField(
+        choices=[("", "Todos")] + Permuta.STATUS_CHOICES,
+        required=False,
+        label="Status",
+    )
+    data_inicio = forms.DateField(required=False, label="Aulas a partir de")
+    data_fim = forms.DateField(required=False, label="Aulas até")
+    professor = forms.ModelChoiceField(
+        queryset=Professor.objects.select_related("user"),
+        required=False,
+        label="Professor",
+    )
+    periodo = forms.ModelChoiceField(
+        queryset=PeriodoLetivo.objects.all(),
+        required=False,
+        label="Período letivo",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        data_inicio = cleaned_data.get("data_inicio")
+        data_fim = cleaned_data.get("data_fim")
+        if data_inicio and data_fim and data_inicio > data_fim:
+            raise forms.ValidationError("A data inicial deve ser anterior à data final.")
+        return cleaned_data
+
+    def periodo_arquivado(self):
+        """
+        Se o período escolhido já foi movido para o arquivo (as permutas
+        dele estão em PermutaArquivada).
+        """
+        periodo = self.cleaned_data.get("periodo")
+        return periodo is not None and periodo.arquivado
+
+    def filtrar(self, permutas):
+        """
+        Aplica os filtros válidos ao queryset de permutas (Permuta ou
+        PermutaArquivada).
+        """
+        dados = self.cleaned_data
+        if dados.get("periodo"):
+            permutas = permutas.filter(periodo=dados["periodo"])
+        if dados.get("status"):
+            permutas = permutas.filter(status=dados["status"])
+        if dados.get("data_inicio"):
+            permutas = permutas.filter(data_aula__gte=dados["data_inicio"])
+        if dados.get("data_fim"):
+            permutas = permutas.filter(data_aula__lte=dados["data_fim"])
+        if dados.get("professor"):
+            professor = dados["professor"]
+            permutas = permutas.filter(
+                Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+            )
+        return permutas
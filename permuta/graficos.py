@@ -0,0 +1,205 @@
+"""
+Gráficos (PNG em base64) do dashboard de estatísticas da coordenação.
+
+Os gráficos usam a API orientada a objetos do matplotlib (Figure com o
+canvas Agg), sem o estado global do pyplot, que não é seguro entre threads.
+``renderizar`` gera os gráficos de uma requisição em paralelo em um pool de
+GRAFICOS_PROCESSOS processos, mantido aberto, com o matplotlib já importado e
+as fontes carregadas. Nos processos do servidor, o pool é iniciado em
+PermutaConfig.ready() (``iniciar_pool``) e os processos se aquecem em
+segundo plano desde a subida da aplicação; nos demais, e se ele for
+encerrado ou falhar, a próxima chamada cria outro. Com 0, ou se o pool
+falhar, os gráficos são gerados no próprio processo.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+logger = logging.getLogger(__name__)
+
+# Segundos de espera por um gráfico do pool antes de gerá-lo aqui mesmo
+TEMPO_MAXIMO = 30
+
+_pool = None
+_pool_processos = None
+_pool_lock = threading.Lock()
+
+
+def _figura(largura, altura):
+    fig = Figure(figsize=(largura, altura))
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def _png_base64(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def grafico_status(aprovadas, pendentes, canceladas):
+    """
+    Gráfico de pizza com a distribuição das permutas por status.
+    """
+    fig1, ax1 = _figura(6, 4)
+    status_counts = [aprovadas, pendentes, canceladas]
+    status_labels = ["Aprovadas", "Pendentes", "Canceladas"]
+    colors = ["#28a745", "#ffc107", "#dc3545"]
+
+    if sum(status_counts) > 0:
+        # Não colocamos labels direto nas fatias para evitar sobreposição
+        wedges, texts, autotexts = ax1.pie(
+            status_counts,
+            labels=None,  # sem rótulo de texto na borda da fatia
+            colors=colors,
+            autopct="%1.1f%%",
+            startangle=90,
+        )
+
+        # Deixa o círculo “certinho”
+        ax1.axis("equal")
+        ax1.set_title("Distribuição por Status", fontsize=14, fontweight="bold")
+
+        # Ajusta o estilo do percentual sobre as fatias
+        for autot in autotexts:
+            autot.set_color("white")
+            autot.set_fontsize(9)
+
+        # Legenda com os nomes dos status, ao lado do gráfico
+        ax1.legend(
+            wedges,
+            status_labels,
+            title="Status",
+            loc="center left",
+            bbox_to_anchor=(1, 0.5),
+        )
+    else:
+        ax1.text(0.5, 0.5, "Sem dados", ha="center", va="center")
+        ax1.set_xlim(-1, 1)
+        ax1.set_ylim(-1, 1)
+
+    return _png_base64(fig1)
+
+
+def grafico_mensal(meses, quantidades):
+    """
+    Gráfico de barras com as permutas por mês.
+    """
+    fig2, ax2 = _figura(8, 4)
+    bars = ax2.bar(meses, quantidades, color="#28a745", alpha=0.7)
+    ax2.set_xlabel("Mês")
+    ax2.set_ylabel("Quantidade")
+    ax2.set_title("Permutas por Mês (últimos 6 meses)", fontsize=14, fontweight="bold")
+    ax2.tick_params(axis="x", rotation=45)
+
+    for bar in bars:
+        height = bar.get_height()
+        ax2.text(
+            bar.get_x() + bar.get_width() / 2.0,
+            height,
+            f"{int(height)}",
+            ha="center",
+            va="bottom",
+        )
+
+    return _png_base64(fig2)
+
+
+def _aquecer():
+    # Inicialização de cada processo do pool: o primeiro gráfico carrega as
+    # fontes e o Agg, e as requisições não pagam por isso
+    grafico_status(1, 1, 1)
+    grafico_mensal(["jan"], [1])
+
+
+def _obter_pool():
+    global _pool, _pool_processos
+    processos = getattr(settings, "GRAFICOS_PROCESSOS", 2)
+    if processos <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_processos != processos:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(
+                max_workers=processos, mp_context=get_context("spawn"), initializer=_aquecer
+            )
+            _pool_processos = processos
+        return _pool
+
+
+def iniciar_pool():
+    """
+    Cria o pool e inicia todos os processos, sem esperar o aquecimento.
+    """
+    pool = _obter_pool()
+    if pool is None:
+        return
+    # O executor só inicia um processo ao receber uma tarefa
+    processos = getattr(settings, "GRAFICOS_PROCESSOS", 2)
+    try:
+        for _ in range(processos):
+            pool.submit(os.getpid)
+    except (BrokenProcessPool, RuntimeError):
+        logger.exception("Erro ao iniciar o pool de gráficos")
+        _descartar_pool(pool)
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def encerrar_pool():
+    """
+    Encerra os processos do pool (o próximo gráfico cria outro).
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def renderizar(*pedidos):
+    """
+    Gera os gráficos pedidos, cada um como (função, argumentos), em paralelo
+    no pool de processos, e retorna as imagens na mesma ordem. Ex.:
+
+        pizza, barras = renderizar(
+            (grafico_status, (aprovadas, pendentes, canceladas)),
+            (grafico_mensal, (meses, quantidades)),
+        )
+    """
+    pool = _obter_pool()
+    if pool is None:
+        return [funcao(*argumentos) for funcao, argumentos in pedidos]
+
+    try:
+        futuros = [pool.submit(funcao, *argumentos) for funcao, argumentos in pedidos]
+    except (BrokenProcessPool, RuntimeError):
+        logger.exception("Erro no pool de gráficos, gerando no processo da requisição")
+        _descartar_pool(pool)
+        return [funcao(*argumentos) for funcao, argumentos in pedidos]
+
+    imagens = []
+    for futuro, (funcao, argumentos) in zip(futuros, pedidos):
+        try:
+            imagens.append(futuro.result(timeout=TEMPO_MAXIMO))
+        except (BrokenProcessPool, TimeoutError):
+            logger.exception("Erro no pool de gráficos, gerando no processo da requisição")
+            _descartar_pool(pool)
+            imagens.append(funcao(*argumentos))
+    return imagens
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from permuta import periodos
+from permuta.models import PeriodoLetivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as permutas e notificações dos períodos letivos encerrados para "
+        "as tabelas de arquivo (ver permuta.periodos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--periodo",
+            help="Nome do período a arquivar (padrão: todos os encerrados há mais de --carencia dias).",
+        )
+        parser.add_argument(
+            "--carencia",
+            type=int,
+            default=periodos.DIAS_CARENCIA,
+            help=f"Dias após o fim do período antes de arquivá-lo (padrão: {periodos.DIAS_CARENCIA}).",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=periodos.TAMANHO_LOTE,
+            help=f"Linhas movidas por transação (padrão: {periodos.TAMANHO_LOTE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] <= 0:
+            raise CommandError("--lote deve ser positivo.")
+
+        if options["periodo"]:
+            try:
+                selecionados = [PeriodoLetivo.objects.get(nome=options["periodo"], arquivado_em__isnull=True)]
+            except PeriodoLetivo.DoesNotExist:
+                raise CommandError(f"Período não encontrado ou já arquivado: {options['periodo']}")
+        else:
+            selecionados = list(periodos.encerrados(carencia=options["carencia"]))
+            if not selecionados:
+                self.stdout.write("Nenhum período encerrado para arquivar.")
+                return
+
+        falhas = 0
+        for periodo in selecionados:
+            try:
+                permutas, notificacoes = periodos.arquivar_periodo(periodo, options["lote"])
+            except ValueError as e:
+                self.stderr.write(str(e))
+                falhas += 1
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"Período {periodo} arquivado: {permutas} permuta(s), {notificacoes} notificação(ões)."
+            ))
+        if falhas:
+            raise CommandError(f"{falhas} período(s) não arquivado(s).")
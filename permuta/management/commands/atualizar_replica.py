@@ -0,0 +1,49 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from permuta_aulas import replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia o banco principal para a réplica de leitura (SQLite) usada por "
+        "estatísticas, exportações, relatórios e feeds de calendário."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Repete a cópia a cada tantos segundos (padrão: copia uma vez e termina).",
+        )
+        parser.add_argument(
+            "--paginas",
+            type=int,
+            default=replica.PAGINAS_POR_PASSO,
+            help=f"Páginas copiadas por passo (padrão: {replica.PAGINAS_POR_PASSO}; -1 copia tudo de uma vez).",
+        )
+
+    def handle(self, *args, **options):
+        if options["paginas"] == 0:
+            raise CommandError("--paginas deve ser positivo ou -1.")
+
+        try:
+            while True:
+                close_old_connections()
+                inicio = time.monotonic()
+                try:
+                    tamanho = replica.atualizar_replica(options["paginas"])
+                except ImproperlyConfigured as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS(
+                    f"Réplica atualizada ({tamanho / 1024:.0f} KB) em {time.monotonic() - inicio:.1f}s."
+                ))
+                if options["intervalo"] <= 0:
+                    break
+                time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            self.stdout.write("Interrompido.")
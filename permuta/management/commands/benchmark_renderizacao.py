@@ -0,0 +1,315 @@
+"""
+Micro-benchmark dos renderizadores pesados (comprovante PDF, relatório PDF,
+relatório Excel e gráficos do dashboard) com baseline de regressão.
+
+Os dados são semeados em um banco de teste descartável (o mesmo que o
+``manage.py test`` cria), nunca no banco configurado. Para cada renderizador
+e tamanho são medidos o tempo (o menor das repetições, após uma execução de
+aquecimento), o pico de memória alocada pelo Python (tracemalloc) e o
+tamanho da saída.
+
+Com ``--salvar`` os resultados viram a baseline; sem ele, são comparados com
+a baseline gravada e o comando falha se algum valor piorar mais que
+``--limite``. O tempo varia com a carga da máquina: o menor das repetições é
+a medida mais estável (o ruído só aumenta o tempo), e pioras abaixo de
+TOLERANCIA_TEMPO não contam. Memória e tamanho são determinísticos.
+"""
+import io
+import json
+import platform
+import random
+import time
+import tracemalloc
+from dataclasses import fields
+from datetime import time as hora, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import Professor
+from cadastros.models import Disciplina, HorarioAula, Turma
+from permuta import analise, graficos, relatorios
+from permuta.comprovantes import RELACOES_COMPROVANTE, dados_comprovante, renderizar_comprovante
+from permuta.models import PeriodoLetivo, Permuta, Reposicao
+
+TAMANHOS_PADRAO = "10,100,1000"
+REPETICOES_PADRAO = 9
+LIMITE_PADRAO = 0.2
+# Pioras de tempo menores que isso (segundos) são ruído, mesmo acima do limite
+TOLERANCIA_TEMPO = 0.05
+
+PROFESSORES = 12
+TURMAS = 6
+DISCIPLINAS = 8
+HORARIOS = 40
+STATUS = ["APROVADA", "APROVADA", "PENDENTE", "RECUSADA", "CANCELADA"]
+
+
+def _permutas():
+    return Permuta.objects.select_related(*RELACOES_COMPROVANTE).order_by("id")
+
+
+def _comprovantes(permutas):
+    return sum(len(renderizar_comprovante(dados_comprovante(permuta))) for permuta in permutas)
+
+
+def _relatorio_pdf(permutas):
+    arquivo = io.BytesIO()
+    relatorios.gerar_pdf(permutas[:relatorios.LIMITE_PDF], arquivo)
+    return len(arquivo.getvalue())
+
+
+def _relatorio_excel(permutas):
+    arquivo = io.BytesIO()
+    relatorios.gerar_excel(permutas, arquivo)
+    return len(arquivo.getvalue())
+
+
+def _graficos(permutas):
+    # O retrato lê todas as permutas do banco: fica só com as do tamanho medido
+    retrato = analise.carregar_retrato()
+    selecionadas = retrato.ids <= permutas.aggregate(ultima=Max("id"))["ultima"]
+    retrato = analise.Retrato(**{
+        campo.name: getattr(retrato, campo.name)[selecionadas] for campo in fields(retrato)
+    })
+    dados = analise.indicadores(retrato, timezone.localdate())
+    por_status = dados["por_status"]
+    pizza = graficos.grafico_status(por_status["APROVADA"], por_status["PENDENTE"], por_status["CANCELADA"])
+    barras = graficos.grafico_mensal(
+        [item["mes"].strftime("%b/%Y") for item in dados["permutas_por_mes"]],
+        [item["quantidade"] for item in dados["permutas_por_mes"]],
+    )
+    return len(pizza) + len(barras)
+
+
+# Nome -> função que renderiza as permutas e retorna o tamanho da saída em bytes
+RENDERIZADORES = {
+    "comprovante_pdf": _comprovantes,
+    "relatorio_pdf": _relatorio_pdf,
+    "relatorio_excel": _relatorio_excel,
+    "graficos": _graficos,
+}
+
+
+def semear(total):
+    """
+    Cria professores, turmas, disciplinas, horários e ``total`` permutas
+    (com reposição nas aprovadas), sempre com os mesmos valores.
+    """
+    sorteio = random.Random(42)
+    admin = User.objects.create_superuser("benchmark", "benchmark@exemplo.com", "benchmark")
+    professores = [
+        Professor.objects.create(
+            user=User.objects.create_user(
+                f"professor{i}", first_name=f"Professor {i}", last_name="da Silva Benchmark"
+            ),
+            matricula_siape=f"{100000 + i}",
+            cpf=f"{10000000000 + i}",
+            coordenacao="Informática",
+            usuario_admin=admin,
+        )
+        for i in range(PROFESSORES)
+    ]
+    turmas = [
+        Turma.objects.create(
+            codigo_turma=f"TSI{i}", curso="TSI", periodo=str(i + 1), turno="NOITE", usuario_admin=admin
+        )
+        for i in range(TURMAS)
+    ]
+    disciplinas = [
+        Disciplina.objects.create(
+            nome=f"Disciplina {i}",
+            carga_horaria=60,
+            professor_responsavel=professores[i % PROFESSORES],
+            usuario_admin=admin,
+        )
+        for i in range(DISCIPLINAS)
+    ]
+    dias = [codigo for codigo, _ in HorarioAula.DIA_CHOICES]
+    horarios = [
+        HorarioAula.objects.create(
+            professor=professores[i % PROFESSORES],
+            disciplina=disciplinas[i % DISCIPLINAS],
+            turma=turmas[i % TURMAS],
+            dia_semana=dias[i % len(dias)],
+            hora_inicio=hora(19, 0),
+            hora_fim=hora(20, 40),
+            usuario_admin=admin,
+        )
+        for i in range(HORARIOS)
+    ]
+
+    hoje = timezone.localdate()
+    agora = timezone.now()
+    permutas = []
+    for i in range(total):
+        horario = horarios[sorteio.randrange(HORARIOS)]
+        substituto = sorteio.choice([professor for professor in professores if professor != horario.professor])
+        status = STATUS[i % len(STATUS)]
+        permutas.append(Permuta(
+            data_aula=hoje - timedelta(days=sorteio.randrange(-30, 180)),
+            motivo=f"Participação em evento acadêmico {i}. " * 3,
+            status=status,
+            data_decisao=agora if status in ("APROVADA", "RECUSADA") else None,
+            professor_solicitante=horario.professor,
+            professor_substituto=substituto,
+            horario=horario,
+            usuario_decisor=admin if status in ("APROVADA", "RECUSADA") else None,
+        ))
+    periodos = PeriodoLetivo.objects.para_datas(permuta.data_aula for permuta in permutas)
+    for permuta in permutas:
+        permuta.periodo = periodos[permuta.data_aula]
+    permutas = Permuta.objects.bulk_create(permutas, batch_size=500)
+    Reposicao.objects.bulk_create(
+        [
+            Reposicao(permuta=permuta, data_reposicao=permuta.data_aula + timedelta(days=7), observacao="Sala 3")
+            for permuta in permutas
+            if permuta.status == "APROVADA"
+        ],
+        batch_size=500,
+    )
+    return [permuta.pk for permuta in permutas]
+
+
+def medir(funcao, permutas, repeticoes):
+    """
+    Retorna {tempo_s, memoria_pico_kb, tamanho_bytes} de funcao(permutas).
+    """
+    tamanho = funcao(permutas)  # aquecimento (imports, fontes, caches)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(permutas)
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        funcao(permutas)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "tempo_s": round(min(tempos), 4),
+        "memoria_pico_kb": round(pico / 1024, 1),
+        "tamanho_bytes": tamanho,
+    }
+
+
+def regressoes(resultados, baseline, limite):
+    """
+    Lista de mensagens para cada valor que piorou mais que ``limite``
+    (fração) em relação à baseline.
+    """
+    mensagens = []
+    for nome, por_tamanho in resultados.items():
+        for tamanho, atual in por_tamanho.items():
+            anterior = baseline.get(nome, {}).get(tamanho)
+            if anterior is None:
+                continue
+            for metrica, valor in atual.items():
+                referencia = anterior.get(metrica)
+                if not referencia:
+                    continue
+                if metrica == "tempo_s" and valor - referencia < TOLERANCIA_TEMPO:
+                    continue
+                if valor > referencia * (1 + limite):
+                    mensagens.append(
+                        f"{nome} ({tamanho} permutas): {metrica} {referencia} -> {valor} "
+                        f"(+{(valor / referencia - 1) * 100:.0f}%)"
+                    )
+    return mensagens
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede tempo, memória e tamanho da saída dos renderizadores de PDF, "
+        "Excel e gráficos em dados semeados, comparando com a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanhos",
+            default=TAMANHOS_PADRAO,
+            help=f"Quantidades de permutas, separadas por vírgula (padrão: {TAMANHOS_PADRAO}).",
+        )
+        parser.add_argument(
+            "--renderizadores",
+            default=",".join(RENDERIZADORES),
+            help=f"Quais medir, separados por vírgula (padrão: todos: {', '.join(RENDERIZADORES)}).",
+        )
+        parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO, help="Execuções cronometradas.")
+        parser.add_argument(
+            "--baseline",
+            default=str(settings.BASE_DIR / "benchmarks" / "renderizacao.json"),
+            help="Arquivo JSON da baseline.",
+        )
+        parser.add_argument("--salvar", action="store_true", help="Grava os resultados como nova baseline.")
+        parser.add_argument(
+            "--limite",
+            type=float,
+            default=LIMITE_PADRAO,
+            help=f"Piora máxima aceita, em fração da baseline (padrão: {LIMITE_PADRAO}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            tamanhos = sorted({int(valor) for valor in options["tamanhos"].split(",") if valor.strip()})
+        except ValueError:
+            raise CommandError("--tamanhos deve ser uma lista de inteiros, ex.: 10,100,1000")
+        if not tamanhos or tamanhos[0] <= 0:
+            raise CommandError("Informe ao menos um tamanho positivo.")
+        nomes = [nome.strip() for nome in options["renderizadores"].split(",") if nome.strip()]
+        desconhecidos = set(nomes) - set(RENDERIZADORES)
+        if desconhecidos:
+            raise CommandError(f"Renderizadores desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+        resultados = self._executar(tamanhos, nomes, options["repeticoes"])
+
+        caminho = Path(options["baseline"])
+        if options["salvar"]:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            caminho.write_text(json.dumps({
+                "gerada_em": timezone.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "resultados": resultados,
+            }, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Baseline gravada em {caminho}."))
+            return
+
+        if not caminho.exists():
+            self.stdout.write(f"Sem baseline em {caminho}; rode com --salvar para criá-la.")
+            return
+
+        baseline = json.loads(caminho.read_text(encoding="utf-8"))["resultados"]
+        mensagens = regressoes(resultados, baseline, options["limite"])
+        if mensagens:
+            for mensagem in mensagens:
+                self.stderr.write(mensagem)
+            raise CommandError(f"{len(mensagens)} regressão(ões) acima de {options['limite'] * 100:.0f}%.")
+        self.stdout.write(self.style.SUCCESS("Sem regressões em relação à baseline."))
+
+    def _executar(self, tamanhos, nomes, repeticoes):
+        nome_banco = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            ids = semear(tamanhos[-1])
+            resultados = {nome: {} for nome in nomes}
+            for tamanho in tamanhos:
+                permutas = _permutas().filter(pk__lte=ids[tamanho - 1])
+                for nome in nomes:
+                    medida = medir(RENDERIZADORES[nome], permutas, repeticoes)
+                    resultados[nome][str(tamanho)] = medida
+                    self.stdout.write(
+                        f"{nome:<16} {tamanho:>6} permutas: {medida['tempo_s']:>8.4f} s  "
+                        f"{medida['memoria_pico_kb']:>10.1f} KB  {medida['tamanho_bytes']:>10} bytes"
+                    )
+        finally:
+            connection.creation.destroy_test_db(nome_banco, verbosity=0)
+        return resultados
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from permuta.comprovantes import RELACOES_COMPROVANTE, gerar_zip_comprovantes
+from permuta.forms import FiltroPermutasForm
+from permuta.models import Permuta
+
+
+class Command(BaseCommand):
+    help = "Gera um ZIP com os comprovantes das permutas filtradas (ex.: arquivo de fim de período)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("saida", help="Caminho do arquivo .zip a ser gerado.")
+        parser.add_argument("--status", default="", help="PENDENTE, APROVADA, RECUSADA ou CANCELADA.")
+        parser.add_argument("--data-inicio", default="", help="Aulas a partir desta data (AAAA-MM-DD).")
+        parser.add_argument("--data-fim", default="", help="Aulas até esta data (AAAA-MM-DD).")
+        parser.add_argument("--professor", default="", help="ID do professor (solicitante ou substituto).")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processos usados na renderização (padrão: número de CPUs).",
+        )
+
+    def handle(self, *args, **options):
+        filtros = FiltroPermutasForm({
+            "status": options["status"],
+            "data_inicio": options["data_inicio"],
+            "data_fim": options["data_fim"],
+            "professor": options["professor"],
+        })
+        if not filtros.is_valid():
+            raise CommandError(f"Filtros inválidos: {filtros.errors.as_text()}")
+
+        permutas = filtros.filtrar(
+            Permuta.objects.select_related(*RELACOES_COMPROVANTE)
+        ).order_by("id")
+        total = permutas.count()
+
+        with open(options["saida"], "wb") as arquivo:
+            for pedaco in gerar_zip_comprovantes(permutas.iterator(chunk_size=500), options["workers"]):
+                arquivo.write(pedaco)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} comprovante(s) exportado(s) para {options['saida']}."))
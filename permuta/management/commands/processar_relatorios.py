@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from permuta import relatorios
+
+
+class Command(BaseCommand):
+    help = "Gera os relatórios enfileirados pela coordenação (fila TarefaRelatorio)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uma-vez",
+            action="store_true",
+            help="Processa as tarefas pendentes e termina, em vez de aguardar novas.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos entre as consultas à fila quando ela está vazia (padrão: 2).",
+        )
+
+    def handle(self, *args, **options):
+        reabertas = relatorios.reabrir_expiradas()
+        if reabertas:
+            self.stdout.write(f"{reabertas} tarefa(s) interrompida(s) devolvida(s) à fila.")
+        relatorios.limpar_antigas()
+
+        try:
+            while True:
+                close_old_connections()
+                tarefa = relatorios.proxima_tarefa()
+                if tarefa is None:
+                    if options["uma_vez"]:
+                        break
+                    time.sleep(options["intervalo"])
+                    relatorios.reabrir_expiradas()
+                    continue
+
+                inicio = time.monotonic()
+                if relatorios.executar(tarefa):
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Relatório #{tarefa.id} ({tarefa.tipo}) gerado em {time.monotonic() - inicio:.1f}s."
+                    ))
+                else:
+                    self.stderr.write(f"Relatório #{tarefa.id} falhou: {tarefa.erro}")
+        except KeyboardInterrupt:
+            self.stdout.write("Interrompido.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from permuta import contadores
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores de permutas por professor e por disciplina."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verificar",
+            action="store_true",
+            help="Só informa as divergências, sem corrigir.",
+        )
+
+    def handle(self, *args, **options):
+        corrigir = not options["verificar"]
+        divergencias = contadores.reconciliar(corrigir=corrigir)
+        for modelo, quantidade in divergencias.items():
+            self.stdout.write(f"{modelo._meta.verbose_name_plural}: {quantidade} linha(s) divergente(s)")
+        if not any(divergencias.values()):
+            self.stdout.write(self.style.SUCCESS("Contadores em dia."))
+        elif corrigir:
+            self.stdout.write(self.style.SUCCESS("Contadores corrigidos."))
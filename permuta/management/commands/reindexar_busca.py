@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from permuta import busca
+
+
+class Command(BaseCommand):
+    help = "Reconstrói a tabela de busca textual (FTS5) das permutas."
+
+    def handle(self, *args, **options):
+        if not busca.disponivel():
+            raise CommandError("A busca textual só está disponível com banco SQLite.")
+        busca.reindexar()
+        self.stdout.write(self.style.SUCCESS("Índice de busca reconstruído."))
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+from ._busca_v1 import criar_busca, remover_busca
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('cadastros', '0001_initial'),
+        ('permuta', '0002_notificacao'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca, remover_busca),
+    ]
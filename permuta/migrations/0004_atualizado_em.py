@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+from ._busca_v1 import criar_gatilhos, remover_gatilhos
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permuta', '0003_permuta_busca'),
+    ]
+
+    operations = [
+        # A tabela é recriada pelo SQLite; os triggers da busca saem e voltam
+        migrations.RunPython(remover_gatilhos, criar_gatilhos),
+        migrations.AddField(
+            model_name='notificacao',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='permuta',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Última atualização'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='reposicao',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Última atualização'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(criar_gatilhos, remover_gatilhos),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_dados_existentes(apps, schema_editor):
+    """
+    Registra o estado atual como alterações, para que a primeira
+    sincronização (since=0) traga tudo o que já existe.
+    """
+    Permuta = apps.get_model("permuta", "Permuta")
+    Reposicao = apps.get_model("permuta", "Reposicao")
+    Notificacao = apps.get_model("permuta", "Notificacao")
+    AlteracaoSincronizacao = apps.get_model("permuta", "AlteracaoSincronizacao")
+
+    alteracoes = []
+    usuarios_por_permuta = {}
+    permutas = Permuta.objects.exclude(status="CANCELADA").values_list(
+        "id", "professor_solicitante__user_id", "professor_substituto__user_id"
+    )
+    for permuta_id, solicitante, substituto in permutas.order_by("id").iterator():
+        usuarios_por_permuta[permuta_id] = {solicitante, substituto}
+        for usuario_id in usuarios_por_permuta[permuta_id]:
+            alteracoes.append(AlteracaoSincronizacao(
+                usuario_id=usuario_id, modelo="permuta", objeto_id=permuta_id
+            ))
+    for reposicao_id, permuta_id in Reposicao.objects.values_list("id", "permuta_id").order_by("id").iterator():
+        for usuario_id in usuarios_por_permuta.get(permuta_id, ()):
+            alteracoes.append(AlteracaoSincronizacao(
+                usuario_id=usuario_id, modelo="reposicao", objeto_id=reposicao_id
+            ))
+    for notificacao_id, usuario_id in Notificacao.objects.values_list("id", "usuario_id").order_by("id").iterator():
+        alteracoes.append(AlteracaoSincronizacao(
+            usuario_id=usuario_id, modelo="notificacao", objeto_id=notificacao_id
+        ))
+    AlteracaoSincronizacao.objects.bulk_create(alteracoes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permuta', '0004_atualizado_em'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoSincronizacao',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(choices=[('permuta', 'Permuta'), ('reposicao', 'Reposição'), ('notificacao', 'Notificação')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('removido', models.BooleanField(default=False)),
+                ('data_hora', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Alteração para sincronização',
+                'verbose_name_plural': 'Alterações para sincronização',
+                'indexes': [models.Index(fields=['usuario', 'id'], name='permuta_sinc_usuario_id')],
+            },
+        ),
+        migrations.RunPython(registrar_dados_existentes, migrations.RunPython.noop),
+    ]
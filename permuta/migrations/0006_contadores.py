@@ -0,0 +1,73 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def contar_permutas_existentes(apps, schema_editor):
+    """
+    Preenche os contadores com as permutas já cadastradas.
+    """
+    Permuta = apps.get_model("permuta", "Permuta")
+    ContadorProfessor = apps.get_model("permuta", "ContadorProfessor")
+    ContadorDisciplina = apps.get_model("permuta", "ContadorDisciplina")
+
+    for modelo, campo, agrupamento in (
+        (ContadorProfessor, "professor_id", "professor_solicitante_id"),
+        (ContadorDisciplina, "disciplina_id", "horario__disciplina_id"),
+    ):
+        totais = {}
+        linhas = Permuta.objects.order_by().values(agrupamento, "status").annotate(n=Count("id"))
+        for linha in linhas:
+            referencia = linha[agrupamento]
+            totais[(referencia, linha["status"])] = linha["n"]
+            totais[(referencia, "TOTAL")] = totais.get((referencia, "TOTAL"), 0) + linha["n"]
+        modelo.objects.bulk_create(
+            [modelo(**{campo: referencia}, status=status, total=total)
+             for (referencia, status), total in totais.items()],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('cadastros', '0002_horarioaula_atualizado_em'),
+        ('permuta', '0005_alteracaosincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorDisciplina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('APROVADA', 'Aprovada'), ('RECUSADA', 'Recusada'), ('CANCELADA', 'Cancelada'), ('TOTAL', 'Total')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('disciplina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores_permutas', to='cadastros.disciplina')),
+            ],
+            options={
+                'verbose_name': 'Contador de permutas por disciplina',
+                'verbose_name_plural': 'Contadores de permutas por disciplina',
+                'indexes': [models.Index(fields=['status', '-total', 'disciplina'], name='permuta_contador_disc_top')],
+                'constraints': [models.UniqueConstraint(fields=('disciplina', 'status'), name='permuta_contador_disc_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContadorProfessor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('APROVADA', 'Aprovada'), ('RECUSADA', 'Recusada'), ('CANCELADA', 'Cancelada'), ('TOTAL', 'Total')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores_permutas', to='accounts.professor')),
+            ],
+            options={
+                'verbose_name': 'Contador de permutas por professor',
+                'verbose_name_plural': 'Contadores de permutas por professor',
+                'indexes': [models.Index(fields=['status', '-total', 'professor'], name='permuta_contador_prof_top')],
+                'constraints': [models.UniqueConstraint(fields=('professor', 'status'), name='permuta_contador_prof_unico')],
+            },
+        ),
+        migrations.RunPython(contar_permutas_existentes, migrations.RunPython.noop),
+    ]
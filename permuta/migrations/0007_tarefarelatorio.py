@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permuta', '0006_contadores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('EXCEL', 'Excel'), ('PDF', 'PDF')], max_length=10)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('chave', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Na fila'), ('EXECUTANDO', 'Em execução'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('arquivo', models.CharField(blank=True, max_length=255)),
+                ('nome_arquivo', models.CharField(blank=True, max_length=100)),
+                ('erro', models.TextField(blank=True)),
+                ('solicitante', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas_relatorio', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de relatório',
+                'verbose_name_plural': 'Tarefas de relatório',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['status', 'id'], name='permuta_relatorio_fila'), models.Index(fields=['chave', '-criada_em'], name='permuta_relatorio_chave')],
+            },
+        ),
+    ]
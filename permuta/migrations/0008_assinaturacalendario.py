@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('permuta', '0007_tarefarelatorio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssinaturaCalendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('professor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='assinatura_calendario', to='accounts.professor')),
+            ],
+            options={
+                'verbose_name': 'Assinatura de calendário',
+                'verbose_name_plural': 'Assinaturas de calendário',
+            },
+        ),
+    ]
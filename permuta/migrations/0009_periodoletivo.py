@@ -0,0 +1,163 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:00
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from ._busca_v1 import criar_gatilhos, remover_gatilhos
+
+
+def atribuir_periodos(apps, schema_editor):
+    """
+    Cria um período por semestre com permutas (2026.1: janeiro a junho;
+    2026.2: julho a dezembro) e atribui cada permuta ao seu.
+    """
+    Permuta = apps.get_model("permuta", "Permuta")
+    PeriodoLetivo = apps.get_model("permuta", "PeriodoLetivo")
+
+    semestres = set()
+    for data in Permuta.objects.order_by().values_list("data_aula", flat=True).distinct():
+        semestres.add((data.year, 1 if data.month <= 6 else 2))
+    for ano, semestre in sorted(semestres):
+        inicio = date(ano, 1, 1) if semestre == 1 else date(ano, 7, 1)
+        fim = date(ano, 6, 30) if semestre == 1 else date(ano, 12, 31)
+        periodo = PeriodoLetivo.objects.create(nome=f"{ano}.{semestre}", inicio=inicio, fim=fim)
+        Permuta.objects.filter(data_aula__range=(inicio, fim)).update(periodo=periodo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('cadastros', '0002_horarioaula_atualizado_em'),
+        ('permuta', '0008_assinaturacalendario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # A tabela de permutas é recriada pelo SQLite; os triggers da busca saem e voltam
+        migrations.RunPython(remover_gatilhos, criar_gatilhos),
+        migrations.CreateModel(
+            name='PermutaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('APROVADA', 'Aprovada'), ('RECUSADA', 'Recusada'), ('CANCELADA', 'Cancelada')], max_length=20)),
+                ('data_aula', models.DateField()),
+                ('motivo', models.TextField()),
+                ('data_solicitacao', models.DateTimeField()),
+                ('data_decisao', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField()),
+                ('reposicao_id', models.BigIntegerField(blank=True, null=True)),
+                ('data_reposicao', models.DateField(blank=True, null=True)),
+                ('observacao_reposicao', models.TextField(blank=True)),
+                ('reposicao_registrada_em', models.DateTimeField(blank=True, null=True)),
+                ('arquivada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Permuta arquivada',
+                'verbose_name_plural': 'Permutas arquivadas',
+                'ordering': ['-data_solicitacao'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodoLetivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=40, unique=True)),
+                ('inicio', models.DateField(verbose_name='Início')),
+                ('fim', models.DateField(verbose_name='Fim')),
+                ('arquivado_em', models.DateTimeField(blank=True, help_text='Preenchido quando as permutas do período são movidas para o arquivo.', null=True, verbose_name='Arquivado em')),
+            ],
+            options={
+                'verbose_name': 'Período letivo',
+                'verbose_name_plural': 'Períodos letivos',
+                'ordering': ['-inicio'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('inicio__lte', models.F('fim'))), name='permuta_periodo_datas')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificacaoArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('mensagem', models.TextField()),
+                ('lida', models.BooleanField(default=False)),
+                ('data_criacao', models.DateTimeField()),
+                ('link', models.CharField(blank=True, max_length=255)),
+                ('arquivada_em', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='notificacoes_arquivadas', to='permuta.periodoletivo')),
+            ],
+            options={
+                'verbose_name': 'Notificação arquivada',
+                'verbose_name_plural': 'Notificações arquivadas',
+                'ordering': ['-data_criacao'],
+            },
+        ),
+        migrations.AddField(
+            model_name='permuta',
+            name='periodo',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='permutas', to='permuta.periodoletivo', verbose_name='Período letivo'),
+        ),
+        migrations.RunPython(atribuir_periodos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='permuta',
+            name='periodo',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='permutas', to='permuta.periodoletivo', verbose_name='Período letivo'),
+        ),
+        migrations.AddIndex(
+            model_name='permuta',
+            index=models.Index(fields=['periodo', 'status', '-data_solicitacao'], name='permuta_periodo_status'),
+        ),
+        migrations.AddIndex(
+            model_name='permuta',
+            index=models.Index(fields=['periodo', 'professor_solicitante', '-data_solicitacao'], name='permuta_periodo_solicitante'),
+        ),
+        migrations.AddIndex(
+            model_name='permuta',
+            index=models.Index(fields=['periodo', 'professor_substituto', '-data_solicitacao'], name='permuta_periodo_substituto'),
+        ),
+        migrations.AddField(
+            model_name='permutaarquivada',
+            name='horario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='cadastros.horarioaula'),
+        ),
+        migrations.AddField(
+            model_name='permutaarquivada',
+            name='periodo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='permutas_arquivadas', to='permuta.periodoletivo'),
+        ),
+        migrations.AddField(
+            model_name='permutaarquivada',
+            name='professor_solicitante',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='accounts.professor'),
+        ),
+        migrations.AddField(
+            model_name='permutaarquivada',
+            name='professor_substituto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='accounts.professor'),
+        ),
+        migrations.AddField(
+            model_name='permutaarquivada',
+            name='usuario_decisor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificacaoarquivada',
+            index=models.Index(fields=['periodo', 'usuario', '-data_criacao'], name='permuta_arq_notif_periodo'),
+        ),
+        migrations.AddIndex(
+            model_name='permutaarquivada',
+            index=models.Index(fields=['periodo', 'status', '-data_solicitacao'], name='permuta_arq_periodo_status'),
+        ),
+        migrations.AddIndex(
+            model_name='permutaarquivada',
+            index=models.Index(fields=['periodo', 'professor_solicitante', '-data_solicitacao'], name='permuta_arq_periodo_solic'),
+        ),
+        migrations.AddIndex(
+            model_name='permutaarquivada',
+            index=models.Index(fields=['periodo', 'professor_substituto', '-data_solicitacao'], name='permuta_arq_periodo_subst'),
+        ),
+        migrations.RunPython(criar_gatilhos, remover_gatilhos),
+    ]
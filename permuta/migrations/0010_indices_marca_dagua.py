@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastros', '0002_horarioaula_atualizado_em'),
+        ('permuta', '0009_periodoletivo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='permuta',
+            index=models.Index(fields=['professor_solicitante', 'periodo', 'atualizado_em'], name='permuta_solic_atualizado'),
+        ),
+        migrations.AddIndex(
+            model_name='permuta',
+            index=models.Index(fields=['professor_substituto', 'periodo', 'atualizado_em'], name='permuta_subst_atualizado'),
+        ),
+    ]
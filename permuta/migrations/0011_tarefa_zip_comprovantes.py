@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permuta', '0010_indices_marca_dagua'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefarelatorio',
+            name='tipo',
+            field=models.CharField(choices=[('EXCEL', 'Excel'), ('PDF', 'PDF'), ('ZIP', 'Comprovantes (ZIP)')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:20
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Links das notificações que apontam para uma permuta (detalhe, confirmar...)
+LINK_PERMUTA = re.compile(r"^/professor/permutas/(\d+)/")
+
+
+def ligar_notificacoes(apps, schema_editor):
+    """
+    Liga as notificações existentes à permuta do link delas. As demais
+    (avisos agregados de ausência) ficam sem permuta.
+    """
+    Notificacao = apps.get_model("permuta", "Notificacao")
+    Permuta = apps.get_model("permuta", "Permuta")
+
+    por_permuta = {}
+    for notificacao_id, link in Notificacao.objects.exclude(link="").values_list("id", "link"):
+        encontrado = LINK_PERMUTA.match(link)
+        if encontrado:
+            por_permuta.setdefault(int(encontrado.group(1)), []).append(notificacao_id)
+    existentes = set(Permuta.objects.values_list("id", flat=True))
+    for permuta_id in existentes & set(por_permuta):
+        Notificacao.objects.filter(id__in=por_permuta[permuta_id]).update(permuta_id=permuta_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permuta', '0011_tarefa_zip_comprovantes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='permuta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificacoes', to='permuta.permuta'),
+        ),
+        migrations.RunPython(ligar_notificacoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,205 @@
+"""
+Busca textual das permutas (FTS5), versão 1: a tabela permuta_busca e os
+triggers que a mantêm, criados pela migração 0003 do app permuta.
+
+Congelado. As migrações que recriam tabelas usadas pelos triggers removem e
+recriam os triggers com o SQL daqui, e não com o de permuta.busca: uma
+migração antiga não pode mudar quando o código muda. Uma mudança nos
+triggers vira um novo módulo (_busca_v2.py), usado pela migração que a
+introduz e pelas seguintes; este fica como está.
+
+O nome começa com "_" para o Django não tratá-lo como migração.
+"""
+import re
+
+# Nome exibido do professor, igual a Professor.nome (nome completo ou username)
+NOME = "COALESCE(NULLIF(TRIM({u}.first_name || ' ' || {u}.last_name), ''), {u}.username)"
+
+SELECT_PERMUTA = f"""
+    SELECT
+        p.id,
+        p.motivo,
+        {NOME.format(u="us")},
+        {NOME.format(u="ub")},
+        t.codigo_turma,
+        d.nome,
+        COALESCE(r.observacao, ''),
+        p.professor_solicitante_id,
+        p.professor_substituto_id
+    FROM permuta_permuta p
+    JOIN accounts_professor ps ON ps.id = p.professor_solicitante_id
+    JOIN auth_user us ON us.id = ps.user_id
+    JOIN accounts_professor pb ON pb.id = p.professor_substituto_id
+    JOIN auth_user ub ON ub.id = pb.user_id
+    JOIN cadastros_horarioaula h ON h.id = p.horario_id
+    JOIN cadastros_turma t ON t.id = h.turma_id
+    JOIN cadastros_disciplina d ON d.id = h.disciplina_id
+    LEFT JOIN permuta_reposicao r ON r.permuta_id = p.id
+"""
+
+INSERIR = """
+    INSERT INTO permuta_busca (
+        rowid, motivo, solicitante, substituto, turma, disciplina, observacao,
+        solicitante_id, substituto_id
+    )
+"""
+
+TABELA = [
+    """
+    CREATE VIRTUAL TABLE permuta_busca USING fts5(
+        motivo, solicitante, substituto, turma, disciplina, observacao,
+        solicitante_id UNINDEXED, substituto_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    INSERIR + SELECT_PERMUTA,
+]
+
+GATILHOS = [
+    # Permuta
+    f"""
+    CREATE TRIGGER permuta_busca_permuta_ai AFTER INSERT ON permuta_permuta BEGIN
+        {INSERIR} {SELECT_PERMUTA} WHERE p.id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER permuta_busca_permuta_au AFTER UPDATE ON permuta_permuta
+    WHEN OLD.motivo IS NOT NEW.motivo
+        OR OLD.professor_solicitante_id IS NOT NEW.professor_solicitante_id
+        OR OLD.professor_substituto_id IS NOT NEW.professor_substituto_id
+        OR OLD.horario_id IS NOT NEW.horario_id
+    BEGIN
+        DELETE FROM permuta_busca WHERE rowid = OLD.id;
+        {INSERIR} {SELECT_PERMUTA} WHERE p.id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER permuta_busca_permuta_ad AFTER DELETE ON permuta_permuta BEGIN
+        DELETE FROM permuta_busca WHERE rowid = OLD.id;
+    END
+    """,
+    # Reposição
+    """
+    CREATE TRIGGER permuta_busca_reposicao_ai AFTER INSERT ON permuta_reposicao BEGIN
+        UPDATE permuta_busca SET observacao = NEW.observacao WHERE rowid = NEW.permuta_id;
+    END
+    """,
+    """
+    CREATE TRIGGER permuta_busca_reposicao_au AFTER UPDATE ON permuta_reposicao
+    WHEN OLD.observacao IS NOT NEW.observacao OR OLD.permuta_id IS NOT NEW.permuta_id
+    BEGIN
+        UPDATE permuta_busca SET observacao = '' WHERE rowid = OLD.permuta_id;
+        UPDATE permuta_busca SET observacao = NEW.observacao WHERE rowid = NEW.permuta_id;
+    END
+    """,
+    """
+    CREATE TRIGGER permuta_busca_reposicao_ad AFTER DELETE ON permuta_reposicao BEGIN
+        UPDATE permuta_busca SET observacao = '' WHERE rowid = OLD.permuta_id;
+    END
+    """,
+    # Nomes dos professores
+    f"""
+    CREATE TRIGGER permuta_busca_user_au AFTER UPDATE ON auth_user
+    WHEN OLD.first_name IS NOT NEW.first_name
+        OR OLD.last_name IS NOT NEW.last_name
+        OR OLD.username IS NOT NEW.username
+    BEGIN
+        UPDATE permuta_busca SET solicitante = {NOME.format(u="NEW")}
+        WHERE solicitante_id IN (SELECT id FROM accounts_professor WHERE user_id = NEW.id);
+        UPDATE permuta_busca SET substituto = {NOME.format(u="NEW")}
+        WHERE substituto_id IN (SELECT id FROM accounts_professor WHERE user_id = NEW.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER permuta_busca_professor_au AFTER UPDATE ON accounts_professor
+    WHEN OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        UPDATE permuta_busca
+        SET solicitante = (SELECT {NOME.format(u="u")} FROM auth_user u WHERE u.id = NEW.user_id)
+        WHERE solicitante_id = NEW.id;
+        UPDATE permuta_busca
+        SET substituto = (SELECT {NOME.format(u="u")} FROM auth_user u WHERE u.id = NEW.user_id)
+        WHERE substituto_id = NEW.id;
+    END
+    """,
+    # Turma, disciplina e horário
+    """
+    CREATE TRIGGER permuta_busca_turma_au AFTER UPDATE ON cadastros_turma
+    WHEN OLD.codigo_turma IS NOT NEW.codigo_turma
+    BEGIN
+        UPDATE permuta_busca SET turma = NEW.codigo_turma
+        WHERE rowid IN (
+            SELECT p.id FROM permuta_permuta p
+            JOIN cadastros_horarioaula h ON h.id = p.horario_id
+            WHERE h.turma_id = NEW.id
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER permuta_busca_disciplina_au AFTER UPDATE ON cadastros_disciplina
+    WHEN OLD.nome IS NOT NEW.nome
+    BEGIN
+        UPDATE permuta_busca SET disciplina = NEW.nome
+        WHERE rowid IN (
+            SELECT p.id FROM permuta_permuta p
+            JOIN cadastros_horarioaula h ON h.id = p.horario_id
+            WHERE h.disciplina_id = NEW.id
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER permuta_busca_horario_au AFTER UPDATE ON cadastros_horarioaula
+    WHEN OLD.turma_id IS NOT NEW.turma_id OR OLD.disciplina_id IS NOT NEW.disciplina_id
+    BEGIN
+        UPDATE permuta_busca
+        SET turma = (SELECT codigo_turma FROM cadastros_turma WHERE id = NEW.turma_id),
+            disciplina = (SELECT nome FROM cadastros_disciplina WHERE id = NEW.disciplina_id)
+        WHERE rowid IN (SELECT id FROM permuta_permuta WHERE horario_id = NEW.id);
+    END
+    """,
+]
+
+NOMES_GATILHOS = [re.search(r"CREATE TRIGGER (\w+)", sql).group(1) for sql in GATILHOS]
+REMOVER_GATILHOS = [f"DROP TRIGGER IF EXISTS {nome}" for nome in NOMES_GATILHOS]
+REMOVER_TABELA = ["DROP TABLE IF EXISTS permuta_busca"]
+
+
+def _sqlite(schema_editor):
+    # FTS5 e os triggers são específicos do SQLite
+    return schema_editor.connection.vendor == "sqlite"
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+def criar_busca(apps, schema_editor):
+    """
+    Cria e preenche a tabela de busca, com os triggers.
+    """
+    if _sqlite(schema_editor):
+        _executar(schema_editor, TABELA + GATILHOS)
+
+
+def remover_busca(apps, schema_editor):
+    # Os triggers antes da tabela que eles atualizam
+    if _sqlite(schema_editor):
+        _executar(schema_editor, REMOVER_GATILHOS + REMOVER_TABELA)
+
+
+def criar_gatilhos(apps, schema_editor):
+    """
+    Recria os triggers. Sem a tabela de busca nada é feito: a migração que a
+    cria (0003 do app permuta) ainda não rodou e criará os triggers.
+    """
+    if not _sqlite(schema_editor):
+        return
+    if "permuta_busca" not in schema_editor.connection.introspection.table_names():
+        return
+    _executar(schema_editor, GATILHOS)
+
+
+def remover_gatilhos(apps, schema_editor):
+    if _sqlite(schema_editor):
+        _executar(schema_editor, REMOVER_GATILHOS)
@@ -1,13 +1,92 @@
+from datetime import date, timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 from accounts.models import Professor
-from cadastros.models import HorarioAula
+from cadastros.models import Disciplina, HorarioAula
 
 from django.core.exceptions import ObjectDoesNotExist
 
 
+class PeriodoLetivoManager(models.Manager):
+    def para_datas(self, datas):
+        """
+        {data: período letivo que a contém}. Datas fora de qualquer período
+        cadastrado ganham o semestre delas (ver _criar_semestre).
+        """
+        datas = set(datas)
+        if not datas:
+            return {}
+        periodos = list(self.filter(inicio__lte=max(datas), fim__gte=min(datas)))
+        resultado = {}
+        for data in sorted(datas):
+            periodo = next((p for p in periodos if p.inicio <= data <= p.fim), None)
+            if periodo is None:
+                periodo = self._criar_semestre(data)
+                periodos.append(periodo)
+            resultado[data] = periodo
+        return resultado
+
+    def da_data(self, data):
+        return self.para_datas([data])[data]
+
+    def _criar_semestre(self, data):
+        """
+        Cria o semestre da data (2026.1: janeiro a junho; 2026.2: julho a
+        dezembro), encurtado para não sobrepor os períodos já cadastrados.
+        """
+        semestre = 1 if data.month <= 6 else 2
+        inicio = date(data.year, 1, 1) if semestre == 1 else date(data.year, 7, 1)
+        fim = date(data.year, 6, 30) if semestre == 1 else date(data.year, 12, 31)
+        nome = f"{data.year}.{semestre}"
+
+        anterior = self.filter(fim__lt=data, fim__gte=inicio).order_by("-fim").first()
+        if anterior:
+            inicio = anterior.fim + timedelta(days=1)
+        proximo = self.filter(inicio__gt=data, inicio__lte=fim).order_by("inicio").first()
+        if proximo:
+            fim = proximo.inicio - timedelta(days=1)
+        if anterior or proximo:
+            nome += f" ({inicio:%d/%m} a {fim:%d/%m})"
+
+        periodo, _ = self.get_or_create(nome=nome, defaults={"inicio": inicio, "fim": fim})
+        return periodo
 
 
+class PeriodoLetivo(models.Model):
+    """
+    Período letivo (semestre) ao qual cada permuta pertence, pela data da
+    aula. As listas mostram por padrão o período atual; os períodos
+    encerrados são movidos para as tabelas de arquivo pelo comando
+    arquivar_periodos (ver permuta.periodos).
+    """
+
+    nome = models.CharField(max_length=40, unique=True)
+    inicio = models.DateField(verbose_name="Início")
+    fim = models.DateField(verbose_name="Fim")
+    arquivado_em = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Arquivado em",
+        help_text="Preenchido quando as permutas do período são movidas para o arquivo.",
+    )
+
+    objects = PeriodoLetivoManager()
+
+    class Meta:
+        verbose_name = "Período letivo"
+        verbose_name_plural = "Períodos letivos"
+        ordering = ["-inicio"]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(inicio__lte=models.F("fim")), name="permuta_periodo_datas"),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+    @property
+    def arquivado(self):
+        return self.arquivado_em is not None
 
 
 class Permuta(models.Model):
@@ -53,6 +132,11 @@ class Permuta(models.Model):
         blank=True,
         verbose_name="Data/hora da decisão"
     )
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Última atualização"
+    )
 
     # Relacionamentos principais
     professor_solicitante = models.ForeignKey(
@@ -83,10 +167,42 @@ class Permuta(models.Model):
         verbose_name="Usuário que decidiu a permuta"
     )
 
+    # Definido pela data da aula ao criar a permuta e sempre que ela muda
+    # (ver save)
+    periodo = models.ForeignKey(
+        PeriodoLetivo,
+        on_delete=models.PROTECT,
+        related_name="permutas",
+        editable=False,
+        verbose_name="Período letivo"
+    )
+
     class Meta:
         verbose_name = "Permuta"
         verbose_name_plural = "Permutas"
         ordering = ["-data_solicitacao"]
+        indexes = [
+            # Listas e filtros de um período começam pelo período
+            models.Index(fields=["periodo", "status", "-data_solicitacao"], name="permuta_periodo_status"),
+            models.Index(
+                fields=["periodo", "professor_solicitante", "-data_solicitacao"],
+                name="permuta_periodo_solicitante",
+            ),
+            models.Index(
+                fields=["periodo", "professor_substituto", "-data_solicitacao"],
+                name="permuta_periodo_substituto",
+            ),
+            # Marca d'água das permutas de um professor (condicional), só
+            # pelo índice
+            models.Index(
+                fields=["professor_solicitante", "periodo", "atualizado_em"],
+                name="permuta_solic_atualizado",
+            ),
+            models.Index(
+                fields=["professor_substituto", "periodo", "atualizado_em"],
+                name="permuta_subst_atualizado",
+            ),
+        ]
 
     def __str__(self):
         return f"Permuta #{self.id} - {self.professor_solicitante.nome} → {self.professor_substituto.nome} em {self.data_aula}"
@@ -94,6 +210,24 @@ class Permuta(models.Model):
     def __str__(self):
         return f"Permuta #{self.id} - {self.professor_solicitante.nome} → {self.professor_substituto.nome} em {self.data_aula}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # __dict__ para não carregar o campo se vier adiado (.only()/.defer())
+        instance._data_aula_carregada = instance.__dict__.get("data_aula")
+        return instance
+
+    def save(self, *args, **kwargs):
+        data_aula = self.__dict__.get("data_aula")
+        mudou_data = data_aula != getattr(self, "_data_aula_carregada", None)
+        if data_aula and (self.periodo_id is None or mudou_data):
+            self.periodo = PeriodoLetivo.objects.da_data(data_aula)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "periodo" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "periodo"]
+        super().save(*args, **kwargs)
+        self._data_aula_carregada = data_aula
+
     def tem_reposicao(self):
         """
         Retorna True se já existir uma reposição associada a esta permuta.
@@ -129,6 +263,11 @@ class Reposicao(models.Model):
         auto_now_add=True,
         verbose_name="Data de registro"
     )
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Última atualização"
+    )
 
     class Meta:
         verbose_name = "Reposição"
@@ -136,7 +275,7 @@ class Reposicao(models.Model):
         ordering = ["-data_reposicao"]
 
     def __str__(self):
-        return f"Reposição da permuta #{self.permuta.id} em {self.data_reposicao}"
+        return f"Reposição da permuta #{self.permuta_id} em {self.data_reposicao}"
     
 class Notificacao(models.Model):
     usuario = models.ForeignKey(
@@ -147,11 +286,20 @@ class Notificacao(models.Model):
     mensagem = models.TextField()
     lida = models.BooleanField(default=False)
     data_criacao = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     link = models.CharField(
         max_length=255,
         blank=True,
         help_text="URL interna para onde o usuário será redirecionado ao clicar na notificação."
     )
+    # Permuta de que a notificação trata: a notificação é arquivada com ela
+    permuta = models.ForeignKey(
+        Permuta,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="notificacoes",
+    )
 
     class Meta:
         ordering = ["-data_criacao"]
@@ -160,3 +308,286 @@ class Notificacao(models.Model):
         estado = "Lida" if self.lida else "Não lida"
         return f"{self.usuario.username} - {self.mensagem[:40]}... ({estado})"
 
+
+
+class AlteracaoSincronizacao(models.Model):
+    """
+    Registro de alteração para a sincronização incremental dos clientes.
+
+    Cada criação, alteração ou exclusão de permuta, reposição ou notificação
+    gera uma linha por usuário interessado. O id é sequencial e serve de marca
+    d'água: o cliente pede tudo com id maior que o último que recebeu.
+    """
+
+    MODELO_CHOICES = [
+        ("permuta", "Permuta"),
+        ("reposicao", "Reposição"),
+        ("notificacao", "Notificação"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    # Exclusão (ou cancelamento, no caso da permuta): o cliente remove a cópia local
+    removido = models.BooleanField(default=False)
+    data_hora = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Alteração para sincronização"
+        verbose_name_plural = "Alterações para sincronização"
+        indexes = [
+            models.Index(fields=["usuario", "id"], name="permuta_sinc_usuario_id"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.modelo} {self.objeto_id} ({self.usuario_id})"
+
+
+STATUS_CONTADOR_CHOICES = Permuta.STATUS_CHOICES + [("TOTAL", "Total")]
+
+
+class ContadorProfessor(models.Model):
+    """
+    Quantidade de permutas solicitadas por professor, por status, mais uma
+    linha TOTAL. Mantido pelos sinais das permutas (ver permuta.contadores);
+    o comando reconciliar_contadores recalcula a partir das permutas.
+    """
+
+    professor = models.ForeignKey(
+        Professor,
+        on_delete=models.CASCADE,
+        related_name="contadores_permutas",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CONTADOR_CHOICES)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de permutas por professor"
+        verbose_name_plural = "Contadores de permutas por professor"
+        constraints = [
+            models.UniqueConstraint(fields=["professor", "status"], name="permuta_contador_prof_unico"),
+        ]
+        indexes = [
+            # Ranking: WHERE status = ... ORDER BY total DESC lido direto do índice
+            models.Index(fields=["status", "-total", "professor"], name="permuta_contador_prof_top"),
+        ]
+
+    def __str__(self):
+        return f"{self.professor_id} {self.status}: {self.total}"
+
+
+class ContadorDisciplina(models.Model):
+    """
+    Quantidade de permutas por disciplina (a do horário permutado), por
+    status, mais uma linha TOTAL. Mantido como ContadorProfessor.
+    """
+
+    disciplina = models.ForeignKey(
+        Disciplina,
+        on_delete=models.CASCADE,
+        related_name="contadores_permutas",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CONTADOR_CHOICES)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de permutas por disciplina"
+        verbose_name_plural = "Contadores de permutas por disciplina"
+        constraints = [
+            models.UniqueConstraint(fields=["disciplina", "status"], name="permuta_contador_disc_unico"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "-total", "disciplina"], name="permuta_contador_disc_top"),
+        ]
+
+    def __str__(self):
+        return f"{self.disciplina_id} {self.status}: {self.total}"
+
+
+class TarefaRelatorio(models.Model):
+    """
+    Relatório (Excel/PDF) ou ZIP de comprovantes gerado fora da requisição
+    pelo comando processar_relatorios (ver permuta.relatorios).
+
+    ``chave`` identifica tipo + filtros: pedidos iguais feitos dentro da
+    janela de coalescência reaproveitam a mesma tarefa.
+    """
+
+    TIPO_CHOICES = [
+        ("EXCEL", "Excel"),
+        ("PDF", "PDF"),
+        ("ZIP", "Comprovantes (ZIP)"),
+    ]
+    STATUS_CHOICES = [
+        ("PENDENTE", "Na fila"),
+        ("EXECUTANDO", "Em execução"),
+        ("CONCLUIDA", "Concluída"),
+        ("ERRO", "Erro"),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    filtros = models.JSONField(default=dict, blank=True)
+    chave = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDENTE")
+    solicitante = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tarefas_relatorio",
+    )
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    # Caminho relativo a RELATORIOS_DIR
+    arquivo = models.CharField(max_length=255, blank=True)
+    nome_arquivo = models.CharField(max_length=100, blank=True)
+    erro = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa de relatório"
+        verbose_name_plural = "Tarefas de relatório"
+        ordering = ["-criada_em"]
+        indexes = [
+            models.Index(fields=["status", "id"], name="permuta_relatorio_fila"),
+            models.Index(fields=["chave", "-criada_em"], name="permuta_relatorio_chave"),
+        ]
+
+    def __str__(self):
+        return f"Relatório #{self.id} ({self.tipo}, {self.status})"
+
+
+class AssinaturaCalendario(models.Model):
+    """
+    Endereço secreto do feed iCalendar (ICS) de um professor (ver
+    permuta.calendario). O token substitui o login: quem tem o endereço vê
+    a agenda, por isso ele pode ser trocado a qualquer momento.
+    """
+
+    professor = models.OneToOneField(
+        Professor,
+        on_delete=models.CASCADE,
+        related_name="assinatura_calendario",
+    )
+    token = models.CharField(max_length=64, unique=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Assinatura de calendário"
+        verbose_name_plural = "Assinaturas de calendário"
+
+    def __str__(self):
+        return f"Calendário de {self.professor}"
+
+
+class PermutaArquivada(models.Model):
+    """
+    Permuta de um período letivo encerrado, movida da tabela principal pelo
+    comando arquivar_periodos, com a reposição (se houver) na mesma linha.
+    Mantém o id original e os campos da Permuta, para que os relatórios e
+    FiltroPermutasForm funcionem com os dois modelos.
+    """
+
+    STATUS_CHOICES = Permuta.STATUS_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    periodo = models.ForeignKey(
+        PeriodoLetivo,
+        on_delete=models.PROTECT,
+        related_name="permutas_arquivadas",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    data_aula = models.DateField()
+    motivo = models.TextField()
+    data_solicitacao = models.DateTimeField()
+    data_decisao = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField()
+    professor_solicitante = models.ForeignKey(Professor, on_delete=models.PROTECT, related_name="+")
+    professor_substituto = models.ForeignKey(Professor, on_delete=models.PROTECT, related_name="+")
+    horario = models.ForeignKey(HorarioAula, on_delete=models.PROTECT, related_name="+")
+    usuario_decisor = models.ForeignKey(
+        User, on_delete=models.PROTECT, null=True, blank=True, related_name="+"
+    )
+
+    # Reposição
+    reposicao_id = models.BigIntegerField(null=True, blank=True)
+    data_reposicao = models.DateField(null=True, blank=True)
+    observacao_reposicao = models.TextField(blank=True)
+    reposicao_registrada_em = models.DateTimeField(null=True, blank=True)
+
+    arquivada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Permuta arquivada"
+        verbose_name_plural = "Permutas arquivadas"
+        ordering = ["-data_solicitacao"]
+        indexes = [
+            models.Index(fields=["periodo", "status", "-data_solicitacao"], name="permuta_arq_periodo_status"),
+            models.Index(
+                fields=["periodo", "professor_solicitante", "-data_solicitacao"],
+                name="permuta_arq_periodo_solic",
+            ),
+            models.Index(
+                fields=["periodo", "professor_substituto", "-data_solicitacao"],
+                name="permuta_arq_periodo_subst",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Permuta arquivada #{self.id} em {self.data_aula}"
+
+    def tem_reposicao(self):
+        return self.data_reposicao is not None
+
+    @property
+    def reposicao(self):
+        """
+        A reposição como um objeto Reposicao (não gravado), como em Permuta.
+        """
+        if not self.tem_reposicao():
+            raise Reposicao.DoesNotExist("Permuta arquivada sem reposição.")
+        return Reposicao(
+            id=self.reposicao_id,
+            permuta_id=self.id,
+            data_reposicao=self.data_reposicao,
+            observacao=self.observacao_reposicao,
+            data_cadastro=self.reposicao_registrada_em,
+        )
+
+
+class NotificacaoArquivada(models.Model):
+    """
+    Notificação de um período letivo encerrado, movida pelo comando
+    arquivar_periodos.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    periodo = models.ForeignKey(
+        PeriodoLetivo,
+        on_delete=models.PROTECT,
+        related_name="notificacoes_arquivadas",
+    )
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    mensagem = models.TextField()
+    lida = models.BooleanField(default=False)
+    data_criacao = models.DateTimeField()
+    link = models.CharField(max_length=255, blank=True)
+    arquivada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Notificação arquivada"
+        verbose_name_plural = "Notificações arquivadas"
+        ordering = ["-data_criacao"]
+        indexes = [
+            models.Index(fields=["periodo", "usuario", "-data_criacao"], name="permuta_arq_notif_periodo"),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.mensagem[:40]}"
@@ -0,0 +1,168 @@
+"""
+Períodos letivos: escolha do período nas listas e arquivamento dos períodos
+encerrados.
+
+Cada permuta pertence ao período letivo da data da aula (PeriodoLetivo). As
+listas mostram por padrão o período atual; ``?periodo=<id>`` escolhe outro
+período ainda não arquivado e ``?periodo=todos`` mostra todos.
+
+O comando arquivar_periodos move as permutas de um período encerrado (com a
+reposição e as notificações delas) para PermutaArquivada e
+NotificacaoArquivada, em lotes de uma transação cada, e as tabelas
+principais ficam com o tamanho de um período. Arquivar não é excluir: a
+movimentação não passa pelos sinais de exclusão, então não gera eventos de
+auditoria nem remoções na sincronização (os clientes mantêm suas cópias). Os
+contadores são descontados e os feeds e comprovantes em cache, descartados.
+Os relatórios leem o arquivo quando o filtro escolhe um período arquivado.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import calendario, contadores
+from .comprovantes import invalidar_comprovantes
+from .models import (
+    Notificacao,
+    NotificacaoArquivada,
+    PeriodoLetivo,
+    Permuta,
+    PermutaArquivada,
+    Reposicao,
+)
+
+TODOS = "todos"
+# Dias após o fim do período antes de arquivá-lo (reposições atrasadas etc.)
+DIAS_CARENCIA = 30
+TAMANHO_LOTE = 500
+
+
+def escolher_periodo(request, hoje=None):
+    """
+    Retorna (período escolhido em ``?periodo=``, ou None para todos;
+    períodos não arquivados, mais recentes primeiro). Sem o parâmetro, ou
+    com um valor inválido, escolhe o período atual.
+    """
+    hoje = hoje or timezone.localdate()
+    periodos = list(PeriodoLetivo.objects.filter(arquivado_em__isnull=True))
+    valor = request.GET.get("periodo", "")
+    if valor == TODOS:
+        return None, periodos
+
+    escolhido = next((periodo for periodo in periodos if str(periodo.pk) == valor), None)
+    if escolhido is None:
+        escolhido = next((periodo for periodo in periodos if periodo.inicio <= hoje <= periodo.fim), None)
+    if escolhido is None:
+        # Primeiro acesso no período: cria o semestre
+        escolhido = PeriodoLetivo.objects.da_data(hoje)
+        periodos = sorted(periodos + [escolhido], key=lambda periodo: periodo.inicio, reverse=True)
+    return escolhido, periodos
+
+
+def encerrados(hoje=None, carencia=DIAS_CARENCIA):
+    """
+    Períodos ainda não arquivados que terminaram há mais de ``carencia`` dias.
+    """
+    hoje = hoje or timezone.localdate()
+    return PeriodoLetivo.objects.filter(
+        arquivado_em__isnull=True, fim__lt=hoje - timedelta(days=carencia)
+    ).order_by("inicio")
+
+
+def _excluir_sem_sinais(modelo, campo, ids):
+    # DELETE direto: QuerySet.delete() enviaria post_delete para cada objeto
+    tabela = connection.ops.quote_name(modelo._meta.db_table)
+    coluna = connection.ops.quote_name(modelo._meta.get_field(campo).column)
+    marcadores = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabela} WHERE {coluna} IN ({marcadores})", list(ids))
+
+
+def _arquivar_permutas(periodo, permutas):
+    """
+    Move as permutas, com a reposição e as notificações delas. Retorna
+    quantas notificações foram movidas.
+    """
+    arquivadas = []
+    for permuta in permutas:
+        reposicao = permuta.reposicao if permuta.tem_reposicao() else None
+        arquivadas.append(PermutaArquivada(
+            id=permuta.id,
+            periodo=periodo,
+            status=permuta.status,
+            data_aula=permuta.data_aula,
+            motivo=permuta.motivo,
+            data_solicitacao=permuta.data_solicitacao,
+            data_decisao=permuta.data_decisao,
+            atualizado_em=permuta.atualizado_em,
+            professor_solicitante_id=permuta.professor_solicitante_id,
+            professor_substituto_id=permuta.professor_substituto_id,
+            horario_id=permuta.horario_id,
+            usuario_decisor_id=permuta.usuario_decisor_id,
+            reposicao_id=reposicao.id if reposicao else None,
+            data_reposicao=reposicao.data_reposicao if reposicao else None,
+            observacao_reposicao=reposicao.observacao if reposicao else "",
+            reposicao_registrada_em=reposicao.data_cadastro if reposicao else None,
+        ))
+    PermutaArquivada.objects.bulk_create(arquivadas)
+
+    ids = [permuta.id for permuta in permutas]
+    # Antes das permutas, que as notificações referenciam
+    notificacoes = list(Notificacao.objects.filter(permuta_id__in=ids))
+    if notificacoes:
+        _arquivar_notificacoes(periodo, notificacoes)
+    _excluir_sem_sinais(Reposicao, "permuta", ids)
+    _excluir_sem_sinais(Permuta, "id", ids)
+
+    contadores.registrar_alteracao(anteriores=[contadores.estado(permuta) for permuta in permutas])
+    calendario.invalidar_feeds(
+        professor_id
+        for permuta in permutas
+        for professor_id in (permuta.professor_solicitante_id, permuta.professor_substituto_id)
+    )
+    transaction.on_commit(lambda: [invalidar_comprovantes(permuta_id) for permuta_id in ids])
+    return len(notificacoes)
+
+
+def _arquivar_notificacoes(periodo, notificacoes):
+    NotificacaoArquivada.objects.bulk_create([
+        NotificacaoArquivada(
+            id=notificacao.id,
+            periodo=periodo,
+            usuario_id=notificacao.usuario_id,
+            mensagem=notificacao.mensagem,
+            lida=notificacao.lida,
+            data_criacao=notificacao.data_criacao,
+            link=notificacao.link,
+        )
+        for notificacao in notificacoes
+    ])
+    _excluir_sem_sinais(Notificacao, "id", [notificacao.id for notificacao in notificacoes])
+
+
+def arquivar_periodo(periodo, lote=TAMANHO_LOTE):
+    """
+    Move as permutas do período, com as notificações delas, para as
+    tabelas de arquivo, ``lote`` linhas por transação, e marca o
+    período como arquivado. Retorna (permutas, notificações) movidas.
+
+    Um período com permutas pendentes não é arquivado (ValueError). Se for
+    interrompido, pode ser executado de novo: continua de onde parou.
+    """
+    if Permuta.objects.filter(periodo=periodo, status="PENDENTE").exists():
+        raise ValueError(f"O período {periodo} ainda tem permutas pendentes.")
+
+    permutas = notificacoes = 0
+    while True:
+        with transaction.atomic():
+            lote_permutas = list(
+                Permuta.objects.filter(periodo=periodo).select_related("reposicao").order_by("id")[:lote]
+            )
+            if not lote_permutas:
+                break
+            notificacoes += _arquivar_permutas(periodo, lote_permutas)
+        permutas += len(lote_permutas)
+
+    periodo.arquivado_em = timezone.now()
+    periodo.save(update_fields=["arquivado_em"])
+    return permutas, notificacoes
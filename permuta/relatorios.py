@@ -0,0 +1,323 @@
+"""
+Fila de relatórios (Excel/PDF) e de ZIPs de comprovantes gerados fora da
+requisição.
+
+A view só grava uma TarefaRelatorio com o tipo e os filtros e devolve a
+página de acompanhamento; o comando ``processar_relatorios`` (um ou mais
+processos) pega as tarefas pendentes, gera o arquivo em RELATORIOS_DIR e
+marca a tarefa como concluída. A página consulta a API de status até o
+download ficar disponível.
+
+Pedidos iguais (mesmo tipo e filtros) feitos dentro de
+RELATORIOS_JANELA_COALESCENCIA segundos reaproveitam a tarefa existente, em
+vez de gerar o mesmo relatório de novo. As permutas do relatório são lidas
+da réplica de leitura (ver permuta_aulas.replica) e, quando o filtro escolhe
+um período arquivado, das tabelas de arquivo (ver permuta.periodos).
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import openpyxl
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from permuta_aulas.replica import em_replica
+
+from .comprovantes import RELACOES_COMPROVANTE, gerar_zip_comprovantes
+from .forms import FiltroPermutasForm
+from .models import Permuta, PermutaArquivada, TarefaRelatorio
+
+logger = logging.getLogger(__name__)
+
+JANELA_COALESCENCIA = getattr(settings, "RELATORIOS_JANELA_COALESCENCIA", 300)
+# Tarefa "em execução" há mais tempo que isso: o processo morreu, volta para a fila
+TEMPO_MAXIMO_EXECUCAO = getattr(settings, "RELATORIOS_TEMPO_MAXIMO_EXECUCAO", 1800)
+VALIDADE_DIAS = getattr(settings, "RELATORIOS_VALIDADE_DIAS", 7)
+LIMITE_PDF = 50
+
+# Relações usadas nos arquivos (a reposição só existe como relação em Permuta)
+RELACOES = (
+    "professor_solicitante__user",
+    "professor_substituto__user",
+    "horario__turma",
+    "horario__disciplina",
+)
+
+EXTENSOES = {"EXCEL": "xlsx", "PDF": "pdf", "ZIP": "zip"}
+TIPOS_CONTEUDO = {
+    "EXCEL": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "PDF": "application/pdf",
+    "ZIP": "application/zip",
+}
+
+
+def diretorio():
+    return Path(getattr(settings, "RELATORIOS_DIR", settings.BASE_DIR / "cache" / "relatorios"))
+
+
+def caminho(tarefa):
+    return diretorio() / tarefa.arquivo
+
+
+# ----------------------------------------------------------------------------
+# Fila
+# ----------------------------------------------------------------------------
+
+def normalizar_filtros(dados):
+    """
+    Filtros válidos de FiltroPermutasForm em formato JSON, sem os vazios.
+    """
+    filtros = {}
+    for campo, valor in dados.items():
+        if not valor:
+            continue
+        if hasattr(valor, "isoformat"):
+            valor = valor.isoformat()
+        elif hasattr(valor, "pk"):
+            valor = valor.pk
+        filtros[campo] = valor
+    return filtros
+
+
+def chave_tarefa(tipo, filtros):
+    conteudo = json.dumps([tipo, filtros], sort_keys=True)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def solicitar(tipo, filtros, usuario):
+    """
+    Enfileira o relatório ou reaproveita uma tarefa igual recente.
+
+    Retorna (tarefa, criada).
+    """
+    chave = chave_tarefa(tipo, filtros)
+    limite = timezone.now() - timedelta(seconds=JANELA_COALESCENCIA)
+    with transaction.atomic():
+        existente = (
+            TarefaRelatorio.objects.filter(chave=chave, criada_em__gte=limite)
+            .exclude(status="ERRO")
+            .order_by("-criada_em")
+            .first()
+        )
+        if existente is not None:
+            return existente, False
+        tarefa = TarefaRelatorio.objects.create(
+            tipo=tipo, filtros=filtros, chave=chave, solicitante=usuario
+        )
+    return tarefa, True
+
+
+def reabrir_expiradas():
+    """
+    Devolve à fila as tarefas presas em execução (processo interrompido).
+    """
+    limite = timezone.now() - timedelta(seconds=TEMPO_MAXIMO_EXECUCAO)
+    return TarefaRelatorio.objects.filter(status="EXECUTANDO", iniciada_em__lt=limite).update(
+        status="PENDENTE", iniciada_em=None
+    )
+
+
+def proxima_tarefa():
+    """
+    Reserva a tarefa pendente mais antiga para este processo, ou None.
+
+    A reserva é um UPDATE condicional ao status PENDENTE: com vários
+    processos, cada tarefa é pega por um só.
+    """
+    while True:
+        tarefa_id = (
+            TarefaRelatorio.objects.filter(status="PENDENTE")
+            .order_by("id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if tarefa_id is None:
+            return None
+        reservada = TarefaRelatorio.objects.filter(id=tarefa_id, status="PENDENTE").update(
+            status="EXECUTANDO", iniciada_em=timezone.now()
+        )
+        if reservada:
+            return TarefaRelatorio.objects.get(id=tarefa_id)
+
+
+def executar(tarefa):
+    """
+    Gera o arquivo da tarefa e registra o resultado (CONCLUIDA ou ERRO).
+    """
+    try:
+        form = FiltroPermutasForm(tarefa.filtros)
+        if not form.is_valid():
+            raise ValueError(f"Filtros inválidos: {form.errors.as_text()}")
+        if tarefa.tipo == "ZIP":
+            # Comprovantes só existem para as permutas ainda não arquivadas
+            if form.periodo_arquivado():
+                raise ValueError("Não há comprovantes de períodos arquivados.")
+            permutas = Permuta.objects.select_related(*RELACOES_COMPROVANTE)
+        elif form.periodo_arquivado():
+            # A reposição está na própria linha da permuta arquivada
+            permutas = PermutaArquivada.objects.select_related(*RELACOES)
+        else:
+            permutas = Permuta.objects.select_related(*RELACOES, "reposicao")
+        permutas = form.filtrar(permutas).order_by("-data_solicitacao")
+
+        destino = diretorio()
+        destino.mkdir(parents=True, exist_ok=True)
+        nome = f"relatorio_{tarefa.id}.{EXTENSOES[tarefa.tipo]}"
+        # Grava em arquivo temporário e renomeia: o download nunca vê arquivo pela metade
+        descritor, temporario = tempfile.mkstemp(dir=destino, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as arquivo, em_replica():
+                if tarefa.tipo == "EXCEL":
+                    gerar_excel(permutas, arquivo)
+                elif tarefa.tipo == "ZIP":
+                    for pedaco in gerar_zip_comprovantes(permutas.order_by("id").iterator(chunk_size=500)):
+                        arquivo.write(pedaco)
+                else:
+                    gerar_pdf(permutas[:LIMITE_PDF], arquivo)
+            os.replace(temporario, destino / nome)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+    except Exception as e:
+        logger.exception("Erro ao gerar relatório #%s", tarefa.id)
+        tarefa.status = "ERRO"
+        tarefa.erro = str(e)
+        tarefa.concluida_em = timezone.now()
+        tarefa.save(update_fields=["status", "erro", "concluida_em"])
+        return False
+
+    data = timezone.localdate(tarefa.criada_em)
+    tarefa.status = "CONCLUIDA"
+    tarefa.arquivo = nome
+    prefixo = "comprovantes" if tarefa.tipo == "ZIP" else "relatorio_permutas"
+    tarefa.nome_arquivo = f"{prefixo}_{data.strftime('%Y%m%d')}.{EXTENSOES[tarefa.tipo]}"
+    tarefa.concluida_em = timezone.now()
+    tarefa.save(update_fields=["status", "arquivo", "nome_arquivo", "concluida_em"])
+    return True
+
+
+def limpar_antigas():
+    """
+    Remove as tarefas (e arquivos) com mais de VALIDADE_DIAS dias.
+    """
+    limite = timezone.now() - timedelta(days=VALIDADE_DIAS)
+    antigas = TarefaRelatorio.objects.filter(criada_em__lt=limite).exclude(status="EXECUTANDO")
+    for arquivo in antigas.exclude(arquivo="").values_list("arquivo", flat=True):
+        try:
+            os.unlink(diretorio() / arquivo)
+        except FileNotFoundError:
+            pass
+    return antigas.delete()[0]
+
+
+# ----------------------------------------------------------------------------
+# Geração dos arquivos
+# ----------------------------------------------------------------------------
+
+def gerar_excel(permutas, arquivo):
+    """
+    Planilha com uma linha por permuta.
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Relatório de Permutas"
+
+    # Cabeçalhos
+    headers = [
+        'ID', 'Data Solicitação', 'Data Aula', 'Solicitante', 'Substituto',
+        'Turma', 'Disciplina', 'Status', 'Data Decisão', 'Tem Reposição',
+        'Data Reposição', 'Motivo'
+    ]
+
+    # Estilo do cabeçalho
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="28a745", end_color="28a745", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+
+    for col_num, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col_num)
+        cell.value = header
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        ws.column_dimensions[get_column_letter(col_num)].width = 18
+
+    # Dados
+    for row_num, permuta in enumerate(permutas.iterator(chunk_size=1000), 2):
+        tem_reposicao = permuta.tem_reposicao()
+        ws.cell(row=row_num, column=1).value = permuta.id
+        ws.cell(row=row_num, column=2).value = timezone.localtime(permuta.data_solicitacao).strftime('%d/%m/%Y %H:%M')
+        ws.cell(row=row_num, column=3).value = permuta.data_aula.strftime('%d/%m/%Y')
+        ws.cell(row=row_num, column=4).value = permuta.professor_solicitante.nome
+        ws.cell(row=row_num, column=5).value = permuta.professor_substituto.nome
+        ws.cell(row=row_num, column=6).value = permuta.horario.turma.codigo_turma
+        ws.cell(row=row_num, column=7).value = permuta.horario.disciplina.nome
+        ws.cell(row=row_num, column=8).value = permuta.get_status_display()
+        ws.cell(row=row_num, column=9).value = timezone.localtime(permuta.data_decisao).strftime('%d/%m/%Y %H:%M') if permuta.data_decisao else ''
+        ws.cell(row=row_num, column=10).value = 'Sim' if tem_reposicao else 'Não'
+        ws.cell(row=row_num, column=11).value = permuta.reposicao.data_reposicao.strftime('%d/%m/%Y') if tem_reposicao else ''
+        ws.cell(row=row_num, column=12).value = permuta.motivo
+
+    wb.save(arquivo)
+
+
+def gerar_pdf(permutas, arquivo):
+    """
+    Lista das permutas em PDF, uma por bloco.
+    """
+    p = canvas.Canvas(arquivo, pagesize=A4)
+    largura, altura = A4
+
+    # Cabeçalho
+    p.setFillColor(colors.HexColor('#28a745'))
+    p.rect(0, altura-80, largura, 80, fill=1)
+    p.setFillColor(colors.white)
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(50, altura-45, "Relatório de Permutas")
+    p.setFont("Helvetica", 10)
+    p.drawString(50, altura-65, f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+
+    y = altura - 120
+    x = 50
+
+    for permuta in permutas:
+        if y < 50:  # Nova página
+            p.showPage()
+            y = altura - 50
+            p.setFont("Helvetica-Bold", 12)
+            p.drawString(50, y, "Continuação...")
+            y -= 30
+
+        p.setFont("Helvetica-Bold", 11)
+        p.drawString(x, y, f"Permuta #{permuta.id}")
+        y -= 15
+
+        p.setFont("Helvetica", 9)
+        p.drawString(x+20, y, f"Solicitante: {permuta.professor_solicitante.nome}")
+        y -= 12
+        p.drawString(x+20, y, f"Substituto: {permuta.professor_substituto.nome}")
+        y -= 12
+        p.drawString(x+20, y, f"Data Aula: {permuta.data_aula.strftime('%d/%m/%Y')}")
+        y -= 12
+        p.drawString(x+20, y, f"Turma: {permuta.horario.turma.codigo_turma} - {permuta.horario.disciplina.nome}")
+        y -= 12
+        p.drawString(x+20, y, f"Status: {permuta.get_status_display()}")
+        y -= 20
+
+        # Linha separadora
+        p.setStrokeColor(colors.lightgrey)
+        p.line(x, y, largura-50, y)
+        y -= 15
+
+    p.save()
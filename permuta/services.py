@@ -0,0 +1,183 @@
+"""
+Mudanças de status das permutas.
+
+Cada transição é um único UPDATE condicional (compare-and-swap): a linha só
+é alterada se ainda estiver no status lido anteriormente e atender às demais
+condições. Duas requisições simultâneas nunca aplicam a mesma transição
+duas vezes, e apenas as colunas alteradas são gravadas.
+
+Também cria as permutas de uma ausência (várias aulas de uma vez).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PeriodoLetivo, Permuta
+from .signals import permutas_criadas, status_alterado
+
+# HorarioAula.dia_semana -> date.weekday()
+DIAS_DA_SEMANA = {"SEG": 0, "TER": 1, "QUA": 2, "QUI": 3, "SEX": 4, "SAB": 5}
+
+# Status de origem aceitos para cada status de destino
+ORIGENS_PERMITIDAS = {
+    "APROVADA": ("PENDENTE",),
+    "RECUSADA": ("PENDENTE",),
+    "CANCELADA": ("PENDENTE", "APROVADA", "RECUSADA"),
+}
+
+
+def transicionar(permuta, novo_status, usuario, **condicoes):
+    """
+    Leva a permuta de ``permuta.status`` para ``novo_status``.
+
+    ``condicoes`` são filtros extras exigidos no UPDATE (ex.: quem pode
+    decidir). Retorna True se a linha foi alterada; nesse caso a instância
+    também é atualizada em memória e o sinal ``status_alterado`` é enviado.
+    """
+    status_anterior = permuta.status
+    if status_anterior not in ORIGENS_PERMITIDAS[novo_status]:
+        return False
+
+    agora = timezone.now()
+    # UPDATE e receptores do sinal (auditoria, sincronização) na mesma
+    # transação: se algum falhar, a transição é desfeita por inteiro
+    decisor = Permuta._meta.get_field("usuario_decisor")
+    anteriores = (
+        permuta.status,
+        permuta.data_decisao,
+        permuta.usuario_decisor_id,
+        permuta.atualizado_em,
+        decisor.get_cached_value(permuta, default=None),
+    )
+    with transaction.atomic():
+        alteradas = Permuta.objects.filter(
+            pk=permuta.pk,
+            status=status_anterior,
+            **condicoes,
+        ).update(
+            status=novo_status,
+            data_decisao=agora,
+            usuario_decisor=usuario,
+            atualizado_em=agora,
+        )
+        if not alteradas:
+            return False
+
+        permuta.status = novo_status
+        permuta.data_decisao = agora
+        permuta.usuario_decisor = usuario
+        permuta.atualizado_em = agora
+        try:
+            status_alterado.send(
+                sender=Permuta,
+                permuta=permuta,
+                status_anterior=status_anterior,
+                usuario=usuario,
+            )
+        except Exception:
+            (permuta.status, permuta.data_decisao, permuta.usuario_decisor_id,
+             permuta.atualizado_em, decisor_anterior) = anteriores
+            # Volta também o objeto do decisor, não só o ID
+            if decisor_anterior is not None:
+                permuta.usuario_decisor = decisor_anterior
+            elif decisor.is_cached(permuta):
+                decisor.delete_cached_value(permuta)
+            raise
+    return True
+
+
+def aprovar_permuta(permuta, usuario, professor_substituto):
+    """
+    Confirmação pelo professor substituto; exige reposição registrada.
+    """
+    return transicionar(
+        permuta,
+        "APROVADA",
+        usuario,
+        professor_substituto=professor_substituto,
+        reposicao__isnull=False,
+    )
+
+
+def recusar_permuta(permuta, usuario, professor_substituto):
+    """
+    Recusa pelo professor substituto.
+    """
+    return transicionar(
+        permuta,
+        "RECUSADA",
+        usuario,
+        professor_substituto=professor_substituto,
+    )
+
+
+def cancelar_permuta(permuta, usuario, professor_solicitante):
+    """
+    Cancelamento pelo professor solicitante.
+    """
+    return transicionar(
+        permuta,
+        "CANCELADA",
+        usuario,
+        professor_solicitante=professor_solicitante,
+    )
+
+
+def datas_das_aulas(horario, data_inicio, data_fim):
+    """
+    Datas entre ``data_inicio`` e ``data_fim`` (inclusive) em que há aula no horário.
+    """
+    dia = DIAS_DA_SEMANA[horario.dia_semana]
+    data = data_inicio + timedelta(days=(dia - data_inicio.weekday()) % 7)
+    datas = []
+    while data <= data_fim:
+        datas.append(data)
+        data += timedelta(weeks=1)
+    return datas
+
+
+def solicitar_ausencia(professor, substitutos, data_inicio, data_fim, motivo, usuario):
+    """
+    Cria, em uma única transação, as permutas de todas as aulas do professor
+    no período. ``substitutos`` mapeia cada HorarioAula ao professor substituto.
+
+    Aulas que já têm permuta não cancelada são ignoradas. As permutas são
+    gravadas com um único bulk_create; como ele não dispara post_save, o
+    sinal ``permutas_criadas`` é enviado para auditoria e sincronização.
+    Retorna as permutas criadas, em ordem de data.
+    """
+    with transaction.atomic():
+        existentes = set(
+            Permuta.objects.filter(
+                horario__in=list(substitutos),
+                data_aula__range=(data_inicio, data_fim),
+            )
+            .exclude(status="CANCELADA")
+            .values_list("horario_id", "data_aula")
+        )
+        aulas = sorted(
+            (
+                (data, horario.hora_inicio, horario, substituto)
+                for horario, substituto in substitutos.items()
+                for data in datas_das_aulas(horario, data_inicio, data_fim)
+                if (horario.pk, data) not in existentes
+            ),
+            key=lambda aula: aula[:2],
+        )
+        periodos = PeriodoLetivo.objects.para_datas(data for data, *_ in aulas)
+        permutas = Permuta.objects.bulk_create([
+            Permuta(
+                professor_solicitante=professor,
+                professor_substituto=substituto,
+                horario=horario,
+                data_aula=data,
+                motivo=motivo,
+                status="PENDENTE",
+                periodo=periodos[data],
+            )
+            for data, _, horario, substituto in aulas
+        ])
+        if permutas:
+            permutas_criadas.send(sender=Permuta, permutas=permutas, usuario=usuario)
+    return permutas
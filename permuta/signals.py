@@ -0,0 +1,259 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from accounts.models import Professor
+from cadastros.models import Disciplina, HorarioAula, Turma
+
+from . import calendario, contadores, sincronizacao
+from .comprovantes import invalidar_comprovantes
+from .models import Notificacao, Permuta, Reposicao
+
+# Enviado por permuta.services após uma mudança de status feita via UPDATE
+# (que não dispara post_save). Argumentos: permuta, status_anterior, usuario.
+status_alterado = Signal()
+
+# Enviado por permuta.services após criar permutas com bulk_create (que não
+# dispara post_save). Argumentos: permutas, usuario.
+permutas_criadas = Signal()
+
+
+@receiver(post_save, sender=Permuta)
+@receiver(post_delete, sender=Permuta)
+def invalidar_comprovante_permuta(sender, instance, **kwargs):
+    """
+    Descarta os comprovantes em cache quando a permuta muda.
+    """
+    invalidar_comprovantes(instance.pk)
+
+
+@receiver(status_alterado, sender=Permuta)
+def invalidar_comprovante_transicao(sender, permuta, **kwargs):
+    invalidar_comprovantes(permuta.pk)
+
+
+@receiver(post_save, sender=Reposicao)
+@receiver(post_delete, sender=Reposicao)
+def invalidar_comprovante_reposicao(sender, instance, **kwargs):
+    """
+    Descarta os comprovantes em cache quando a reposição da permuta muda.
+    """
+    invalidar_comprovantes(instance.permuta_id)
+
+
+@receiver(post_save, sender=Reposicao)
+@receiver(post_delete, sender=Reposicao)
+def atualizar_permuta_da_reposicao(sender, instance, **kwargs):
+    """
+    A reposição faz parte dos dados da permuta: alterá-la conta como
+    alteração da permuta (atualizado_em), para as respostas condicionais.
+    """
+    Permuta.objects.filter(pk=instance.permuta_id).update(atualizado_em=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def atualizar_permutas_do_usuario(sender, instance, created, update_fields=None, **kwargs):
+    """
+    O nome do professor aparece nos dados das permutas: renomear o usuário
+    conta como alteração delas (atualizado_em), para as respostas
+    condicionais. Login e troca de senha não contam.
+    """
+    if created or (update_fields and set(update_fields) <= {"last_login", "password"}):
+        return
+    Permuta.objects.filter(
+        Q(professor_solicitante__user=instance) | Q(professor_substituto__user=instance)
+    ).update(atualizado_em=timezone.now())
+
+
+@receiver(post_save, sender=Professor)
+def atualizar_permutas_do_professor(sender, instance, created, **kwargs):
+    if created:
+        return
+    Permuta.objects.filter(
+        Q(professor_solicitante=instance) | Q(professor_substituto=instance)
+    ).update(atualizado_em=timezone.now())
+
+
+@receiver(post_save, sender=Turma)
+@receiver(post_save, sender=Disciplina)
+def atualizar_permutas_do_cadastro(sender, instance, created, **kwargs):
+    """
+    Turma e disciplina aparecem nos dados dos horários e das permutas.
+    """
+    if created:
+        return
+    campo = "turma" if sender is Turma else "disciplina"
+    agora = timezone.now()
+    HorarioAula.objects.filter(**{campo: instance}).update(atualizado_em=agora)
+    Permuta.objects.filter(**{f"horario__{campo}": instance}).update(atualizado_em=agora)
+
+
+# ----------------------------------------------------------------------------
+# Feed ICS dos professores (ver permuta.calendario)
+# ----------------------------------------------------------------------------
+# Registrados antes da sincronização: _sinc_professores ainda tem os
+# professores de antes do save.
+
+def _professores(permuta):
+    return (permuta.professor_solicitante_id, permuta.professor_substituto_id)
+
+
+@receiver(post_save, sender=Permuta)
+@receiver(post_delete, sender=Permuta)
+def invalidar_calendario_permuta(sender, instance, **kwargs):
+    calendario.invalidar_feeds(
+        getattr(instance, "_sinc_professores", ()) + _professores(instance)
+    )
+
+
+@receiver(status_alterado, sender=Permuta)
+def invalidar_calendario_transicao(sender, permuta, **kwargs):
+    calendario.invalidar_feeds(_professores(permuta))
+
+
+@receiver(permutas_criadas, sender=Permuta)
+def invalidar_calendario_em_lote(sender, permutas, **kwargs):
+    calendario.invalidar_feeds(
+        professor_id for permuta in permutas for professor_id in _professores(permuta)
+    )
+
+
+@receiver(post_save, sender=Reposicao)
+@receiver(post_delete, sender=Reposicao)
+def invalidar_calendario_reposicao(sender, instance, **kwargs):
+    calendario.invalidar_feeds(
+        Permuta.objects.filter(pk=instance.permuta_id)
+        .values_list("professor_solicitante_id", flat=True)
+    )
+
+
+@receiver(pre_save, sender=HorarioAula)
+def guardar_professor_do_horario(sender, instance, **kwargs):
+    # Professor de antes do save, caso o horário troque de professor
+    instance._calendario_professor = (
+        HorarioAula.objects.filter(pk=instance.pk).values_list("professor_id", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=HorarioAula)
+@receiver(post_delete, sender=HorarioAula)
+def invalidar_calendario_horario(sender, instance, **kwargs):
+    # O horário aparece também no feed de quem assumiu aulas dele
+    substitutos = Permuta.objects.filter(horario_id=instance.pk).values_list(
+        "professor_substituto_id", flat=True
+    )
+    calendario.invalidar_feeds([
+        instance.professor_id,
+        getattr(instance, "_calendario_professor", None),
+        *substitutos,
+    ])
+
+
+# ----------------------------------------------------------------------------
+# Sincronização incremental (ver permuta.sincronizacao)
+# ----------------------------------------------------------------------------
+
+@receiver(post_init, sender=Permuta)
+def guardar_professores_originais(sender, instance, **kwargs):
+    # __dict__ para não carregar campos adiados (.only()/.defer())
+    valores = instance.__dict__
+    instance._sinc_professores = tuple(
+        valor
+        for valor in (valores.get("professor_solicitante_id"), valores.get("professor_substituto_id"))
+        if valor is not None
+    )
+
+
+@receiver(post_save, sender=Permuta)
+def sincronizar_permuta(sender, instance, **kwargs):
+    sincronizacao.registrar_permutas(
+        [instance],
+        professores_anteriores={instance.pk: instance._sinc_professores},
+    )
+    instance._sinc_professores = _professores(instance)
+
+
+@receiver(status_alterado, sender=Permuta)
+def sincronizar_transicao(sender, permuta, **kwargs):
+    sincronizacao.registrar_permutas([permuta])
+
+
+@receiver(permutas_criadas, sender=Permuta)
+def sincronizar_criacao_em_lote(sender, permutas, **kwargs):
+    sincronizacao.registrar_permutas(permutas)
+
+
+@receiver(post_delete, sender=Permuta)
+def sincronizar_exclusao_permuta(sender, instance, **kwargs):
+    sincronizacao.registrar_permutas([instance], removido=True)
+
+
+def _sincronizar_reposicao(reposicao, removido):
+    permuta = Permuta.objects.filter(pk=reposicao.permuta_id).first()
+    if permuta is not None:
+        sincronizacao.registrar_permutas(
+            [permuta], modelo="reposicao", objeto_ids=[reposicao.pk], removido=removido
+        )
+
+
+@receiver(post_save, sender=Reposicao)
+def sincronizar_reposicao(sender, instance, **kwargs):
+    _sincronizar_reposicao(instance, removido=False)
+
+
+@receiver(post_delete, sender=Reposicao)
+def sincronizar_exclusao_reposicao(sender, instance, **kwargs):
+    _sincronizar_reposicao(instance, removido=True)
+
+
+@receiver(post_save, sender=Notificacao)
+def sincronizar_notificacao(sender, instance, **kwargs):
+    sincronizacao.registrar_notificacoes([instance])
+
+
+@receiver(post_delete, sender=Notificacao)
+def sincronizar_exclusao_notificacao(sender, instance, **kwargs):
+    sincronizacao.registrar_notificacoes([instance], removido=True)
+
+
+# ----------------------------------------------------------------------------
+# Contadores por professor e por disciplina (ver permuta.contadores)
+# ----------------------------------------------------------------------------
+
+@receiver(post_init, sender=Permuta)
+def guardar_estado_contadores(sender, instance, **kwargs):
+    instance._contador_estado = contadores.estado(instance)
+
+
+@receiver(post_save, sender=Permuta)
+def contar_permuta(sender, instance, created, **kwargs):
+    atual = contadores.estado(instance)
+    contadores.registrar_alteracao(
+        anteriores=[] if created else [instance._contador_estado],
+        atuais=[atual],
+    )
+    instance._contador_estado = atual
+
+
+@receiver(status_alterado, sender=Permuta)
+def contar_transicao(sender, permuta, status_anterior, **kwargs):
+    atual = contadores.estado(permuta)
+    contadores.registrar_alteracao(
+        anteriores=[(permuta.professor_solicitante_id, permuta.horario_id, status_anterior)],
+        atuais=[atual],
+    )
+    permuta._contador_estado = atual
+
+
+@receiver(permutas_criadas, sender=Permuta)
+def contar_criacao_em_lote(sender, permutas, **kwargs):
+    contadores.registrar_alteracao(atuais=[contadores.estado(permuta) for permuta in permutas])
+
+
+@receiver(post_delete, sender=Permuta)
+def descontar_permuta(sender, instance, **kwargs):
+    contadores.registrar_alteracao(anteriores=[instance._contador_estado])
@@ -0,0 +1,169 @@
+"""
+Sincronização incremental das permutas para clientes com cópia local.
+
+Toda criação, alteração ou exclusão de permuta, reposição ou notificação
+grava uma AlteracaoSincronizacao para cada usuário interessado (solicitante
+e substituto da permuta, destinatário da notificação). O cliente guarda o
+maior id recebido e pede ``?since=<id>``; a consulta percorre só o índice
+(usuario, id), então uma sincronização sem novidades é uma busca vazia.
+
+Os registros são gravados por sinais (post_save/post_delete e
+status_alterado). Operações em lote que não disparam sinais (bulk_create,
+update()) devem chamar registrar_permutas/registrar_notificacoes.
+
+O id usado como marca só é seguro porque o SQLite tem um único escritor por
+vez: os ids ficam visíveis na ordem em que são gerados. Em um banco com
+escritas concorrentes (PostgreSQL, MySQL), uma transação pode confirmar o id
+10 depois de outra já ter confirmado o 11; o cliente que sincronizou entre as
+duas recebe o 11, guarda since=11 e nunca vê o 10. Antes de trocar de banco,
+a marca precisa vir de uma sequência atribuída no commit (ou a leitura tem
+que parar antes da menor transação ainda aberta).
+"""
+from django.db.models import Q
+
+from accounts.models import Professor
+
+from .models import AlteracaoSincronizacao, Notificacao, Permuta, Reposicao
+
+# Máximo de alterações lidas por requisição; o cliente repete com o novo since
+LIMITE_ALTERACOES = 500
+
+CAMPOS_PERMUTA = (
+    "id",
+    "status",
+    "data_aula",
+    "motivo",
+    "horario_id",
+    "professor_solicitante_id",
+    "professor_substituto_id",
+    "data_solicitacao",
+    "data_decisao",
+    "atualizado_em",
+)
+CAMPOS_REPOSICAO = ("id", "permuta_id", "data_reposicao", "observacao", "atualizado_em")
+CAMPOS_NOTIFICACAO = ("id", "mensagem", "lida", "link", "data_criacao", "atualizado_em")
+
+
+def _usuarios_dos_professores(professor_ids):
+    return dict(
+        Professor.objects.filter(id__in=set(professor_ids)).values_list("id", "user_id")
+    )
+
+
+def registrar_permutas(permutas, professores_anteriores=None, modelo="permuta",
+                       objeto_ids=None, removido=False):
+    """
+    Registra a alteração de permutas (ou de suas reposições, com
+    ``modelo="reposicao"`` e ``objeto_ids`` com o id de cada reposição).
+
+    ``removido`` indica exclusão; permutas canceladas também viram exclusão
+    para o cliente. Se a permuta trocou de professor,
+    ``professores_anteriores`` ({permuta_id: (solicitante_id, substituto_id)})
+    faz o professor que saiu receber a exclusão.
+    """
+    professores_anteriores = professores_anteriores or {}
+    professor_ids = []
+    for permuta in permutas:
+        professor_ids += [permuta.professor_solicitante_id, permuta.professor_substituto_id]
+        professor_ids += professores_anteriores.get(permuta.pk, ())
+    usuarios = _usuarios_dos_professores(professor_ids)
+
+    alteracoes = []
+    for indice, permuta in enumerate(permutas):
+        objeto_id = objeto_ids[indice] if objeto_ids else permuta.pk
+        atuais = {permuta.professor_solicitante_id, permuta.professor_substituto_id}
+        for professor_id in atuais:
+            alteracoes.append(AlteracaoSincronizacao(
+                usuario_id=usuarios[professor_id],
+                modelo=modelo,
+                objeto_id=objeto_id,
+                removido=removido or permuta.status == "CANCELADA",
+            ))
+        for professor_id in set(professores_anteriores.get(permuta.pk, ())) - atuais:
+            alteracoes.append(AlteracaoSincronizacao(
+                usuario_id=usuarios[professor_id],
+                modelo=modelo,
+                objeto_id=objeto_id,
+                removido=True,
+            ))
+    AlteracaoSincronizacao.objects.bulk_create(alteracoes)
+
+
+def registrar_notificacoes(notificacoes, removido=False):
+    """
+    Registra notificações criadas, alteradas ou excluídas.
+    """
+    AlteracaoSincronizacao.objects.bulk_create([
+        AlteracaoSincronizacao(
+            usuario_id=notificacao.usuario_id,
+            modelo="notificacao",
+            objeto_id=notificacao.pk,
+            removido=removido,
+        )
+        for notificacao in notificacoes
+    ])
+
+
+def alteracoes_desde(usuario, professor, since, limite=LIMITE_ALTERACOES):
+    """
+    Monta o pacote de sincronização com tudo o que mudou após ``since``.
+
+    Cada objeto aparece uma vez, no estado atual; objetos excluídos,
+    cancelados ou que deixaram de pertencer ao usuário vão em ``removidos``.
+    """
+    linhas = list(
+        AlteracaoSincronizacao.objects.filter(usuario=usuario, id__gt=since)
+        .order_by("id")
+        .values_list("id", "modelo", "objeto_id", "removido")[:limite + 1]
+    )
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    # Só o último registro de cada objeto importa
+    ultimos = {}
+    for _, modelo, objeto_id, removido in linhas:
+        ultimos[(modelo, objeto_id)] = removido
+    ids = {"permuta": set(), "reposicao": set(), "notificacao": set()}
+    removidos = {"permuta": set(), "reposicao": set(), "notificacao": set()}
+    for (modelo, objeto_id), removido in ultimos.items():
+        (removidos if removido else ids)[modelo].add(objeto_id)
+
+    permutas = reposicoes = notificacoes = []
+    if professor is not None and (ids["permuta"] or ids["reposicao"]):
+        do_professor = Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+        if ids["permuta"]:
+            permutas = list(
+                Permuta.objects.filter(do_professor, id__in=ids["permuta"])
+                .exclude(status="CANCELADA")
+                .values(*CAMPOS_PERMUTA)
+            )
+        if ids["reposicao"]:
+            reposicoes = list(
+                Reposicao.objects.filter(
+                    id__in=ids["reposicao"],
+                    permuta__in=Permuta.objects.filter(do_professor).exclude(status="CANCELADA"),
+                ).values(*CAMPOS_REPOSICAO)
+            )
+    if ids["notificacao"]:
+        notificacoes = list(
+            Notificacao.objects.filter(usuario=usuario, id__in=ids["notificacao"])
+            .values(*CAMPOS_NOTIFICACAO)
+        )
+
+    # O que foi alterado mas não existe mais (ou não é mais visível) é exclusão
+    for modelo, encontrados in (("permuta", permutas), ("reposicao", reposicoes), ("notificacao", notificacoes)):
+        removidos[modelo] |= ids[modelo] - {item["id"] for item in encontrados}
+
+    return {
+        "since": since,
+        "proximo": linhas[-1][0] if linhas else since,
+        "mais": mais,
+        "permutas": permutas,
+        "reposicoes": reposicoes,
+        "notificacoes": notificacoes,
+        "removidos": [
+            {"tipo": modelo, "id": objeto_id}
+            for modelo, objetos in removidos.items()
+            for objeto_id in sorted(objetos)
+        ],
+    }
@@ -1,3 +1,1312 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from unittest import mock
+from datetime import date, datetime, time as hora, timedelta
+from datetime import timezone as dt_timezone
 
-# Create your tests here.
+import openpyxl
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Professor
+from cadastros.models import Disciplina, HorarioAula, Turma
+from audit.models import EventoAuditoria
+from permuta import (
+    calendario,
+    checks,
+    comprovantes,
+    contadores,
+    disponibilidade,
+    exportacao,
+    graficos,
+    relatorios,
+    services,
+    utils,
+)
+from permuta.models import (
+    AlteracaoSincronizacao,
+    ContadorDisciplina,
+    ContadorProfessor,
+    Notificacao,
+    NotificacaoArquivada,
+    PeriodoLetivo,
+    Permuta,
+    PermutaArquivada,
+    Reposicao,
+    TarefaRelatorio,
+)
+from permuta.signals import status_alterado
+from permuta_aulas import estaticos, perfilamento, replica, urls
+
+
+class CadastroMixin:
+    """
+    Cadastro mínimo das permutas: o coordenador, os professores (o primeiro
+    solicita, o segundo substitui) e um horário do primeiro professor.
+    """
+
+    def criar_cadastro(self, professores=2):
+        self.coord = User.objects.create_superuser("coord", "", "senha")
+        self.professores = []
+        self.criar_professores(professores)
+        self.professor, self.substituto = self.professores[:2]
+        self.turma = Turma.objects.create(
+            codigo_turma="TSI1", curso="TSI", periodo="1", turno="NOITE", usuario_admin=self.coord
+        )
+        self.horario = self.criar_horario(self.professor)
+
+    def criar_professores(self, total):
+        for i in range(len(self.professores), total):
+            self.professores.append(Professor.objects.create(
+                user=User.objects.create_user(
+                    f"professor{i}", email=f"professor{i}@exemplo.com", first_name=f"Professor {i}"
+                ),
+                matricula_siape=f"{1000 + i}",
+                cpf=f"{52998224700 + i}",
+                coordenacao="Informática",
+                usuario_admin=self.coord,
+            ))
+
+    def criar_horario(self, professor, dia_semana="SEG", disciplina="Banco de Dados", turma=None):
+        return HorarioAula.objects.create(
+            professor=professor,
+            disciplina=Disciplina.objects.create(
+                nome=disciplina, carga_horaria=60,
+                professor_responsavel=professor, usuario_admin=self.coord,
+            ),
+            turma=turma or self.turma,
+            dia_semana=dia_semana,
+            hora_inicio=hora(19, 0),
+            hora_fim=hora(20, 40),
+            usuario_admin=self.coord,
+        )
+
+    def criar_permuta(self, data_aula=None, **campos):
+        campos = {
+            "motivo": "Congresso",
+            "professor_solicitante": self.professor,
+            "professor_substituto": self.substituto,
+            "horario": self.horario,
+            **campos,
+        }
+        return Permuta.objects.create(data_aula=data_aula or date.today(), **campos)
+
+
+class TransicaoConcorrenteTest(CadastroMixin, TransactionTestCase):
+    """
+    Várias threads disputam as mesmas permutas: metade tenta aprovar e metade
+    tenta recusar. Cada permuta deve terminar com exatamente uma transição
+    aplicada, e o estado final deve ser o da thread vencedora.
+    """
+
+    THREADS = 8
+    PERMUTAS = 40
+
+    def run(self, result=None):
+        # Guarda o resultado para saber a verbosidade (showAll com -v 2 ou mais)
+        self._resultado = result
+        return super().run(result)
+
+    def setUp(self):
+        self.criar_cadastro()
+        self.permuta_ids = []
+        for i in range(self.PERMUTAS):
+            permuta = self.criar_permuta(date(2026, 3, 2), motivo=f"Motivo {i}")
+            Reposicao.objects.create(permuta=permuta, data_reposicao=date(2026, 3, 9))
+            self.permuta_ids.append(permuta.id)
+        self.usuarios = [User.objects.create_user(f"decisor{i}") for i in range(self.THREADS)]
+
+    def _disputar(self, indice, barreira, resultados):
+        usuario = self.usuarios[indice]
+        acao = services.aprovar_permuta if indice % 2 == 0 else services.recusar_permuta
+        try:
+            barreira.wait()
+            for permuta_id in self.permuta_ids:
+                while True:
+                    try:
+                        # Mesmo padrão das views: lê a permuta e tenta a transição
+                        permuta = Permuta.objects.get(pk=permuta_id)
+                        aplicada = acao(permuta, usuario, professor_substituto=self.substituto)
+                        break
+                    except OperationalError:
+                        # Banco bloqueado por outra escrita: tenta novamente
+                        time.sleep(0.001)
+                resultados.append((permuta_id, usuario.id, permuta.status, aplicada))
+        finally:
+            connection.close()
+
+    def test_sem_atualizacoes_perdidas(self):
+        barreira = threading.Barrier(self.THREADS)
+        resultados = []
+        threads = [
+            threading.Thread(target=self._disputar, args=(i, barreira, resultados))
+            for i in range(self.THREADS)
+        ]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        self.assertEqual(len(resultados), self.THREADS * self.PERMUTAS)
+        vencedores = {}
+        for permuta_id, usuario_id, status, aplicada in resultados:
+            if aplicada:
+                self.assertNotIn(permuta_id, vencedores, "Transição aplicada duas vezes")
+                vencedores[permuta_id] = (usuario_id, status)
+        self.assertEqual(set(vencedores), set(self.permuta_ids))
+
+        for permuta in Permuta.objects.filter(id__in=self.permuta_ids):
+            usuario_id, status = vencedores[permuta.id]
+            self.assertEqual(permuta.status, status)
+            self.assertEqual(permuta.usuario_decisor_id, usuario_id)
+            self.assertIsNotNone(permuta.data_decisao)
+
+        if getattr(self._resultado, "showAll", False):
+            self._resultado.stream.write(
+                f"{len(resultados)} tentativas de transição em {duracao:.3f}s "
+                f"({len(resultados) / duracao:.0f}/s, {self.THREADS} threads) ... "
+            )
+
+    def test_falha_no_sinal_restaura_a_instancia(self):
+        def falhar(**kwargs):
+            raise RuntimeError("receptor falhou")
+
+        permuta = Permuta.objects.get(pk=self.permuta_ids[0])
+        self.assertIsNone(permuta.usuario_decisor)
+        status_alterado.connect(falhar)
+        try:
+            with self.assertRaises(RuntimeError):
+                services.aprovar_permuta(permuta, self.usuarios[0], professor_substituto=self.substituto)
+        finally:
+            status_alterado.disconnect(falhar)
+
+        self.assertEqual(permuta.status, "PENDENTE")
+        self.assertIsNone(permuta.usuario_decisor_id)
+        self.assertIsNone(permuta.usuario_decisor)
+        self.assertEqual(Permuta.objects.get(pk=permuta.pk).status, "PENDENTE")
+
+    def test_transicao_invalida_nao_gera_update(self):
+        permuta = Permuta.objects.get(pk=self.permuta_ids[0])
+        permuta.status = "CANCELADA"
+        with self.assertNumQueries(0):
+            aplicada = services.aprovar_permuta(permuta, self.usuarios[0], professor_substituto=self.substituto)
+        self.assertFalse(aplicada)
+
+
+class ConsultasPorViewTest(CadastroMixin, TestCase):
+    """
+    Cada endpoint é requisitado com 10 e com 500 permutas no banco: a
+    quantidade de consultas tem que ser a mesma nos dois tamanhos (sem N+1)
+    e ficar dentro do orçamento da view.
+    """
+
+    TAMANHOS = (10, 500)
+
+    # nome da rota -> (usuário, argumentos da URL, orçamento de consultas).
+    # O orçamento inclui a leitura da sessão, do usuário e do professor (o
+    # cache é limpo antes de cada requisição) e, nas listas, a dos períodos
+    # letivos.
+    # Toda rota com nome do projeto e toda lista do admin precisam estar aqui
+    # (ver test_todas_as_rotas_tem_orcamento).
+    ENDPOINTS = {
+        "home": ("professor", (), 3),
+        "login": (None, (), 0),
+        "logout": ("professor", (), 5),
+        "admin_dashboard": ("coord", (), 15),
+        "professor_dashboard": ("professor", (), 13),
+        "meus_horarios": ("professor", (), 8),
+        "api_eventos_calendario": ("professor", (), 8),
+        "trocar_endereco_calendario": ("professor", (), 3),
+        "feed_calendario": (None, ("token",), 4),
+        "solicitar_permuta": ("professor", ("horario",), 8),
+        "solicitar_ausencia": ("professor", (), 8),
+        "minhas_permutas": ("professor", (), 6),
+        "detalhe_permuta": ("professor", ("permuta",), 5),
+        "cancelar_permuta": ("professor", ("permuta_pendente",), 5),
+        "comprovante_permuta_pdf": ("professor", ("permuta",), 4),
+        "registrar_reposicao": ("professor", ("permuta_aprovada",), 5),
+        "permutas_como_substituto": ("professor", (), 6),
+        "confirmar_permuta_substituto": ("substituto", ("permuta_pendente",), 5),
+        "permutas_pendentes": ("coord", (), 6),
+        "dashboard_estatisticas": ("coord", (), 8),
+        "relatorio_permutas_excel": ("coord", (), 7),
+        "relatorio_permutas_pdf": ("coord", (), 7),
+        "exportar_permutas_csv": ("coord", (), 4),
+        "exportar_permutas_jsonl": ("coord", (), 4),
+        "exportar_comprovantes_zip": ("coord", (), 7),
+        "acompanhar_relatorio": ("coord", ("tarefa",), 5),
+        "api_relatorio": ("coord", ("tarefa",), 4),
+        "baixar_relatorio": ("coord", ("tarefa_concluida",), 4),
+        "perfis_requisicoes": ("coord", (), 4),
+        "perfil_requisicao": ("coord", ("perfil",), 4),
+        "baixar_perfil": ("coord", ("perfil",), 3),
+        "api_permutas": ("professor", (), 7),
+        "api_buscar_permutas": ("coord", (), 5),
+        "api_permuta_detalhe": ("professor", ("permuta",), 5),
+        "api_horarios_reposicao": ("professor", ("permuta",), 8),
+        "api_estatisticas": ("coord", (), 7),
+        "api_notificacoes": ("professor", (), 5),
+        "api_sincronizar": ("professor", (), 7),
+        "historico_permuta": ("coord", ("permuta",), 4),
+        "historico_usuario": ("coord", ("usuario",), 5),
+        "ler_notificacao": ("professor", ("notificacao",), 6),
+        "admin:permuta_permuta_changelist": ("coord", (), 8),
+        "admin:permuta_reposicao_changelist": ("coord", (), 7),
+        "admin:permuta_periodoletivo_changelist": ("coord", (), 6),
+        "admin:cadastros_turma_changelist": ("coord", (), 6),
+        "admin:cadastros_disciplina_changelist": ("coord", (), 5),
+        "admin:cadastros_horarioaula_changelist": ("coord", (), 5),
+        "admin:accounts_professor_changelist": ("coord", (), 9),
+        "admin:audit_eventoauditoria_changelist": ("coord", (), 8),
+        "admin:auth_user_changelist": ("coord", (), 7),
+        "admin:auth_group_changelist": ("coord", (), 6),
+    }
+    # Rotas fora da medição, com o motivo
+    SEM_ORCAMENTO = {
+        # O template professor/calendario_horarios.html não existe no projeto
+        "calendario_horarios",
+    }
+    PARAMETROS = {
+        "api_buscar_permutas": "?q=motivo",
+        "api_sincronizar": "?since=0",
+    }
+
+    def setUp(self):
+        self.criar_cadastro(3)
+        self.horarios = [self.horario] + [
+            self.criar_horario(professor, dia, f"Disciplina {i}")
+            for i, (professor, dia) in enumerate(zip(self.professores[1:], ["TER", "QUA"]), start=1)
+        ]
+        self.total = 0
+        calendario.obter_assinatura(self.professor)
+
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            RELATORIOS_DIR=Path(diretorio.name) / "relatorios",
+            PERFILAMENTO_DIR=Path(diretorio.name) / "perfis",
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        # Sem coalescência: os pedidos de relatório criam a tarefa nas duas
+        # medições
+        janela = mock.patch.object(relatorios, "JANELA_COALESCENCIA", 0)
+        janela.start()
+        self.addCleanup(janela.stop)
+
+    def _semear(self, ate):
+        """
+        Cria permutas até o total ``ate``: o professor como solicitante e
+        como substituto, em todos os status, com reposições e notificações.
+        A quantidade de professores também cresce com o total.
+        """
+        self.criar_professores(3 + ate // 20)
+        status = ["PENDENTE", "APROVADA", "RECUSADA", "CANCELADA"]
+        hoje = date.today()
+        for i in range(self.total, ate):
+            solicitante, substituto, horario = (
+                (self.professor, self.professores[1 + i % (len(self.professores) - 1)], self.horarios[0])
+                if i % 3
+                else (self.substituto, self.professor, self.horarios[1])
+            )
+            permuta = Permuta.objects.create(
+                data_aula=hoje + timedelta(days=i % 60 - 20),
+                motivo=f"Motivo {i}",
+                status=status[i % 4],
+                professor_solicitante=solicitante,
+                professor_substituto=substituto,
+                horario=horario,
+            )
+            if permuta.status == "APROVADA":
+                Reposicao.objects.create(permuta=permuta, data_reposicao=permuta.data_aula + timedelta(days=7))
+            Notificacao.objects.create(usuario=self.professor.user, mensagem=f"Notificação {i}")
+        self.total = ate
+
+    def _argumentos(self, nomes):
+        permutas = Permuta.objects.filter(professor_solicitante=self.professor).order_by("id")
+        valores = {
+            "token": lambda: calendario.obter_assinatura(self.professor).token,
+            "horario": lambda: self.horarios[0].id,
+            "permuta": lambda: permutas.first().id,
+            "permuta_pendente": lambda: permutas.filter(status="PENDENTE").first().id,
+            "permuta_aprovada": lambda: permutas.filter(status="APROVADA").first().id,
+            "tarefa": lambda: relatorios.solicitar("EXCEL", {}, self.coord)[0].id,
+            "usuario": lambda: self.professor.user_id,
+            "tarefa_concluida": self._tarefa_concluida,
+            "perfil": self._perfil,
+            "notificacao": lambda: Notificacao.objects.filter(usuario=self.professor.user).first().id,
+        }
+        return [valores[nome]() for nome in nomes]
+
+    def _tarefa_concluida(self):
+        tarefa, _ = relatorios.solicitar("EXCEL", {"status": "APROVADA"}, self.coord)
+        if tarefa.status != "CONCLUIDA":
+            relatorios.executar(tarefa)
+        return tarefa.id
+
+    def _perfil(self):
+        if not perfilamento.listar_nomes():
+            cliente = Client()
+            cliente.force_login(self.coord)
+            cliente.get(reverse("home"), {"_perfil": "1"})
+        return perfilamento.listar_nomes()[0]
+
+    def _consultas(self, nome, usuario, argumentos):
+        url = reverse(nome, args=self._argumentos(argumentos)) + self.PARAMETROS.get(nome, "")
+        usuarios = {"professor": self.professor.user, "substituto": self.substituto.user, "coord": self.coord}
+        self.client.logout()
+        if usuario:
+            self.client.force_login(usuarios[usuario])
+        cache.clear()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+            if resposta.streaming:
+                b"".join(resposta.streaming_content)
+        self.assertLess(resposta.status_code, 400, f"{nome}: {resposta.status_code}")
+        return len(consultas), [consulta["sql"] for consulta in consultas.captured_queries]
+
+    def test_consultas_nao_crescem_com_os_dados(self):
+        medidas = {}
+        for tamanho in self.TAMANHOS:
+            self._semear(tamanho)
+            for nome, (usuario, argumentos, _) in self.ENDPOINTS.items():
+                medidas.setdefault(nome, []).append(self._consultas(nome, usuario, argumentos))
+
+        for nome, (_, _, orcamento) in self.ENDPOINTS.items():
+            (pequeno, _), (grande, consultas) = medidas[nome]
+            with self.subTest(view=nome):
+                self.assertEqual(
+                    pequeno, grande,
+                    f"{nome}: {pequeno} consultas com {self.TAMANHOS[0]} permutas e "
+                    f"{grande} com {self.TAMANHOS[1]}:\n" + "\n".join(consultas),
+                )
+                self.assertLessEqual(
+                    grande, orcamento,
+                    f"{nome}: {grande} consultas, orçamento {orcamento}:\n" + "\n".join(consultas),
+                )
+
+
+    def test_todas_as_rotas_tem_orcamento(self):
+        rotas = {rota.name for rota in urls.urlpatterns if getattr(rota, "name", None)}
+        listas_admin = {
+            f"admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist"
+            for modelo in admin.site._registry
+        }
+        self.assertEqual(set(self.ENDPOINTS) | self.SEM_ORCAMENTO, rotas | listas_admin)
+
+    def test_busca_do_admin_filtra_no_banco(self):
+        # Os IDs encontrados ficam em uma subconsulta na tabela FTS, sem
+        # virar uma lista de parâmetros (limite de variáveis do SQLite)
+        self._semear(40)
+        self.client.force_login(self.coord)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse("admin:permuta_permuta_changelist"), {"q": "motivo"})
+        self.assertEqual(resposta.context["cl"].result_count, 40)
+        sql = next(c["sql"] for c in consultas.captured_queries if "MATCH" in c["sql"])
+        self.assertIn("SELECT rowid FROM permuta_busca", sql)
+        self.assertLess(sql.count(","), 100)
+
+    def test_renomear_cadastro_muda_o_etag(self):
+        # Os nomes aparecem no JSON: renomear a disciplina ou o professor não
+        # pode deixar a API responder 304 com o corpo antigo
+        self._semear(10)
+        self.client.force_login(self.professor.user)
+        url = reverse("api_permutas")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        disciplina = self.horarios[0].disciplina
+        disciplina.nome = "Disciplina renomeada"
+        disciplina.save()
+        resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("Disciplina renomeada", resposta.content.decode())
+
+        etag = resposta["ETag"]
+        self.substituto.user.first_name = "Outro nome"
+        self.substituto.user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ReplicaLeituraTest(CadastroMixin, TransactionTestCase):
+    """
+    Réplica em um segundo arquivo SQLite, copiado do banco de teste por
+    atualizar_replica: as leituras marcadas veem a cópia, o resto vê o
+    banco principal.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = connections["replica"].settings_dict
+        nome_original = configuracao["NAME"]
+        configuracao["NAME"] = str(Path(diretorio.name) / "replica.sqlite3")
+
+        def restaurar():
+            connections["replica"].close()
+            configuracao["NAME"] = nome_original
+
+        self.addCleanup(restaurar)
+
+        self.criar_cadastro()
+        self.copiada = self._permuta()
+        replica.atualizar_replica()
+        self.nova = self._permuta()
+
+    def _permuta(self):
+        return self.criar_permuta()
+
+    def test_leituras_marcadas_vao_para_a_replica(self):
+        self.assertEqual(replica.alias_leitura(), "replica")
+        self.assertEqual(Permuta.objects.count(), 2)
+        with replica.em_replica():
+            self.assertEqual(Permuta.objects.count(), 1)
+            # Dentro de transação lê o que acabou de gravar
+            with transaction.atomic():
+                self.assertEqual(Permuta.objects.count(), 2)
+            # Gravações sempre no principal
+            self._permuta()
+        self.assertEqual(Permuta.objects.count(), 3)
+
+    def test_exportacao_le_da_replica(self):
+        self.client.force_login(self.coord)
+        resposta = self.client.get(reverse("exportar_permutas_jsonl"))
+        linhas = b"".join(resposta.streaming_content).decode().splitlines()
+        self.assertEqual(len(linhas), 1)
+        self.assertIn(f'"id": {self.copiada.id}', linhas[0])
+
+    def test_feed_alterado_depois_da_copia_le_do_principal(self):
+        uid = f"UID:permuta-{self.nova.id}@"
+        # A permuta nova invalidou o feed depois da cópia: gera no principal
+        self.assertIn(uid, calendario.obter_feed(self.professor.id)["conteudo"].decode())
+
+        # Sem alteração pendente, o feed vem da réplica
+        cache.clear()
+        self.assertNotIn(uid, calendario.obter_feed(self.professor.id)["conteudo"].decode())
+
+        replica.atualizar_replica()
+        cache.clear()
+        self.assertIn(uid, calendario.obter_feed(self.professor.id)["conteudo"].decode())
+
+
+class PeriodoLetivoTest(CadastroMixin, TestCase):
+    """
+    Atribuição das permutas aos períodos letivos, listas do período atual e
+    arquivamento dos períodos encerrados.
+    """
+
+    def setUp(self):
+        self.criar_cadastro()
+        self.antigo = PeriodoLetivo.objects.create(nome="2025.1", inicio=date(2025, 2, 10), fim=date(2025, 7, 5))
+        self.aprovada = self._permuta(date(2025, 3, 10), "APROVADA")
+        Reposicao.objects.create(permuta=self.aprovada, data_reposicao=date(2025, 3, 17), observacao="Sala 3")
+        self.recusada = self._permuta(date(2025, 4, 7), "RECUSADA")
+        self.atual = self._permuta(date.today(), "PENDENTE")
+
+        # O arquivamento segue a permuta da notificação, não a data de criação
+        self.notificacao_antiga = Notificacao.objects.create(
+            usuario=self.professor.user, mensagem="Antiga", permuta=self.aprovada
+        )
+        self.notificacao_nova = Notificacao.objects.create(
+            usuario=self.professor.user, mensagem="Nova", permuta=self.atual
+        )
+        self.aviso = Notificacao.objects.create(usuario=self.professor.user, mensagem="Sem permuta")
+        Notificacao.objects.filter(pk__in=[self.notificacao_nova.pk, self.aviso.pk]).update(
+            data_criacao=datetime(2025, 5, 1, 12, tzinfo=dt_timezone.utc)
+        )
+
+    def _permuta(self, data, status):
+        return self.criar_permuta(data, status=status)
+
+    def test_permuta_recebe_o_periodo_da_data_da_aula(self):
+        self.assertEqual(self.aprovada.periodo, self.antigo)
+        # Sem período cadastrado: cria o semestre, sem sobrepor o 2025.1
+        julho = self._permuta(date(2025, 8, 4), "CANCELADA")
+        self.assertEqual(julho.periodo.nome, "2025.2 (06/07 a 31/12)")
+        self.assertEqual(julho.periodo.inicio, date(2025, 7, 6))
+        janeiro = self._permuta(date(2025, 1, 20), "CANCELADA")
+        self.assertEqual(janeiro.periodo.nome, "2025.1 (01/01 a 09/02)")
+        self.assertEqual(janeiro.periodo.fim, date(2025, 2, 9))
+
+    def test_mudar_a_data_da_aula_muda_o_periodo(self):
+        permuta = Permuta.objects.get(pk=self.recusada.pk)
+        permuta.data_aula = date.today()
+        permuta.save(update_fields=["data_aula"])
+        permuta.refresh_from_db()
+        self.assertEqual(permuta.periodo, self.atual.periodo)
+
+        # Sem mudar a data, o período não é consultado de novo
+        permuta = Permuta.objects.get(pk=self.recusada.pk)
+        with CaptureQueriesContext(connection) as consultas:
+            permuta.save()
+        self.assertFalse([c for c in consultas.captured_queries if "permuta_periodoletivo" in c["sql"]])
+
+    def test_listas_mostram_o_periodo_atual(self):
+        self.client.force_login(self.professor.user)
+        resposta = self.client.get(reverse("minhas_permutas"))
+        self.assertEqual([p.id for p in resposta.context["permutas"]], [self.atual.id])
+        self.assertEqual(resposta.context["periodo"], self.atual.periodo)
+
+        resposta = self.client.get(reverse("minhas_permutas"), {"periodo": self.antigo.pk})
+        self.assertEqual({p.id for p in resposta.context["permutas"]}, {self.aprovada.id, self.recusada.id})
+        resposta = self.client.get(reverse("minhas_permutas"), {"periodo": "todos"})
+        self.assertEqual(len(resposta.context["permutas"]), 3)
+
+        resposta = self.client.get(reverse("professor_dashboard"), {"periodo": self.antigo.pk})
+        self.assertEqual(resposta.context["total_permutas"], 2)
+        self.client.force_login(self.coord)
+        resposta = self.client.get(reverse("permutas_pendentes"))
+        self.assertEqual([p.id for p in resposta.context["permutas"]], [self.atual.id])
+
+    def test_arquivar_periodo_encerrado(self):
+        call_command("arquivar_periodos", lote=1, stdout=io.StringIO())
+
+        self.antigo.refresh_from_db()
+        self.assertTrue(self.antigo.arquivado)
+        self.assertEqual(list(Permuta.objects.values_list("id", flat=True)), [self.atual.id])
+        self.assertFalse(Reposicao.objects.exists())
+        arquivada = PermutaArquivada.objects.get(pk=self.aprovada.pk)
+        self.assertEqual(arquivada.reposicao.data_reposicao, date(2025, 3, 17))
+        self.assertEqual(arquivada.reposicao.observacao, "Sala 3")
+        self.assertFalse(PermutaArquivada.objects.get(pk=self.recusada.pk).tem_reposicao())
+
+        self.assertEqual(
+            set(Notificacao.objects.values_list("id", flat=True)), {self.notificacao_nova.id, self.aviso.id}
+        )
+        self.assertEqual(
+            list(NotificacaoArquivada.objects.values_list("id", "periodo")),
+            [(self.notificacao_antiga.id, self.antigo.id)],
+        )
+
+        # Só a permuta do período atual continua nos contadores
+        total = ContadorProfessor.objects.get(professor=self.professor, status="TOTAL")
+        self.assertEqual(total.total, 1)
+        # Arquivar não é excluir
+        self.assertFalse(EventoAuditoria.objects.filter(acao="EXCLUSAO").exists())
+
+    def test_periodo_com_pendentes_nao_e_arquivado(self):
+        self._permuta(date(2025, 5, 5), "PENDENTE")
+        with self.assertRaises(CommandError):
+            call_command("arquivar_periodos", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertIsNone(PeriodoLetivo.objects.get(pk=self.antigo.pk).arquivado_em)
+        self.assertFalse(PermutaArquivada.objects.exists())
+
+    def test_relatorio_de_periodo_arquivado(self):
+        call_command("arquivar_periodos", stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(RELATORIOS_DIR=diretorio):
+            tarefa, _ = relatorios.solicitar("EXCEL", {"periodo": self.antigo.pk}, self.coord)
+            self.assertTrue(relatorios.executar(tarefa))
+            planilha = openpyxl.load_workbook(relatorios.caminho(tarefa)).active
+            linhas = {linha[0]: linha for linha in planilha.iter_rows(min_row=2, values_only=True)}
+        self.assertEqual(set(linhas), {self.aprovada.id, self.recusada.id})
+        self.assertEqual(linhas[self.aprovada.id][10], "17/03/2025")
+
+    def test_comprovantes_de_periodo_arquivado_sao_recusados(self):
+        call_command("arquivar_periodos", stdout=io.StringIO())
+        self.client.force_login(self.coord)
+        url = reverse("exportar_comprovantes_zip")
+        resposta = self.client.get(url, {"periodo": self.antigo.pk})
+        self.assertEqual(resposta.status_code, 400)
+        resposta = self.client.get(url, {"periodo": self.antigo.pk, "fila": "1"})
+        self.assertRedirects(resposta, reverse("admin_dashboard"), fetch_redirect_response=False)
+        self.assertFalse(TarefaRelatorio.objects.exists())
+
+        # Tarefa pedida antes do arquivamento: falha em vez de gerar um ZIP vazio
+        tarefa, _ = relatorios.solicitar("ZIP", {"periodo": self.antigo.pk}, self.coord)
+        with self.assertLogs("permuta.relatorios", "ERROR"):
+            self.assertFalse(relatorios.executar(tarefa))
+        self.assertEqual(tarefa.status, "ERRO")
+        self.assertIn("arquivados", tarefa.erro)
+
+
+class GatilhosBuscaTest(TestCase):
+    def test_banco_migrado_tem_todos_os_gatilhos(self):
+        self.assertEqual(checks.verificar_gatilhos_busca(None, databases=["default"]), [])
+
+    def test_gatilho_faltando_e_acusado(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER permuta_busca_user_au")
+
+        erros = checks.verificar_gatilhos_busca(None, databases=["default"])
+        self.assertEqual([erro.id for erro in erros], ["permuta.E001"])
+        self.assertIn("permuta_busca_user_au", erros[0].msg)
+
+
+class SincronizacaoTest(CadastroMixin, TestCase):
+    """
+    API de sincronização: o estado atual do que mudou após ``since`` e as
+    exclusões (tombstones) do que saiu da visão do usuário.
+    """
+
+    def setUp(self):
+        self.criar_cadastro(professores=3)
+        self.client.force_login(self.substituto.user)
+        self.url = reverse("api_sincronizar")
+
+    def sincronizar(self, since):
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_alteracoes_e_exclusoes_desde_a_ultima_sincronizacao(self):
+        permuta = self.criar_permuta()
+        cancelada = self.criar_permuta(motivo="Banca")
+        Notificacao.objects.create(usuario=self.substituto.user, mensagem="Nova permuta")
+
+        pacote = self.sincronizar(0)
+        self.assertEqual({item["id"] for item in pacote["permutas"]}, {permuta.id, cancelada.id})
+        self.assertEqual(len(pacote["notificacoes"]), 1)
+        self.assertEqual(pacote["removidos"], [])
+        self.assertFalse(pacote["mais"])
+
+        # Sem novidades: nada a aplicar e a marca não muda
+        vazio = self.sincronizar(pacote["proximo"])
+        self.assertEqual(vazio["proximo"], pacote["proximo"])
+        self.assertEqual(vazio["permutas"] + vazio["removidos"], [])
+
+        cancelada.status = "CANCELADA"
+        cancelada.save()
+        # O substituto deixa a permuta: para ele, é uma exclusão
+        permuta.professor_substituto = self.professores[2]
+        permuta.save()
+
+        pacote = self.sincronizar(pacote["proximo"])
+        self.assertEqual(pacote["permutas"], [])
+        self.assertEqual(
+            pacote["removidos"],
+            [{"tipo": "permuta", "id": permuta.id}, {"tipo": "permuta", "id": cancelada.id}],
+        )
+
+    def test_since_invalido(self):
+        self.assertEqual(self.client.get(self.url, {"since": "ontem"}).status_code, 400)
+
+
+class AusenciaTest(CadastroMixin, TestCase):
+    """
+    Ausência em lote: uma permuta por aula do período, em ordem de data.
+    """
+
+    def setUp(self):
+        self.criar_cadastro(professores=3)
+        self.quarta = self.criar_horario(self.professor, dia_semana="QUA", disciplina="Redes")
+
+    def test_uma_permuta_por_aula_do_periodo(self):
+        # Aula da segunda 09/03 já tem permuta; a cancelada não conta
+        self.criar_permuta(date(2026, 3, 9))
+        self.criar_permuta(date(2026, 3, 4), horario=self.quarta, status="CANCELADA")
+
+        permutas = services.solicitar_ausencia(
+            self.professor,
+            {self.horario: self.substituto, self.quarta: self.professores[2]},
+            date(2026, 3, 2), date(2026, 3, 15), "Licença", self.coord,
+        )
+
+        self.assertEqual(
+            [(permuta.data_aula, permuta.horario, permuta.professor_substituto) for permuta in permutas],
+            [
+                (date(2026, 3, 2), self.horario, self.substituto),
+                (date(2026, 3, 4), self.quarta, self.professores[2]),
+                (date(2026, 3, 11), self.quarta, self.professores[2]),
+            ],
+        )
+        self.assertTrue(all(permuta.pk and permuta.status == "PENDENTE" for permuta in permutas))
+        # Sem post_save, a sincronização vem do sinal permutas_criadas
+        self.assertEqual(
+            AlteracaoSincronizacao.objects.filter(
+                usuario=self.substituto.user, objeto_id__in=[permuta.pk for permuta in permutas]
+            ).count(),
+            1,
+        )
+
+        # Repetir o pedido não duplica as aulas
+        self.assertEqual(
+            services.solicitar_ausencia(
+                self.professor, {self.horario: self.substituto},
+                date(2026, 3, 2), date(2026, 3, 15), "Licença", self.coord,
+            ),
+            [],
+        )
+
+
+class HorariosLivresTest(CadastroMixin, TestCase):
+    """
+    Sugestões de reposição: datas em que turma e professor estão livres.
+    """
+
+    def setUp(self):
+        self.criar_cadastro()
+        self.permuta = self.criar_permuta(date(2026, 3, 9))
+
+    def test_pula_grade_substituicoes_e_reposicoes(self):
+        # Terça: o professor substitui uma aula de outra turma
+        outra_turma = Turma.objects.create(
+            codigo_turma="TSI2", curso="TSI", periodo="2", turno="NOITE", usuario_admin=self.coord
+        )
+        terca = self.criar_horario(self.substituto, dia_semana="TER", disciplina="Redes", turma=outra_turma)
+        self.criar_permuta(
+            date(2026, 3, 3), horario=terca,
+            professor_solicitante=self.substituto, professor_substituto=self.professor,
+        )
+        # Quarta: reposição já marcada para a turma; a de quinta foi cancelada
+        Reposicao.objects.create(permuta=self.criar_permuta(date(2026, 2, 23)), data_reposicao=date(2026, 3, 4))
+        Reposicao.objects.create(
+            permuta=self.criar_permuta(date(2026, 2, 16), status="CANCELADA"),
+            data_reposicao=date(2026, 3, 5),
+        )
+
+        sugestoes = disponibilidade.horarios_livres(self.permuta, dias=7, inicio=date(2026, 3, 2))
+
+        # Segunda tem a própria aula e domingo não tem aula
+        self.assertEqual(
+            [(sugestao["data"], sugestao["hora_inicio"], sugestao["hora_fim"]) for sugestao in sugestoes],
+            [(date(2026, 3, dia), hora(19, 0), hora(20, 40)) for dia in (5, 6, 7)],
+        )
+        self.assertEqual(sugestoes[0]["dia_semana"], "QUI")
+
+    def test_quantidade_limita_as_sugestoes(self):
+        sugestoes = disponibilidade.horarios_livres(
+            self.permuta, quantidade=2, dias=30, inicio=date(2026, 3, 2)
+        )
+        self.assertEqual([sugestao["data"] for sugestao in sugestoes], [date(2026, 3, 3), date(2026, 3, 4)])
+
+
+class ContadoresTest(CadastroMixin, TestCase):
+    """
+    Os contadores mantidos pelos sinais batem com a recontagem das permutas.
+    """
+
+    def setUp(self):
+        self.criar_cadastro(professores=3)
+        self.quarta = self.criar_horario(self.substituto, dia_semana="QUA", disciplina="Redes")
+
+    def recontagem(self):
+        contagem = {}
+        for professor_id, status in Permuta.objects.values_list("professor_solicitante_id", "status"):
+            for chave in (status, contadores.TOTAL):
+                contagem[(professor_id, chave)] = contagem.get((professor_id, chave), 0) + 1
+        return contagem
+
+    def contadores_professor(self):
+        return {
+            (professor_id, status): total
+            for professor_id, status, total in ContadorProfessor.objects.filter(total__gt=0)
+            .values_list("professor_id", "status", "total")
+        }
+
+    def test_sinais_mantem_os_contadores_em_dia(self):
+        aprovada = self.criar_permuta(date(2026, 3, 2))
+        Reposicao.objects.create(permuta=aprovada, data_reposicao=date(2026, 3, 7))
+        self.assertTrue(services.aprovar_permuta(aprovada, self.coord, professor_substituto=self.substituto))
+        self.criar_permuta(
+            date(2026, 3, 4), horario=self.quarta,
+            professor_solicitante=self.substituto, professor_substituto=self.professores[2],
+        )
+        services.solicitar_ausencia(
+            self.professor, {self.horario: self.professores[2]},
+            date(2026, 3, 9), date(2026, 3, 22), "Licença", self.coord,
+        )
+        self.criar_permuta(date(2026, 4, 6)).delete()
+
+        self.assertEqual(self.contadores_professor(), self.recontagem())
+        self.assertEqual(
+            contadores.reconciliar(corrigir=False),
+            {ContadorProfessor: 0, ContadorDisciplina: 0},
+        )
+        self.assertEqual(
+            [(professor.pk, professor.total_permutas) for professor in contadores.top_professores()],
+            [(self.professor.pk, 3), (self.substituto.pk, 1)],
+        )
+
+    def test_reconciliar_corrige_alteracoes_sem_sinal(self):
+        self.criar_permuta(date(2026, 3, 2))
+        self.criar_permuta(date(2026, 3, 9))
+        # update() não dispara sinais: os contadores ficam defasados
+        Permuta.objects.update(status="APROVADA")
+        self.assertNotEqual(self.contadores_professor(), self.recontagem())
+
+        saida = io.StringIO()
+        call_command("reconciliar_contadores", "--verificar", stdout=saida)
+        self.assertIn("divergente", saida.getvalue())
+        self.assertNotEqual(self.contadores_professor(), self.recontagem())
+
+        divergencias = contadores.reconciliar()
+        self.assertEqual(divergencias[ContadorProfessor], 2)
+        self.assertEqual(self.contadores_professor(), self.recontagem())
+        self.assertEqual(
+            contadores.reconciliar(corrigir=False),
+            {ContadorProfessor: 0, ContadorDisciplina: 0},
+        )
+
+
+@override_settings(GRAFICOS_PROCESSOS=2)
+class GraficosPoolTest(SimpleTestCase):
+    """
+    Requisições simultâneas geram os gráficos no pool de processos, sem
+    misturar as figuras umas das outras: cada uma recebe exatamente a imagem
+    que o mesmo gráfico gera isoladamente, no próprio processo.
+    """
+
+    def tearDown(self):
+        graficos.encerrar_pool()
+
+    def _pedidos(self, i):
+        return (
+            (graficos.grafico_status, (i, 2 * i, 3)),
+            (graficos.grafico_mensal, (["jan/2026", "fev/2026"], [i, i + 1])),
+        )
+
+    def test_iniciar_pool_aquece_os_processos(self):
+        graficos.iniciar_pool()
+        pool = graficos._pool
+        # Os processos já existem antes do primeiro gráfico
+        self.assertEqual(len(pool._processes), 2)
+        graficos.renderizar(*self._pedidos(1))
+        self.assertIs(graficos._pool, pool)
+
+    def test_graficos_simultaneos(self):
+        with self.settings(GRAFICOS_PROCESSOS=0):
+            esperados = {i: graficos.renderizar(*self._pedidos(i)) for i in range(6)}
+        self.assertTrue(base64.b64decode(esperados[0][0]).startswith(b"\x89PNG"))
+
+        resultados = {}
+
+        def requisicao(i):
+            resultados[i] = graficos.renderizar(*self._pedidos(i))
+
+        threads = [threading.Thread(target=requisicao, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(resultados, esperados)
+
+
+class ComprovanteTest(CadastroMixin, TestCase):
+    """
+    Comprovante em PDF: mesma chave (ETag), mesmos bytes.
+    """
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(COMPROVANTES_CACHE_DIR=Path(diretorio.name))
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.criar_cadastro()
+        self.permuta = Permuta.objects.select_related(*comprovantes.RELACOES_COMPROVANTE).get(
+            pk=self.criar_permuta().pk
+        )
+
+    def test_emissao_e_a_ultima_alteracao_da_permuta(self):
+        dados = comprovantes.dados_comprovante(self.permuta)
+        self.assertEqual(
+            dados["emissao"], timezone.localtime(self.permuta.atualizado_em).strftime("%d/%m/%Y %H:%M")
+        )
+        primeiro = comprovantes.renderizar_comprovante(dados)
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(days=3)):
+            segundo = comprovantes.renderizar_comprovante(comprovantes.dados_comprovante(self.permuta))
+        self.assertEqual(primeiro, segundo)
+
+    def test_etag_e_intervalos(self):
+        self.client.force_login(self.coord)
+        url = reverse("comprovante_permuta_pdf", args=[self.permuta.id])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        pdf = b"".join(response.streaming_content)
+        etag = response["ETag"]
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(url, HTTP_RANGE="bytes=0-99")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, pdf[:100])
+        self.assertEqual(response["Content-Range"], f"bytes 0-99/{len(pdf)}")
+
+        # If-Range com outra versão: o cliente recebe o arquivo inteiro
+        response = self.client.get(url, HTTP_RANGE="bytes=0-99", HTTP_IF_RANGE='"antiga"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_RANGE=f"bytes={len(pdf)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(pdf)}")
+
+        # Uma alteração na permuta gera outra versão do comprovante
+        Permuta.objects.filter(pk=self.permuta.pk).update(
+            motivo="Banca", atualizado_em=timezone.now() + timedelta(minutes=1)
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ExportacaoPermutasTest(CadastroMixin, TestCase):
+    """
+    Exportação em CSV e JSON Lines: uma linha por permuta, gerada à medida
+    que o arquivo é enviado.
+    """
+
+    def setUp(self):
+        self.criar_cadastro()
+        self.client.force_login(self.coord)
+        self.permutas = [self.criar_permuta(date(2026, 3, 2 + 7 * i), motivo=f"Motivo {i}") for i in range(5)]
+        Reposicao.objects.create(permuta=self.permutas[0], data_reposicao=date(2026, 3, 7))
+        self.assertTrue(services.recusar_permuta(self.permutas[1], self.coord, professor_substituto=self.substituto))
+
+    def test_csv(self):
+        response = self.client.get(reverse("exportar_permutas_csv"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+
+        linhas = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([int(linha["id"]) for linha in linhas], [permuta.id for permuta in self.permutas])
+        primeira = linhas[0]
+        self.assertEqual(primeira["solicitante_nome"], "Professor 0")
+        self.assertEqual(primeira["substituto_siape"], "1001")
+        self.assertEqual(primeira["disciplina"], "Banco de Dados")
+        self.assertEqual(primeira["hora_inicio"], "19:00:00")
+        self.assertEqual(primeira["data_reposicao"], "2026-03-07")
+        self.assertEqual(primeira["decisor"], "")
+        self.assertEqual((linhas[1]["status"], linhas[1]["decisor"]), ("RECUSADA", "coord"))
+
+    def test_jsonl_com_filtro(self):
+        response = self.client.get(reverse("exportar_permutas_jsonl"), {"status": "PENDENTE"})
+        self.assertTrue(response.streaming)
+        linhas = [json.loads(linha) for linha in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(list(linhas[0]), list(exportacao.COLUNAS))
+        self.assertEqual(linhas[0]["data_aula"], "2026-03-02")
+        self.assertIsNone(linhas[1]["data_reposicao"])
+
+    def test_linhas_saem_em_pedacos_de_uma_unica_consulta(self):
+        gerador = exportacao.gerar_csv(Permuta.objects.order_by("id"))
+        # O cabeçalho sai antes de qualquer consulta
+        with self.assertNumQueries(0):
+            self.assertTrue(next(gerador).startswith("id,status,"))
+        with mock.patch.object(exportacao, "TAMANHO_PEDACO", 2), self.assertNumQueries(1):
+            self.assertEqual(len(list(gerador)), len(self.permutas))
+
+
+class FeedCalendarioTest(CadastroMixin, TestCase):
+    """
+    Feed ICS: respostas condicionais pelo ETag do cache, que muda quando a
+    agenda do professor muda.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.criar_cadastro()
+        self.url = reverse("feed_calendario", args=[calendario.obter_assinatura(self.professor).token])
+
+    def test_etag_e_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertTrue(response.content.startswith(b"BEGIN:VCALENDAR"))
+        etag = response["ETag"]
+
+        # Feed no cache: só a consulta do token
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        permuta = self.criar_permuta()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn(f"UID:permuta-{permuta.id}@".encode(), response.content)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304
+        )
+
+    def test_token_trocado_deixa_de_funcionar(self):
+        calendario.trocar_token(self.professor)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ExportacaoComprovantesTest(CadastroMixin, TestCase):
+    """
+    O ZIP de comprovantes começa a sair antes de todas as permutas serem
+    lidas, e as exportações seguintes reaproveitam o pool de processos.
+    """
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        configuracao = override_settings(COMPROVANTES_CACHE_DIR=Path(self.diretorio.name))
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.criar_cadastro()
+        for i in range(12):
+            self.criar_permuta(date.today() + timedelta(days=i), motivo=f"Motivo {i}")
+
+    def _permutas(self):
+        return Permuta.objects.select_related(*comprovantes.RELACOES_COMPROVANTE).order_by("id")
+
+    def test_zip_sai_enquanto_as_permutas_sao_lidas(self):
+        permutas = list(self._permutas())
+        lidas = []
+
+        def leitura():
+            for permuta in permutas:
+                lidas.append(permuta.id)
+                yield permuta
+
+        pedacos = comprovantes.gerar_zip_comprovantes(leitura(), workers=2)
+        conteudo = bytearray()
+        while not conteudo:
+            conteudo += next(pedacos)
+        self.assertLess(len(lidas), len(permutas))
+        conteudo += b"".join(pedacos)
+
+        with zipfile.ZipFile(io.BytesIO(bytes(conteudo))) as arquivo:
+            self.assertEqual(len(arquivo.namelist()), len(permutas))
+        pool = comprovantes._pools[2]
+
+        # Segunda exportação, sem o cache em disco: renderiza no mesmo pool
+        for permuta in permutas:
+            comprovantes.invalidar_comprovantes(permuta.id)
+        b"".join(comprovantes.gerar_zip_comprovantes(self._permutas(), workers=2))
+        self.assertIs(comprovantes._pools[2], pool)
+
+    def test_zip_pela_view(self):
+        self.client.force_login(self.coord)
+        resposta = self.client.get(reverse("exportar_comprovantes_zip"))
+        self.assertEqual(resposta["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(resposta.streaming_content))) as arquivo:
+            self.assertEqual(len(arquivo.namelist()), 12)
+
+    def test_zip_pela_fila_de_relatorios(self):
+        self.client.force_login(self.coord)
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(RELATORIOS_DIR=diretorio):
+            resposta = self.client.get(reverse("exportar_comprovantes_zip"), {"fila": "1"})
+            tarefa = TarefaRelatorio.objects.get()
+            self.assertRedirects(resposta, reverse("acompanhar_relatorio", args=[tarefa.id]))
+            self.assertEqual(tarefa.tipo, "ZIP")
+
+            self.assertTrue(relatorios.executar(relatorios.proxima_tarefa()))
+            resposta = self.client.get(reverse("baixar_relatorio", args=[tarefa.id]))
+            self.assertEqual(resposta["Content-Type"], "application/zip")
+            with zipfile.ZipFile(io.BytesIO(b"".join(resposta.streaming_content))) as arquivo:
+                self.assertEqual(len(arquivo.namelist()), 12)
+
+
+class FilaRelatoriosTest(TestCase):
+    """
+    Coalescência dos pedidos, reserva das tarefas pelos processos e retorno
+    à fila das tarefas interrompidas.
+    """
+
+    def setUp(self):
+        self.coord = User.objects.create_superuser("coord", "coord@exemplo.com", "senha")
+
+    def _envelhecer(self, tarefa, segundos, campo="criada_em"):
+        TarefaRelatorio.objects.filter(pk=tarefa.pk).update(
+            **{campo: timezone.now() - timedelta(seconds=segundos)}
+        )
+
+    def test_pedidos_iguais_reaproveitam_a_tarefa(self):
+        tarefa, criada = relatorios.solicitar("EXCEL", {"status": "APROVADA"}, self.coord)
+        self.assertTrue(criada)
+        self.assertEqual(relatorios.solicitar("EXCEL", {"status": "APROVADA"}, self.coord), (tarefa, False))
+        self.assertTrue(relatorios.solicitar("PDF", {"status": "APROVADA"}, self.coord)[1])
+        self.assertTrue(relatorios.solicitar("EXCEL", {"status": "PENDENTE"}, self.coord)[1])
+
+    def test_tarefa_antiga_ou_com_erro_nao_e_reaproveitada(self):
+        tarefa, _ = relatorios.solicitar("EXCEL", {}, self.coord)
+        self._envelhecer(tarefa, relatorios.JANELA_COALESCENCIA + 1)
+        nova, criada = relatorios.solicitar("EXCEL", {}, self.coord)
+        self.assertTrue(criada)
+
+        TarefaRelatorio.objects.filter(pk=nova.pk).update(status="ERRO")
+        self.assertTrue(relatorios.solicitar("EXCEL", {}, self.coord)[1])
+
+    def test_proxima_tarefa_reserva_a_mais_antiga(self):
+        primeira, _ = relatorios.solicitar("EXCEL", {}, self.coord)
+        segunda, _ = relatorios.solicitar("PDF", {}, self.coord)
+
+        reservada = relatorios.proxima_tarefa()
+        self.assertEqual(reservada.id, primeira.id)
+        self.assertEqual(reservada.status, "EXECUTANDO")
+        self.assertIsNotNone(reservada.iniciada_em)
+        self.assertEqual(relatorios.proxima_tarefa().id, segunda.id)
+        self.assertIsNone(relatorios.proxima_tarefa())
+
+    def test_reabrir_expiradas(self):
+        presa, _ = relatorios.solicitar("EXCEL", {}, self.coord)
+        recente, _ = relatorios.solicitar("PDF", {}, self.coord)
+        relatorios.proxima_tarefa()
+        relatorios.proxima_tarefa()
+        self._envelhecer(presa, relatorios.TEMPO_MAXIMO_EXECUCAO + 1, "iniciada_em")
+
+        self.assertEqual(relatorios.reabrir_expiradas(), 1)
+        presa.refresh_from_db()
+        recente.refresh_from_db()
+        self.assertEqual((presa.status, presa.iniciada_em), ("PENDENTE", None))
+        self.assertEqual(recente.status, "EXECUTANDO")
+        self.assertEqual(relatorios.proxima_tarefa().id, presa.id)
+
+
+@override_settings(NOTIFICACOES_ASSINCRONAS=False)
+class NotificacoesTest(CadastroMixin, TestCase):
+    """
+    As notificações no sistema e os emails são criados depois do commit, com
+    o link absoluto já montado, e descartados se a transação for desfeita.
+    """
+
+    def setUp(self):
+        self.criar_cadastro()
+        self.permuta = self.criar_permuta()
+        self.request = RequestFactory().get("/")
+
+    def test_notificacao_e_email_apos_o_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic(), self.assertNumQueries(0):
+                utils.notificar_nova_permuta(self.permuta, self.request)
+            self.assertFalse(Notificacao.objects.exists())
+            self.assertEqual(mail.outbox, [])
+
+        notificacao = Notificacao.objects.get()
+        self.assertEqual(notificacao.usuario, self.permuta.professor_substituto.user)
+        self.assertEqual(notificacao.permuta, self.permuta)
+        self.assertEqual(len(mail.outbox), 1)
+        link = "http://testserver" + reverse("detalhe_permuta", args=[self.permuta.id])
+        self.assertIn(link, mail.outbox[0].alternatives[0][0])
+
+    def test_rollback_descarta_notificacao_e_email(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                utils.notificar_nova_permuta(self.permuta, self.request)
+                raise ValueError
+        self.assertFalse(Notificacao.objects.exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_falha_na_tarefa_vai_para_o_log(self):
+        def falhar():
+            raise RuntimeError("smtp fora do ar")
+
+        # Em outra thread, como no executor: a tarefa fecha a conexão da thread
+        thread = threading.Thread(target=utils._executar_tarefa, args=(falhar, (), {}))
+        with self.assertLogs("permuta.utils", "ERROR") as log:
+            thread.start()
+            thread.join()
+        self.assertIn("smtp fora do ar", log.output[0])
+
+
+class ArquivosEstaticosTest(SimpleTestCase):
+    """
+    A variante comprimida segue os valores q do Accept-Encoding: ``br;q=0``
+    recusa o brotli.
+    """
+
+    def test_escolhe_a_codificacao_pelo_q(self):
+        with tempfile.TemporaryDirectory() as raiz:
+            for nome in ("app.css", "app.css.br", "app.css.gz"):
+                Path(raiz, nome).write_bytes(b"body{}")
+            with self.settings(STATIC_ROOT=raiz):
+                middleware = estaticos.ArquivosEstaticosMiddleware(lambda request: None)
+            casos = {
+                "gzip, deflate, br": "br",
+                "gzip, br;q=0": "gzip",
+                "br;q=0.5, gzip;q=0.8": "gzip",
+                "br;q=0, gzip;q=0": None,
+                "identity": None,
+                "*": "br",
+            }
+            for cabecalho, esperada in casos.items():
+                with self.subTest(cabecalho=cabecalho):
+                    request = RequestFactory().get("/static/app.css", HTTP_ACCEPT_ENCODING=cabecalho)
+                    resposta = middleware.servir(request, "app.css")
+                    resposta.close()
+                    self.assertEqual(resposta.get("Content-Encoding"), esperada)
+
+
+class PerfilamentoTest(CadastroMixin, TestCase):
+    """
+    Perfis de requisição: só para staff, com as consultas SQL anotadas e
+    limitados aos PERFILAMENTO_MAXIMO mais recentes.
+    """
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            PERFILAMENTO_DIR=Path(diretorio.name), PERFILAMENTO_AMOSTRAGEM=0, PERFILAMENTO_MAXIMO=2
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.criar_cadastro()
+
+    def test_perfil_sob_demanda_da_coordenacao(self):
+        self.client.force_login(self.professor.user)
+        response = self.client.get(reverse("home"), {"_perfil": "1"})
+        self.assertNotIn("X-Perfil", response)
+
+        self.client.force_login(self.coord)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse("admin_dashboard"), HTTP_X_PERFIL="1")
+        nome = response["X-Perfil"]
+        perfil = perfilamento.ler_perfil(nome)
+        self.assertEqual(perfil["meta"]["status"], response.status_code)
+        self.assertEqual(perfil["meta"]["usuario"], "coord")
+        # Sessão e usuário são lidos antes, para saber se o perfil foi pedido
+        self.assertEqual(perfil["meta"]["consultas"], len(consultas) - 2)
+        self.assertEqual(len(perfil["consultas"]), len(consultas) - 2)
+        self.assertTrue(all(
+            consulta["banco"] == "default" and consulta["ms"] >= 0 for consulta in perfil["consultas"]
+        ))
+        self.assertIn("function calls", perfil["resumo"])
+
+        self.assertEqual(self.client.get(reverse("perfil_requisicao", args=[nome])).status_code, 200)
+        response = self.client.get(reverse("baixar_perfil", args=[nome]))
+        self.assertGreater(len(b"".join(response.streaming_content)), 0)
+        self.assertEqual(self.client.get(reverse("perfil_requisicao", args=["..meta"])).status_code, 404)
+
+    def test_amostragem_limite_e_um_perfil_por_vez(self):
+        self.client.force_login(self.coord)
+        self.assertNotIn("X-Perfil", self.client.get(reverse("home")))
+
+        with self.settings(PERFILAMENTO_AMOSTRAGEM=1):
+            nomes = [self.client.get(reverse("home"))["X-Perfil"] for _ in range(3)]
+        self.assertEqual(sorted(perfilamento.listar_nomes()), sorted(nomes)[1:])
+
+        # Outro perfil em andamento: a requisição segue sem perfilamento
+        with perfilamento._lock:
+            self.assertNotIn("X-Perfil", self.client.get(reverse("home"), {"_perfil": "1"}))
+
+    def test_falha_ao_gravar_vai_para_o_log(self):
+        self.client.force_login(self.coord)
+        with mock.patch.object(perfilamento, "gravar_perfil", side_effect=OSError("disco cheio")), \
+                self.assertLogs("permuta_aulas.perfilamento", "ERROR"):
+            response = self.client.get(reverse("home"), {"_perfil": "1"})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn("X-Perfil", response)
@@ -1,73 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import threading
+
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import connection, transaction
 from django.urls import reverse
 
+from . import sincronizacao
+from .models import Notificacao, Permuta
+
+logger = logging.getLogger(__name__)
+
+# Relações lidas pelas mensagens e pelos templates de email
+RELACOES = (
+    "professor_solicitante__user",
+    "professor_substituto__user",
+    "horario__turma",
+    "horario__disciplina",
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _obter_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="notificacoes")
+        return _executor
+
+
+def _executar_tarefa(funcao, args, kwargs):
+    try:
+        funcao(*args, **kwargs)
+    except Exception:
+        logger.exception("Erro ao processar notificação (%s)", funcao.__name__)
+    finally:
+        # A thread de fundo abre a própria conexão; não deixá-la pendurada
+        connection.close()
+
+
+def _despachar(funcao, args, kwargs):
+    if getattr(settings, "NOTIFICACOES_ASSINCRONAS", True):
+        _obter_executor().submit(_executar_tarefa, funcao, args, kwargs)
+    else:
+        funcao(*args, **kwargs)
+
+
+def executar_apos_commit(funcao, *args, **kwargs):
+    """
+    Agenda uma tarefa (notificações e emails) para depois do commit da
+    transação atual.
+
+    Se a transação for desfeita, a tarefa é descartada. Com
+    NOTIFICACOES_ASSINCRONAS ativo, a tarefa roda em uma thread de fundo,
+    fora do tempo de resposta da requisição; por isso recebe só dados já
+    prontos (nada do request nem instâncias de modelos).
+    """
+    transaction.on_commit(partial(_despachar, funcao, args, kwargs))
+
+
+def criar_notificacoes(usuarios, mensagem, link="", permuta=None):
+    """
+    Cria a mesma notificação para vários usuários com um único INSERT.
+    ``permuta`` é a permuta de que a notificação trata (arquivadas juntas).
+    """
+    notificacoes = Notificacao.objects.bulk_create([
+        Notificacao(usuario=usuario, mensagem=mensagem, link=link, permuta=permuta)
+        for usuario in usuarios
+    ])
+    # bulk_create não dispara post_save
+    sincronizacao.registrar_notificacoes(notificacoes)
+
+
+def _enviar_email(destinatario, assunto, mensagem_html):
+    send_mail(
+        subject=assunto,
+        message='',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[destinatario],
+        html_message=mensagem_html,
+        fail_silently=True,
+    )
+
+
 def enviar_email_notificacao(usuario, assunto, template, contexto):
     """
-    Envia email de notificação para um usuário
+    Monta e envia o email de notificação para um usuário. Chamada pelas
+    tarefas agendadas pelos notificar_*, já depois do commit.
     """
     if not usuario or not usuario.email:
         return False
-    
+
     try:
         mensagem_html = render_to_string(template, contexto)
-        
-        send_mail(
-            subject=assunto,
-            message='',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[usuario.email],
-            html_message=mensagem_html,
-            fail_silently=True,
-        )
-        return True
-    except Exception as e:
-        print(f"Erro ao enviar email: {e}")
+    except Exception:
+        logger.exception("Erro ao montar email %s", template)
         return False
 
+    _enviar_email(usuario.email, assunto, mensagem_html)
+    return True
+
+
+def _coordenadores_para_email(permuta, coordenadores):
+    interessados = {permuta.professor_solicitante.user_id, permuta.professor_substituto.user_id}
+    return [coord for coord in coordenadores if coord.email and coord.id not in interessados]
+
+
+# As funções notificar_* são chamadas dentro da transação da alteração, mas
+# só montam os links e agendam a tarefa: as notificações no sistema e os
+# emails são criados depois do commit (ver executar_apos_commit), fora do
+# tempo de resposta, e descartados se a transação for desfeita.
+
+def _permuta(permuta_id):
+    return Permuta.objects.select_related(*RELACOES).get(pk=permuta_id)
+
+
 def notificar_nova_permuta(permuta, request):
     """
     Notifica sobre nova permuta solicitada
     """
+    link = reverse("detalhe_permuta", args=[permuta.id])
+    executar_apos_commit(_notificar_nova_permuta, permuta.id, link, request.build_absolute_uri(link))
+
+
+def _notificar_nova_permuta(permuta_id, link, link_absoluto):
+    permuta = _permuta(permuta_id)
+
+    # Notificação no sistema
+    criar_notificacoes(
+        [permuta.professor_substituto.user],
+        (
+            f"Você foi indicado(a) como professor(a) substituto(a) "
+            f"na permuta #{permuta.id} do professor {permuta.professor_solicitante.nome}."
+        ),
+        link,
+        permuta=permuta,
+    )
+
     # Notificar professor substituto
     contexto = {
         'permuta': permuta,
         'tipo': 'nova_permuta',
         'nome_solicitante': permuta.professor_solicitante.nome,
-        'request': request,
+        'link': link_absoluto,
     }
-    
+
     enviar_email_notificacao(
         usuario=permuta.professor_substituto.user,
         assunto=f'[Sistema de Permuta] Nova Permuta #{permuta.id}',
         template='emails/notificacao_permuta.html',
         contexto=contexto
     )
-    
+
     # Notificar coordenadores
-    coordenadores = User.objects.filter(is_staff=True)
-    for coord in coordenadores:
-        if coord.email and coord != permuta.professor_solicitante.user and coord != permuta.professor_substituto.user:
-            contexto['nome_coordenador'] = coord.get_full_name() or coord.username
-            enviar_email_notificacao(
-                usuario=coord,
-                assunto=f'[Sistema de Permuta] Nova Permuta #{permuta.id}',
-                template='emails/notificacao_coordenador.html',
-                contexto=contexto
-            )
+    for coord in _coordenadores_para_email(permuta, User.objects.filter(is_staff=True)):
+        contexto['nome_coordenador'] = coord.get_full_name() or coord.username
+        enviar_email_notificacao(
+            usuario=coord,
+            assunto=f'[Sistema de Permuta] Nova Permuta #{permuta.id}',
+            template='emails/notificacao_coordenador.html',
+            contexto=contexto
+        )
 
 def notificar_confirmacao_permuta(permuta, request):
     """
     Notifica sobre confirmação de permuta
     """
+    link = reverse("detalhe_permuta", args=[permuta.id])
+    executar_apos_commit(_notificar_confirmacao_permuta, permuta.id, link, request.build_absolute_uri(link))
+
+
+def _notificar_confirmacao_permuta(permuta_id, link, link_absoluto):
+    permuta = _permuta(permuta_id)
+    coordenadores = list(User.objects.filter(is_staff=True))
+
+    # Notificações no sistema para coordenadores
+    criar_notificacoes(
+        coordenadores,
+        (
+            f"A permuta #{permuta.id} entre "
+            f"{permuta.professor_solicitante.nome} e "
+            f"{permuta.professor_substituto.nome} foi APROVADA pelo professor substituto."
+        ),
+        link,
+        permuta=permuta,
+    )
+
     contexto = {
         'permuta': permuta,
         'nome_substituto': permuta.professor_substituto.nome,
-        'request': request,
+        'link': link_absoluto,
     }
-    
+
     # Notificar solicitante
     enviar_email_notificacao(
         usuario=permuta.professor_solicitante.user,
@@ -75,29 +205,55 @@ def notificar_confirmacao_permuta(permuta, request):
         template='emails/confirmacao_permuta.html',
         contexto=contexto
     )
-    
+
     # Notificar coordenadores
-    coordenadores = User.objects.filter(is_staff=True)
-    for coord in coordenadores:
-        if coord.email and coord != permuta.professor_solicitante.user and coord != permuta.professor_substituto.user:
-            contexto['nome_coordenador'] = coord.get_full_name() or coord.username
-            enviar_email_notificacao(
-                usuario=coord,
-                assunto=f'[Sistema de Permuta] Permuta #{permuta.id} Confirmada',
-                template='emails/confirmacao_coordenador.html',
-                contexto=contexto
-            )
+    for coord in _coordenadores_para_email(permuta, coordenadores):
+        contexto['nome_coordenador'] = coord.get_full_name() or coord.username
+        enviar_email_notificacao(
+            usuario=coord,
+            assunto=f'[Sistema de Permuta] Permuta #{permuta.id} Confirmada',
+            template='emails/confirmacao_coordenador.html',
+            contexto=contexto
+        )
 
 def notificar_cancelamento_permuta(permuta, request):
     """
     Notifica sobre cancelamento de permuta
     """
+    link = reverse("detalhe_permuta", args=[permuta.id])
+    executar_apos_commit(_notificar_cancelamento_permuta, permuta.id, link, request.build_absolute_uri(link))
+
+
+def _notificar_cancelamento_permuta(permuta_id, link, link_absoluto):
+    permuta = _permuta(permuta_id)
+
+    # Notificações no sistema
+    coordenadores = list(User.objects.filter(is_staff=True))
+    criar_notificacoes(
+        [permuta.professor_substituto.user],
+        (
+            f"A permuta #{permuta.id} com o professor "
+            f"{permuta.professor_solicitante.nome} foi CANCELADA pelo solicitante."
+        ),
+        link,
+        permuta=permuta,
+    )
+    criar_notificacoes(
+        coordenadores,
+        (
+            f"A permuta #{permuta.id} do professor {permuta.professor_solicitante.nome} "
+            f"com o professor {permuta.professor_substituto.nome} foi CANCELADA."
+        ),
+        link,
+        permuta=permuta,
+    )
+
     contexto = {
         'permuta': permuta,
         'nome_solicitante': permuta.professor_solicitante.nome,
-        'request': request,
+        'link': link_absoluto,
     }
-    
+
     # Notificar substituto
     enviar_email_notificacao(
         usuario=permuta.professor_substituto.user,
@@ -105,15 +261,123 @@ def notificar_cancelamento_permuta(permuta, request):
         template='emails/cancelamento_permuta.html',
         contexto=contexto
     )
-    
+
     # Notificar coordenadores
-    coordenadores = User.objects.filter(is_staff=True)
+    for coord in _coordenadores_para_email(permuta, coordenadores):
+        contexto['nome_coordenador'] = coord.get_full_name() or coord.username
+        enviar_email_notificacao(
+            usuario=coord,
+            assunto=f'[Sistema de Permuta] Permuta #{permuta.id} Cancelada',
+            template='emails/cancelamento_coordenador.html',
+            contexto=contexto
+        )
+
+
+def notificar_reposicao_registrada(permuta):
+    """
+    Avisa o substituto de que a reposição foi registrada e a permuta pode ser confirmada
+    """
+    executar_apos_commit(
+        _notificar_reposicao_registrada,
+        permuta.id,
+        reverse("confirmar_permuta_substituto", args=[permuta.id]),
+    )
+
+
+def _notificar_reposicao_registrada(permuta_id, link):
+    permuta = _permuta(permuta_id)
+    criar_notificacoes(
+        [permuta.professor_substituto.user],
+        (
+            f"O professor {permuta.professor_solicitante.nome} registrou a reposição para a permuta #{permuta.id}. "
+            f"Agora você pode confirmar a permuta."
+        ),
+        link,
+        permuta=permuta,
+    )
+
+
+def notificar_ausencia(permutas, request):
+    """
+    Notifica as permutas de uma ausência (ver services.solicitar_ausencia)
+    de forma agregada: uma notificação e um email por destinatário, e não um
+    por permuta.
+    """
+    link_substituto = reverse("permutas_como_substituto")
+    link_coordenacao = reverse("permutas_pendentes")
+    executar_apos_commit(
+        _notificar_ausencia,
+        [permuta.id for permuta in permutas],
+        link_substituto,
+        request.build_absolute_uri(link_substituto),
+        link_coordenacao,
+        request.build_absolute_uri(link_coordenacao),
+    )
+
+
+def _notificar_ausencia(permuta_ids, link_substituto, link_substituto_absoluto,
+                        link_coordenacao, link_coordenacao_absoluto):
+    permutas = list(
+        Permuta.objects.select_related(*RELACOES)
+        .filter(pk__in=permuta_ids)
+        .order_by("data_aula", "id")
+    )
+    solicitante = permutas[0].professor_solicitante
+    periodo = (
+        f"{min(p.data_aula for p in permutas):%d/%m/%Y} a "
+        f"{max(p.data_aula for p in permutas):%d/%m/%Y}"
+    )
+
+    # Os avisos agregados ficam ligados à primeira aula da ausência
+    por_substituto = {}
+    for permuta in permutas:
+        por_substituto.setdefault(permuta.professor_substituto, []).append(permuta)
+
+    for substituto, permutas_substituto in por_substituto.items():
+        criar_notificacoes(
+            [substituto.user],
+            (
+                f"O professor {solicitante.nome} indicou você como professor(a) substituto(a) "
+                f"em {len(permutas_substituto)} aula(s) no período de {periodo}."
+            ),
+            link_substituto,
+            permuta=permutas_substituto[0],
+        )
+        enviar_email_notificacao(
+            usuario=substituto.user,
+            assunto=f'[Sistema de Permuta] Ausência de {solicitante.nome}: {len(permutas_substituto)} aula(s)',
+            template='emails/notificacao_ausencia.html',
+            contexto={
+                'solicitante': solicitante,
+                'permutas': permutas_substituto,
+                'periodo': periodo,
+                'link': link_substituto_absoluto,
+            },
+        )
+
+    # Coordenadores: um resumo da ausência inteira
+    coordenadores = list(User.objects.filter(is_staff=True))
+    criar_notificacoes(
+        coordenadores,
+        (
+            f"O professor {solicitante.nome} registrou ausência de {periodo}: "
+            f"{len(permutas)} permuta(s) solicitada(s)."
+        ),
+        link_coordenacao,
+        permuta=permutas[0],
+    )
+    interessados = {solicitante.user_id} | {substituto.user_id for substituto in por_substituto}
     for coord in coordenadores:
-        if coord.email and coord != permuta.professor_solicitante.user and coord != permuta.professor_substituto.user:
-            contexto['nome_coordenador'] = coord.get_full_name() or coord.username
+        if coord.email and coord.id not in interessados:
             enviar_email_notificacao(
                 usuario=coord,
-                assunto=f'[Sistema de Permuta] Permuta #{permuta.id} Cancelada',
-                template='emails/cancelamento_coordenador.html',
-                contexto=contexto
-            )
\ No newline at end of file
+                assunto=f'[Sistema de Permuta] Ausência de {solicitante.nome}: {len(permutas)} aula(s)',
+                template='emails/notificacao_ausencia.html',
+                contexto={
+                    'solicitante': solicitante,
+                    'permutas': permutas,
+                    'periodo': periodo,
+                    'nome_coordenador': coord.get_full_name() or coord.username,
+                    'link': link_coordenacao_absoluto,
+                },
+            )
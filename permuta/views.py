@@ -1,34 +1,57 @@
-from datetime import date, datetime, timedelta
-from django.http import HttpResponse, JsonResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
+from datetime import date
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from reportlab.lib.utils import ImageReader
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q
 from django.urls import reverse
-from django.contrib.auth.models import User
-import matplotlib
-matplotlib.use('Agg')  # Para evitar problemas com GUI
-import matplotlib.pyplot as plt
-import io
-import base64
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.conf import settings
 
+from accounts.decorators import professor_required
 from accounts.models import Professor
 from cadastros.models import HorarioAula, Disciplina, Turma
-from permuta.models import Permuta, Reposicao, Notificacao
-from permuta.forms import PermutaSolicitacaoForm, ReposicaoForm
+from permuta_aulas import perfilamento
+from permuta_aulas.replica import usar_replica
+from permuta.models import AssinaturaCalendario, PeriodoLetivo, Permuta, Notificacao, TarefaRelatorio
+from permuta import analise, calendario, exportacao, graficos, periodos, relatorios, services
+from permuta.forms import AusenciaForm, PermutaSolicitacaoForm, ReposicaoForm, FiltroPermutasForm
+from permuta.busca import buscar_permutas_ids
+from permuta.condicional import marca_dagua, marca_dagua_do_professor, resposta_condicional
+from permuta.disponibilidade import (
+    HORIZONTE_MAXIMO,
+    HORIZONTE_PADRAO,
+    SUGESTOES_MAXIMO,
+    SUGESTOES_PADRAO,
+    horarios_livres,
+)
+from permuta.sincronizacao import alteracoes_desde
+from permuta.comprovantes import (
+    RELACOES_COMPROVANTE,
+    gerar_zip_comprovantes,
+    obter_comprovante,
+    resposta_comprovante,
+)
 from permuta.utils import (
     notificar_nova_permuta,
     notificar_confirmacao_permuta,
-    notificar_cancelamento_permuta
+    notificar_cancelamento_permuta,
+    notificar_reposicao_registrada,
+    notificar_ausencia,
+)
+
+# Relações exibidas nas listas de permutas (para select_related, sem N+1)
+RELACOES_LISTA = (
+    "professor_solicitante__user",
+    "professor_substituto__user",
+    "horario__turma",
+    "horario__disciplina",
+    "reposicao",
 )
 
 
@@ -46,23 +69,16 @@ def home(request):
     
     if usuario.is_authenticated:
         # Usuário logado - redireciona para dashboard específico
-        try:
-            professor = usuario.professor
-            
-            if usuario.is_staff:
-                # Usuário é admin/coordenação - redireciona para dashboard admin
-                return redirect('admin_dashboard')
-            else:
-                # Usuário é professor normal - redireciona para dashboard professor
-                return redirect('professor_dashboard')
-                
-        except Professor.DoesNotExist:
-            # Usuário logado mas não é professor (só admin)
-            if usuario.is_staff:
-                return redirect('admin_dashboard')
-            else:
-                messages.warning(request, "Seu usuário não está vinculado a um perfil de professor.")
-                return render(request, "sem_professor.html", {"usuario": usuario})
+        if usuario.is_staff:
+            # Usuário é admin/coordenação - redireciona para dashboard admin
+            return redirect('admin_dashboard')
+        if request.professor is not None:
+            # Usuário é professor normal - redireciona para dashboard professor
+            return redirect('professor_dashboard')
+
+        # Usuário logado mas não é professor
+        messages.warning(request, "Seu usuário não está vinculado a um perfil de professor.")
+        return render(request, "professor/sem_professor.html", {"usuario": usuario})
     else:
         # Usuário não logado - mostra página institucional
         return render(request, "home.html")
@@ -80,47 +96,48 @@ def meu_logout(request):
 # DASHBOARDS SEPARADOS
 # ============================================================================
 
-@login_required
+@professor_required
 def professor_dashboard(request):
     """
-    Dashboard específico para professores
+    Dashboard específico para professores (por padrão, com as permutas do
+    período letivo atual)
     """
     usuario = request.user
     
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(request, "Acesso restrito a professores.")
-        return redirect("home")
+    professor = request.professor
+    periodo, lista_periodos = periodos.escolher_periodo(request)
+    permutas = Permuta.objects.all()
+    if periodo is not None:
+        permutas = permutas.filter(periodo=periodo)
     
     # Estatísticas do professor
     total_horarios = HorarioAula.objects.filter(professor=professor).count()
-    total_permutas = Permuta.objects.filter(professor_solicitante=professor).count()
-    permutas_pendentes = Permuta.objects.filter(
+    total_permutas = permutas.filter(professor_solicitante=professor).count()
+    permutas_pendentes = permutas.filter(
         professor_solicitante=professor, 
         status='PENDENTE'
     ).count()
-    permutas_aprovadas = Permuta.objects.filter(
+    permutas_aprovadas = permutas.filter(
         professor_solicitante=professor, 
         status='APROVADA'
     ).count()
-    permutas_canceladas = Permuta.objects.filter(
+    permutas_canceladas = permutas.filter(
         professor_solicitante=professor, 
         status='CANCELADA'
     ).count()
     
     # Próximas permutas (aulas futuras)
-    proximas_permutas = Permuta.objects.filter(
+    proximas_permutas = permutas.filter(
         professor_solicitante=professor,
         data_aula__gte=timezone.now().date()
-    ).order_by('data_aula')[:5]
+    ).select_related('horario__turma', 'horario__disciplina').order_by('data_aula')[:5]
     
     # Permutas como substituto
-    permutas_substituto = Permuta.objects.filter(
+    permutas_substituto = permutas.filter(
         professor_substituto=professor
     ).count()
     
-    permutas_substituto_pendentes = Permuta.objects.filter(
+    permutas_substituto_pendentes = permutas.filter(
         professor_substituto=professor,
         status='PENDENTE'
     ).count()
@@ -136,6 +153,8 @@ def professor_dashboard(request):
         'permutas_substituto': permutas_substituto,
         'permutas_substituto_pendentes': permutas_substituto_pendentes,
         'proximas_permutas': proximas_permutas,
+        'periodo': periodo,
+        'periodos': lista_periodos,
     }
     return render(request, "professor/dashboard.html", contexto)
 
@@ -157,38 +176,16 @@ def admin_dashboard(request):
     total_disciplinas = Disciplina.objects.count()
     total_horarios = HorarioAula.objects.count()
     
-    total_permutas = Permuta.objects.count()
-    permutas_aprovadas = Permuta.objects.filter(status='APROVADA').count()
-    permutas_pendentes = Permuta.objects.filter(status='PENDENTE').count()
-    permutas_canceladas = Permuta.objects.filter(status='CANCELADA').count()
-    
-    # Permutas sem reposição
-    todas_permutas = Permuta.objects.all()
-    permutas_sem_reposicao = [p for p in todas_permutas if not p.tem_reposicao()]
-    
-    # Top 5 professores que mais solicitam permutas
-    top_professores = Professor.objects.annotate(
-        total_permutas=Count('permutas_solicitadas')
-    ).order_by('-total_permutas')[:5]
-    
-    # Top 5 disciplinas mais permutadas
-    top_disciplinas = Disciplina.objects.annotate(
-        total_permutas=Count('horarioaula__permuta')
-    ).order_by('-total_permutas')[:5]
-    
-    # Permutas por mês (últimos 6 meses)
+    # Indicadores das permutas (retrato em colunas, ver permuta.analise)
     hoje = timezone.now().date()
-    permutas_por_mes = []
-    for i in range(5, -1, -1):
-        mes = hoje - timedelta(days=30*i)
-        count = Permuta.objects.filter(
-            data_solicitacao__month=mes.month,
-            data_solicitacao__year=mes.year
-        ).count()
-        permutas_por_mes.append({
-            'mes': mes.strftime('%b/%Y'),
-            'quantidade': count
-        })
+    dados = analise.indicadores(analise.obter_retrato(), hoje)
+    por_status = dados['por_status']
+
+    permutas_sem_reposicao = analise.permutas_sem_reposicao(dados)
+    permutas_por_mes = [
+        {'mes': item['mes'].strftime('%b/%Y'), 'quantidade': item['quantidade']}
+        for item in dados['permutas_por_mes']
+    ]
     
     contexto = {
         'usuario': usuario,
@@ -196,14 +193,16 @@ def admin_dashboard(request):
         'total_turmas': total_turmas,
         'total_disciplinas': total_disciplinas,
         'total_horarios': total_horarios,
-        'total_permutas': total_permutas,
-        'permutas_aprovadas': permutas_aprovadas,
-        'permutas_pendentes': permutas_pendentes,
-        'permutas_canceladas': permutas_canceladas,
-        'permutas_sem_reposicao': permutas_sem_reposicao[:5],
-        'top_professores': top_professores,
-        'top_disciplinas': top_disciplinas,
+        'total_permutas': dados['total_permutas'],
+        'permutas_aprovadas': por_status['APROVADA'],
+        'permutas_pendentes': por_status['PENDENTE'],
+        'permutas_canceladas': por_status['CANCELADA'],
+        'permutas_sem_reposicao': permutas_sem_reposicao,
+        'top_professores': dados['top_professores'],
+        'top_disciplinas': dados['top_disciplinas'],
         'permutas_por_mes': permutas_por_mes,
+        # Relatórios dos períodos arquivados são gerados a partir do arquivo
+        'periodos_arquivados': PeriodoLetivo.objects.filter(arquivado_em__isnull=False),
     }
     return render(request, "admin/dashboard.html", contexto)
 
@@ -212,50 +211,82 @@ def admin_dashboard(request):
 # PROFESSOR - HORÁRIOS
 # ============================================================================
 
-@login_required
+@professor_required
 def meus_horarios(request):
     """
     Lista os horários de aula do professor logado.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor. "
-            "Peça ao administrador para criar o seu cadastro de Professor."
-        )
-        return render(request, "professor/sem_professor.html", {"usuario": usuario})
+    professor = request.professor
 
     horarios = HorarioAula.objects.filter(
         professor=professor
     ).order_by("dia_semana", "hora_inicio")
 
+    assinatura = calendario.obter_assinatura(professor)
+    endereco_calendario = request.build_absolute_uri(
+        reverse("feed_calendario", args=[assinatura.token])
+    )
+
     contexto = {
         "usuario": usuario,
         "professor": professor,
         "horarios": horarios,
+        "endereco_calendario": endereco_calendario,
     }
     return render(request, "professor/meus_horarios.html", contexto)
 
 
-@login_required
+@professor_required
+def trocar_endereco_calendario(request):
+    """
+    Gera um novo endereço para o feed ICS (o anterior deixa de funcionar).
+    """
+    if request.method == "POST":
+        calendario.trocar_token(request.professor)
+        messages.success(
+            request,
+            "Novo endereço do calendário gerado. Atualize a assinatura nos seus aplicativos.",
+        )
+    return redirect("meus_horarios")
+
+
+def feed_calendario(request, token):
+    """
+    Feed iCalendar (ICS) do professor dono do token, para aplicativos de
+    calendário. Não usa login: o token no endereço identifica o professor.
+    """
+    professor_id = (
+        AssinaturaCalendario.objects.filter(token=token)
+        .values_list("professor_id", flat=True)
+        .first()
+    )
+    if professor_id is None:
+        raise Http404("Calendário não encontrado")
+
+    feed = calendario.obter_feed(professor_id)
+    resposta = get_conditional_response(
+        request, etag=feed["etag"], last_modified=feed["ultima_modificacao"]
+    )
+    if resposta is None:
+        resposta = HttpResponse(feed["conteudo"], content_type="text/calendar; charset=utf-8")
+        resposta["Content-Disposition"] = 'inline; filename="aulas.ics"'
+    resposta["ETag"] = feed["etag"]
+    if feed["ultima_modificacao"] is not None:
+        resposta["Last-Modified"] = http_date(feed["ultima_modificacao"])
+    resposta["Cache-Control"] = "private, no-cache"
+    return resposta
+
+
+@professor_required
 def calendario_horarios(request):
     """
     Visualização em calendário dos horários do professor
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor."
-        )
-        return redirect("home")
+    professor = request.professor
 
     contexto = {
         "usuario": usuario,
@@ -273,16 +304,25 @@ def api_eventos_calendario(request):
     start = request.GET.get('start')
     end = request.GET.get('end')
     
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
+    professor = request.professor
+    if professor is None:
         return JsonResponse([], safe=False)
-    
+
+    horarios = HorarioAula.objects.filter(professor=professor).select_related('turma', 'disciplina')
+    permutas = Permuta.objects.filter(
+        Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+    ).select_related(*RELACOES_LISTA)
+    return resposta_condicional(
+        request,
+        [marca_dagua(horarios), marca_dagua_do_professor(Permuta.objects.all(), professor)],
+        lambda: JsonResponse(_eventos_calendario(horarios, permutas), safe=False),
+        usuario.pk,
+    )
+
+
+def _eventos_calendario(horarios, permutas):
     eventos = []
     
-    # Buscar horários regulares do professor
-    horarios = HorarioAula.objects.filter(professor=professor)
-    
     # Mapear dias da semana
     dias_semana = {
         2: 'monday', 3: 'tuesday', 4: 'wednesday',
@@ -307,11 +347,6 @@ def api_eventos_calendario(request):
                 }
             })
     
-    # Buscar permutas do professor
-    permutas = Permuta.objects.filter(
-        Q(professor_solicitante=professor) | Q(professor_substituto=professor)
-    )
-    
     for permuta in permutas:
         cor = '#dc3545' if permuta.status == 'CANCELADA' else '#ffc107' if permuta.status == 'PENDENTE' else '#28a745'
         
@@ -342,54 +377,36 @@ def api_eventos_calendario(request):
                 }
             })
     
-    return JsonResponse(eventos, safe=False)
+    return eventos
 
 
 # ============================================================================
 # PROFESSOR - PERMUTAS
 # ============================================================================
 
-@login_required
+@professor_required
 def solicitar_permuta(request, horario_id):
     """
     Permite ao professor logado solicitar permuta para um horário específico.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor. "
-            "Peça ao administrador para criar o seu cadastro de Professor."
-        )
-        return redirect("home")
+    professor = request.professor
 
     horario = get_object_or_404(HorarioAula, id=horario_id, professor=professor)
 
     if request.method == "POST":
         form = PermutaSolicitacaoForm(request.POST, professor_solicitante=professor)
         if form.is_valid():
-            permuta = form.save(commit=False)
-            permuta.professor_solicitante = professor
-            permuta.horario = horario
-            permuta.status = "PENDENTE"
-            permuta.save()
-
-            # Notificação no sistema
-            substituto_user = permuta.professor_substituto.user
-            Notificacao.objects.create(
-                usuario=substituto_user,
-                mensagem=(
-                    f"Você foi indicado(a) como professor(a) substituto(a) "
-                    f"na permuta #{permuta.id} do professor {permuta.professor_solicitante.nome}."
-                ),
-                link=reverse("detalhe_permuta", args=[permuta.id]),
-            )
+            with transaction.atomic():
+                permuta = form.save(commit=False)
+                permuta.professor_solicitante = professor
+                permuta.horario = horario
+                permuta.status = "PENDENTE"
+                permuta.save()
 
-            # Notificação por email
-            notificar_nova_permuta(permuta, request)
+                # Notificações e emails só depois do commit (ver permuta.utils)
+                notificar_nova_permuta(permuta, request)
 
             messages.success(
                 request,
@@ -411,31 +428,86 @@ def solicitar_permuta(request, horario_id):
     return render(request, "professor/solicitar_permuta.html", contexto)
 
 
-@login_required
-def minhas_permutas(request):
+@professor_required
+def solicitar_ausencia(request):
     """
-    Lista todas as solicitações de permuta do professor logado.
+    Ausência em um período: uma única solicitação cria as permutas de todas
+    as aulas do professor entre as datas informadas.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor. "
-            "Peça ao administrador para criar o seu cadastro de Professor."
+    professor = request.professor
+
+    horarios = list(
+        HorarioAula.objects.filter(professor=professor)
+        .select_related("turma", "disciplina")
+        .order_by("dia_semana", "hora_inicio")
+    )
+
+    if request.method == "POST":
+        form = AusenciaForm(request.POST, horarios=horarios, professor_solicitante=professor)
+        if form.is_valid():
+            dados = form.cleaned_data
+            with transaction.atomic():
+                permutas = services.solicitar_ausencia(
+                    professor,
+                    dados["substitutos"],
+                    dados["data_inicio"],
+                    dados["data_fim"],
+                    dados["motivo"],
+                    usuario,
+                )
+                if permutas:
+                    # Uma notificação por destinatário, depois do commit
+                    notificar_ausencia(permutas, request)
+
+            if permutas:
+                messages.success(
+                    request,
+                    f"{len(permutas)} permuta(s) solicitada(s) para o período. "
+                    "Registre as reposições em Minhas Permutas."
+                )
+            else:
+                messages.warning(request, "Todas as aulas do período já possuem permuta solicitada.")
+            return redirect("minhas_permutas")
+    else:
+        form = AusenciaForm(
+            horarios=horarios,
+            professor_solicitante=professor,
+            initial={"data_inicio": date.today(), "data_fim": date.today()},
         )
-        return redirect("home")
+
+    contexto = {
+        "usuario": usuario,
+        "professor": professor,
+        "form": form,
+    }
+    return render(request, "professor/solicitar_ausencia.html", contexto)
+
+
+@professor_required
+def minhas_permutas(request):
+    """
+    Lista as solicitações de permuta do professor logado (por padrão, as do
+    período letivo atual).
+    """
+    usuario = request.user
+
+    professor = request.professor
+    periodo, lista_periodos = periodos.escolher_periodo(request)
 
     permutas = Permuta.objects.filter(
         professor_solicitante=professor
-    ).order_by("-data_solicitacao")
+    ).select_related(*RELACOES_LISTA).order_by("-data_solicitacao")
+    if periodo is not None:
+        permutas = permutas.filter(periodo=periodo)
 
     contexto = {
         "usuario": usuario,
         "professor": professor,
         "permutas": permutas,
+        "periodo": periodo,
+        "periodos": lista_periodos,
     }
     return render(request, "professor/minhas_permutas.html", contexto)
 
@@ -448,12 +520,12 @@ def detalhe_permuta(request, permuta_id):
     usuario = request.user
     professor = None
 
+    permutas = Permuta.objects.select_related(*RELACOES_COMPROVANTE)
     if usuario.is_staff:
-        permuta = get_object_or_404(Permuta, id=permuta_id)
+        permuta = get_object_or_404(permutas, id=permuta_id)
     else:
-        try:
-            professor = usuario.professor
-        except Professor.DoesNotExist:
+        professor = request.professor
+        if professor is None:
             messages.error(
                 request,
                 "Seu usuário ainda não está vinculado a um cadastro de Professor."
@@ -461,7 +533,7 @@ def detalhe_permuta(request, permuta_id):
             return redirect("home")
 
         permuta = get_object_or_404(
-            Permuta,
+            permutas,
             Q(id=permuta_id) & (
                 Q(professor_solicitante=professor) |
                 Q(professor_substituto=professor)
@@ -476,23 +548,20 @@ def detalhe_permuta(request, permuta_id):
     return render(request, "professor/detalhe_permuta.html", contexto)
 
 
-@login_required
+@professor_required
 def cancelar_permuta(request, permuta_id):
     """
     Permite ao professor solicitante cancelar uma permuta.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor."
-        )
-        return redirect("home")
+    professor = request.professor
 
-    permuta = get_object_or_404(Permuta, id=permuta_id, professor_solicitante=professor)
+    permuta = get_object_or_404(
+        Permuta.objects.select_related(*RELACOES_LISTA),
+        id=permuta_id,
+        professor_solicitante=professor,
+    )
 
     if permuta.status == "CANCELADA":
         messages.error(
@@ -502,36 +571,18 @@ def cancelar_permuta(request, permuta_id):
         return redirect("minhas_permutas")
 
     if request.method == "POST":
-        permuta.status = "CANCELADA"
-        permuta.data_decisao = timezone.now()
-        permuta.usuario_decisor = usuario
-        permuta.save()
-
-        # Notificação no sistema
-        substituto_user = permuta.professor_substituto.user
-        Notificacao.objects.create(
-            usuario=substituto_user,
-            mensagem=(
-                f"A permuta #{permuta.id} com o professor "
-                f"{permuta.professor_solicitante.nome} foi CANCELADA pelo solicitante."
-            ),
-            link=reverse("detalhe_permuta", args=[permuta.id]),
-        )
+        with transaction.atomic():
+            cancelada = services.cancelar_permuta(permuta, usuario, professor_solicitante=professor)
+            if cancelada:
+                # Notificações e emails só depois do commit (ver permuta.utils)
+                notificar_cancelamento_permuta(permuta, request)
 
-        # Notificações para coordenadores
-        coordenadores = User.objects.filter(is_staff=True)
-        for coord in coordenadores:
-            Notificacao.objects.create(
-                usuario=coord,
-                mensagem=(
-                    f"A permuta #{permuta.id} do professor {permuta.professor_solicitante.nome} "
-                    f"com o professor {permuta.professor_substituto.nome} foi CANCELADA."
-                ),
-                link=reverse("detalhe_permuta", args=[permuta.id]),
+        if not cancelada:
+            messages.error(
+                request,
+                "Esta permuta foi alterada por outra operação e não pôde ser cancelada."
             )
-
-        # Notificação por email
-        notificar_cancelamento_permuta(permuta, request)
+            return redirect("minhas_permutas")
 
         messages.success(
             request,
@@ -547,49 +598,41 @@ def cancelar_permuta(request, permuta_id):
     return render(request, "professor/cancelar_permuta.html", contexto)
 
 
-@login_required
+@professor_required
 def permutas_como_substituto(request):
     """
-    Lista as permutas em que o professor logado é o professor_substituto.
+    Lista as permutas em que o professor logado é o professor_substituto
+    (por padrão, as do período letivo atual).
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor."
-        )
-        return redirect("home")
+    professor = request.professor
+    periodo, lista_periodos = periodos.escolher_periodo(request)
 
     permutas = Permuta.objects.filter(
         professor_substituto=professor
-    ).order_by("-data_solicitacao")
+    ).select_related(*RELACOES_LISTA).order_by("-data_solicitacao")
+    if periodo is not None:
+        permutas = permutas.filter(periodo=periodo)
 
     contexto = {
         "usuario": usuario,
         "professor": professor,
         "permutas": permutas,
+        "periodo": periodo,
+        "periodos": lista_periodos,
     }
     return render(request, "professor/permutas_como_substituto.html", contexto)
 
 
-@login_required
+@professor_required
 def confirmar_permuta_substituto(request, permuta_id):
     """
     Permite ao professor substituto confirmar uma permuta.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor."
-        )
-        return redirect("home")
+    professor = request.professor
 
     permuta = get_object_or_404(
         Permuta,
@@ -618,26 +661,18 @@ def confirmar_permuta_substituto(request, permuta_id):
         )
         return redirect("permutas_como_substituto")
 
-    permuta.status = "APROVADA"
-    permuta.data_decisao = timezone.now()
-    permuta.usuario_decisor = usuario
-    permuta.save()
-
-    # Notificações para coordenadores
-    coordenadores = User.objects.filter(is_staff=True)
-    for coord in coordenadores:
-        Notificacao.objects.create(
-            usuario=coord,
-            mensagem=(
-                f"A permuta #{permuta.id} entre "
-                f"{permuta.professor_solicitante.nome} e "
-                f"{permuta.professor_substituto.nome} foi APROVADA pelo professor substituto."
-            ),
-            link=reverse("detalhe_permuta", args=[permuta.id]),
-        )
+    with transaction.atomic():
+        aprovada = services.aprovar_permuta(permuta, usuario, professor_substituto=professor)
+        if aprovada:
+            # Notificações e emails só depois do commit (ver permuta.utils)
+            notificar_confirmacao_permuta(permuta, request)
 
-    # Notificação por email
-    notificar_confirmacao_permuta(permuta, request)
+    if not aprovada:
+        messages.error(
+            request,
+            "Esta permuta foi alterada por outra operação e não pôde ser confirmada."
+        )
+        return redirect("permutas_como_substituto")
 
     messages.success(
         request,
@@ -646,24 +681,17 @@ def confirmar_permuta_substituto(request, permuta_id):
     return redirect("permutas_como_substituto")
 
 
-@login_required
+@professor_required
 def registrar_reposicao(request, permuta_id):
     """
     Permite ao professor solicitante registrar a reposição de uma permuta.
     """
     usuario = request.user
 
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        messages.error(
-            request,
-            "Seu usuário ainda não está vinculado a um cadastro de professor."
-        )
-        return redirect("home")
+    professor = request.professor
 
     permuta = get_object_or_404(
-        Permuta,
+        Permuta.objects.select_related("horario__turma", "horario__disciplina", "professor_substituto__user"),
         id=permuta_id,
         professor_solicitante=professor,
     )
@@ -678,19 +706,13 @@ def registrar_reposicao(request, permuta_id):
     if request.method == "POST":
         form = ReposicaoForm(request.POST)
         if form.is_valid():
-            reposicao = form.save(commit=False)
-            reposicao.permuta = permuta
-            reposicao.save()
-
-            # Notificação para o substituto
-            Notificacao.objects.create(
-                usuario=permuta.professor_substituto.user,
-                mensagem=(
-                    f"O professor {professor.nome} registrou a reposição para a permuta #{permuta.id}. "
-                    f"Agora você pode confirmar a permuta."
-                ),
-                link=reverse("confirmar_permuta_substituto", args=[permuta.id]),
-            )
+            with transaction.atomic():
+                reposicao = form.save(commit=False)
+                reposicao.permuta = permuta
+                reposicao.save()
+
+                # Notificação para o substituto, depois do commit
+                notificar_reposicao_registrada(permuta)
 
             messages.success(
                 request,
@@ -705,6 +727,7 @@ def registrar_reposicao(request, permuta_id):
         "professor": professor,
         "permuta": permuta,
         "form": form,
+        "sugestoes": horarios_livres(permuta),
     }
     return render(request, "professor/registrar_reposicao.html", contexto)
 
@@ -716,7 +739,8 @@ def registrar_reposicao(request, permuta_id):
 @login_required
 def permutas_pendentes(request):
     """
-    Visão da coordenação: lista permutas solicitadas que ainda não têm reposição.
+    Visão da coordenação: lista permutas solicitadas que ainda não têm reposição
+    (por padrão, as do período letivo atual).
     """
     usuario = request.user
 
@@ -724,17 +748,26 @@ def permutas_pendentes(request):
         messages.error(request, "Você não tem permissão para acessar esta página.")
         return redirect("home")
 
-    permutas = Permuta.objects.all().order_by("-data_solicitacao")
-    permutas_sem_reposicao = [p for p in permutas if not p.tem_reposicao()]
+    periodo, lista_periodos = periodos.escolher_periodo(request)
+    permutas_sem_reposicao = (
+        Permuta.objects.filter(reposicao__isnull=True)
+        .select_related(*RELACOES_LISTA)
+        .order_by("-data_solicitacao")
+    )
+    if periodo is not None:
+        permutas_sem_reposicao = permutas_sem_reposicao.filter(periodo=periodo)
 
     contexto = {
         "usuario": usuario,
         "permutas": permutas_sem_reposicao,
+        "periodo": periodo,
+        "periodos": lista_periodos,
     }
     return render(request, "coordenacao/permutas_pendentes.html", contexto)
 
 
 @login_required
+@usar_replica
 def dashboard_estatisticas(request):
     """
     Dashboard com gráficos e estatísticas das permutas
@@ -748,136 +781,36 @@ def dashboard_estatisticas(request):
 
     hoje = timezone.now().date()
 
-    # Estatísticas gerais
-    total_permutas = Permuta.objects.count()
-    permutas_aprovadas = Permuta.objects.filter(status="APROVADA").count()
-    permutas_pendentes = Permuta.objects.filter(status="PENDENTE").count()
-    permutas_canceladas = Permuta.objects.filter(status="CANCELADA").count()
+    # Indicadores das permutas (retrato em colunas, ver permuta.analise)
+    dados = analise.indicadores(analise.obter_retrato(), hoje)
+    por_status = dados["por_status"]
+    permutas_aprovadas = por_status["APROVADA"]
+    permutas_pendentes = por_status["PENDENTE"]
+    permutas_canceladas = por_status["CANCELADA"]
 
     # Permutas por mês (últimos 6 meses)
-    meses = []
-    dados_mensais = []
-
-    for i in range(5, -1, -1):
-        data = hoje - timedelta(days=30 * i)
-        meses.append(data.strftime("%b/%Y"))
-
-        mes_inicio = hoje - timedelta(days=30 * (i + 1))
-        mes_fim = hoje - timedelta(days=30 * i)
-
-        count = Permuta.objects.filter(
-            data_solicitacao__date__gte=mes_inicio,
-            data_solicitacao__date__lt=mes_fim,
-        ).count()
-        dados_mensais.append(count)
-
-    # =========================
-    # Gráfico de Pizza - Status das Permutas
-    # =========================
-    fig1, ax1 = plt.subplots(figsize=(6, 4))
-    status_counts = [permutas_aprovadas, permutas_pendentes, permutas_canceladas]
-    status_labels = ["Aprovadas", "Pendentes", "Canceladas"]
-    colors = ["#28a745", "#ffc107", "#dc3545"]
-
-    if sum(status_counts) > 0:
-        # Não colocamos labels direto nas fatias para evitar sobreposição
-        wedges, texts, autotexts = ax1.pie(
-            status_counts,
-            labels=None,  # sem rótulo de texto na borda da fatia
-            colors=colors,
-            autopct="%1.1f%%",
-            startangle=90,
-        )
-
-        # Deixa o círculo “certinho”
-        ax1.axis("equal")
-        ax1.set_title("Distribuição por Status", fontsize=14, fontweight="bold")
-
-        # Ajusta o estilo do percentual sobre as fatias
-        for autot in autotexts:
-            autot.set_color("white")
-            autot.set_fontsize(9)
-
-        # Legenda com os nomes dos status, ao lado do gráfico
-        ax1.legend(
-            wedges,
-            status_labels,
-            title="Status",
-            loc="center left",
-            bbox_to_anchor=(1, 0.5),
-        )
-    else:
-        ax1.text(0.5, 0.5, "Sem dados", ha="center", va="center")
-        ax1.set_xlim(-1, 1)
-        ax1.set_ylim(-1, 1)
-
-    buffer1 = io.BytesIO()
-    plt.savefig(buffer1, format="png", bbox_inches="tight")
-    buffer1.seek(0)
-    grafico_pizza = base64.b64encode(buffer1.getvalue()).decode()
-    plt.close(fig1)
-
-    # =========================
-    # Gráfico de Barras - Permutas por Mês
-    # =========================
-    fig2, ax2 = plt.subplots(figsize=(8, 4))
-    bars = ax2.bar(meses, dados_mensais, color="#28a745", alpha=0.7)
-    ax2.set_xlabel("Mês")
-    ax2.set_ylabel("Quantidade")
-    ax2.set_title("Permutas por Mês (últimos 6 meses)", fontsize=14, fontweight="bold")
-    ax2.tick_params(axis="x", rotation=45)
-
-    for bar in bars:
-        height = bar.get_height()
-        ax2.text(
-            bar.get_x() + bar.get_width() / 2.0,
-            height,
-            f"{int(height)}",
-            ha="center",
-            va="bottom",
-        )
-
-    buffer2 = io.BytesIO()
-    plt.savefig(buffer2, format="png", bbox_inches="tight")
-    buffer2.seek(0)
-    grafico_barras = base64.b64encode(buffer2.getvalue()).decode()
-    plt.close(fig2)
-
-    # Top 5 professores que mais solicitam permutas
-    top_professores = Professor.objects.annotate(
-        total_permutas=Count("permutas_solicitadas")
-    ).order_by("-total_permutas")[:5]
+    meses = [item["mes"].strftime("%b/%Y") for item in dados["permutas_por_mes"]]
+    dados_mensais = [item["quantidade"] for item in dados["permutas_por_mes"]]
 
-    # Top 5 disciplinas mais permutadas
-    top_disciplinas = Disciplina.objects.annotate(
-        total_permutas=Count("horarioaula__permuta")
-    ).order_by("-total_permutas")[:5]
-
-    # Permutas por dia da semana
-    dias_semana = {
-        2: "Segunda",
-        3: "Terça",
-        4: "Quarta",
-        5: "Quinta",
-        6: "Sexta",
-        7: "Sábado",
-    }
-    permutas_por_dia = []
-    for dia_num, dia_nome in dias_semana.items():
-        count = Permuta.objects.filter(horario__dia_semana=dia_num).count()
-        permutas_por_dia.append({"dia": dia_nome, "quantidade": count})
+    # Os dois gráficos são gerados em paralelo no pool (ver permuta.graficos)
+    grafico_pizza, grafico_barras = graficos.renderizar(
+        (graficos.grafico_status, (permutas_aprovadas, permutas_pendentes, permutas_canceladas)),
+        (graficos.grafico_mensal, (meses, dados_mensais)),
+    )
 
     contexto = {
         "usuario": usuario,
-        "total_permutas": total_permutas,
+        "total_permutas": dados["total_permutas"],
         "permutas_aprovadas": permutas_aprovadas,
         "permutas_pendentes": permutas_pendentes,
         "permutas_canceladas": permutas_canceladas,
         "grafico_pizza": grafico_pizza,
         "grafico_barras": grafico_barras,
-        "top_professores": top_professores,
-        "top_disciplinas": top_disciplinas,
-        "permutas_por_dia": permutas_por_dia,
+        "top_professores": dados["top_professores"],
+        "top_disciplinas": dados["top_disciplinas"],
+        "permutas_por_dia": dados["permutas_por_dia"],
+        "latencia_decisao": dados["latencia_decisao_horas"],
+        "atraso_reposicao": dados["atraso_reposicao_dias"],
     }
     return render(request, "coordenacao/dashboard_estatisticas.html", contexto)
 
@@ -885,141 +818,227 @@ def dashboard_estatisticas(request):
 @login_required
 def relatorio_permutas_excel(request):
     """
-    Gera relatório em Excel com todas as permutas
+    Enfileira o relatório em Excel das permutas (filtros opcionais na URL)
+    """
+    return _solicitar_relatorio(request, "EXCEL")
+
+
+@login_required
+def relatorio_permutas_pdf(request):
+    """
+    Enfileira o relatório em PDF das permutas (filtros opcionais na URL)
+    """
+    return _solicitar_relatorio(request, "PDF")
+
+
+def _solicitar_relatorio(request, tipo):
+    """
+    O relatório é gerado pelo comando processar_relatorios, fora da
+    requisição; o coordenador acompanha a tarefa e baixa o arquivo.
     """
     usuario = request.user
-    
+
     if not usuario.is_staff:
         messages.error(request, "Acesso restrito à coordenação.")
         return redirect("home")
-    
-    # Definir a variável hoje
-    hoje = timezone.now().date()
-    
-    # Criar workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Relatório de Permutas"
-    
-    # Cabeçalhos
-    headers = [
-        'ID', 'Data Solicitação', 'Data Aula', 'Solicitante', 'Substituto',
-        'Turma', 'Disciplina', 'Status', 'Data Decisão', 'Tem Reposição',
-        'Data Reposição', 'Motivo'
-    ]
-    
-    # Estilo do cabeçalho
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="28a745", end_color="28a745", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        ws.column_dimensions[get_column_letter(col_num)].width = 18
-    
-    # Dados
-    permutas = Permuta.objects.all().order_by('-data_solicitacao')
-    
-    for row_num, permuta in enumerate(permutas, 2):
-        ws.cell(row=row_num, column=1).value = permuta.id
-        ws.cell(row=row_num, column=2).value = permuta.data_solicitacao.strftime('%d/%m/%Y %H:%M')
-        ws.cell(row=row_num, column=3).value = permuta.data_aula.strftime('%d/%m/%Y')
-        ws.cell(row=row_num, column=4).value = permuta.professor_solicitante.nome
-        ws.cell(row=row_num, column=5).value = permuta.professor_substituto.nome
-        ws.cell(row=row_num, column=6).value = permuta.horario.turma.codigo_turma
-        ws.cell(row=row_num, column=7).value = permuta.horario.disciplina.nome
-        ws.cell(row=row_num, column=8).value = permuta.get_status_display()
-        ws.cell(row=row_num, column=9).value = permuta.data_decisao.strftime('%d/%m/%Y %H:%M') if permuta.data_decisao else ''
-        ws.cell(row=row_num, column=10).value = 'Sim' if permuta.tem_reposicao() else 'Não'
-        
-        if permuta.tem_reposicao():
-            ws.cell(row=row_num, column=11).value = permuta.reposicao.data_reposicao.strftime('%d/%m/%Y')
-        else:
-            ws.cell(row=row_num, column=11).value = ''
-            
-        ws.cell(row=row_num, column=12).value = permuta.motivo
-    
-    # Criar resposta HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    filtros = FiltroPermutasForm(request.GET)
+    if not filtros.is_valid():
+        messages.error(request, "Filtros inválidos para o relatório.")
+        return redirect("admin_dashboard")
+
+    if tipo == "ZIP" and filtros.periodo_arquivado():
+        messages.error(request, "Não há comprovantes de períodos arquivados.")
+        return redirect("admin_dashboard")
+
+    tarefa, criada = relatorios.solicitar(
+        tipo, relatorios.normalizar_filtros(filtros.cleaned_data), usuario
     )
-    response['Content-Disposition'] = f'attachment; filename=relatorio_permutas_{hoje.strftime("%Y%m%d")}.xlsx'
-    
-    wb.save(response)
-    return response
+    if not criada:
+        messages.info(request, "Um relatório igual foi solicitado há pouco; acompanhe-o abaixo.")
+    return redirect("acompanhar_relatorio", tarefa_id=tarefa.id)
 
 
 @login_required
-def relatorio_permutas_pdf(request):
+@usar_replica
+def exportar_permutas_csv(request):
     """
-    Gera relatório em PDF com todas as permutas
+    Exporta as permutas filtradas em CSV, gerado à medida que é enviado.
+    Apenas para staff/coordenação.
     """
+    return _exportar_permutas(request, exportacao.gerar_csv, "text/csv; charset=utf-8", "csv")
+
+
+@login_required
+@usar_replica
+def exportar_permutas_jsonl(request):
+    """
+    Exporta as permutas filtradas em JSON Lines (um objeto por linha).
+    Apenas para staff/coordenação.
+    """
+    return _exportar_permutas(request, exportacao.gerar_jsonl, "application/x-ndjson; charset=utf-8", "jsonl")
+
+
+def _exportar_permutas(request, gerar, tipo_conteudo, extensao):
     usuario = request.user
-    
+
     if not usuario.is_staff:
         messages.error(request, "Acesso restrito à coordenação.")
         return redirect("home")
-    
-    # Definir a variável hoje
+
+    filtros = FiltroPermutasForm(request.GET)
+    if not filtros.is_valid():
+        return JsonResponse({'error': 'Filtros inválidos', 'detalhes': filtros.errors}, status=400)
+    if filtros.periodo_arquivado():
+        return JsonResponse({'error': 'Período arquivado: use os relatórios'}, status=400)
+
+    permutas = filtros.filtrar(Permuta.objects.all()).order_by("id")
+
     hoje = timezone.now().date()
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=relatorio_permutas_{hoje.strftime("%Y%m%d")}.pdf'
-    
-    p = canvas.Canvas(response, pagesize=A4)
-    largura, altura = A4
-    
-    # Cabeçalho
-    p.setFillColor(colors.HexColor('#28a745'))
-    p.rect(0, altura-80, largura, 80, fill=1)
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(50, altura-45, "Relatório de Permutas")
-    p.setFont("Helvetica", 10)
-    p.drawString(50, altura-65, f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-    
-    y = altura - 120
-    x = 50
-    
-    permutas = Permuta.objects.all().order_by('-data_solicitacao')[:50]  # Limitar a 50 para PDF
-    
-    for permuta in permutas:
-        if y < 50:  # Nova página
-            p.showPage()
-            y = altura - 50
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y, "Continuação...")
-            y -= 30
-        
-        p.setFont("Helvetica-Bold", 11)
-        p.drawString(x, y, f"Permuta #{permuta.id}")
-        y -= 15
-        
-        p.setFont("Helvetica", 9)
-        p.drawString(x+20, y, f"Solicitante: {permuta.professor_solicitante.nome}")
-        y -= 12
-        p.drawString(x+20, y, f"Substituto: {permuta.professor_substituto.nome}")
-        y -= 12
-        p.drawString(x+20, y, f"Data Aula: {permuta.data_aula.strftime('%d/%m/%Y')}")
-        y -= 12
-        p.drawString(x+20, y, f"Turma: {permuta.horario.turma.codigo_turma} - {permuta.horario.disciplina.nome}")
-        y -= 12
-        p.drawString(x+20, y, f"Status: {permuta.get_status_display()}")
-        y -= 20
-        
-        # Linha separadora
-        p.setStrokeColor(colors.lightgrey)
-        p.line(x, y, largura-50, y)
-        y -= 15
-    
-    p.save()
+    response = StreamingHttpResponse(gerar(permutas), content_type=tipo_conteudo)
+    response["Content-Disposition"] = f'attachment; filename="permutas_{hoje.strftime("%Y%m%d")}.{extensao}"'
     return response
 
 
+@login_required
+def acompanhar_relatorio(request, tarefa_id):
+    """
+    Página que acompanha a geração do relatório e oferece o download.
+    """
+    usuario = request.user
+
+    if not usuario.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    tarefa = get_object_or_404(TarefaRelatorio, id=tarefa_id)
+    contexto = {
+        "usuario": usuario,
+        "tarefa": tarefa,
+        "situacao": _situacao_relatorio(tarefa),
+    }
+    return render(request, "coordenacao/acompanhar_relatorio.html", contexto)
+
+
+@login_required
+def api_relatorio(request, tarefa_id):
+    """
+    API REST com a situação da tarefa de relatório (consultada pela página
+    de acompanhamento até o arquivo ficar pronto).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Acesso restrito'}, status=403)
+
+    tarefa = TarefaRelatorio.objects.filter(id=tarefa_id).first()
+    if tarefa is None:
+        return JsonResponse({'error': 'Relatório não encontrado'}, status=404)
+    return JsonResponse(_situacao_relatorio(tarefa))
+
+
+def _situacao_relatorio(tarefa):
+    return {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'criada_em': tarefa.criada_em.isoformat(),
+        'concluida_em': tarefa.concluida_em.isoformat() if tarefa.concluida_em else None,
+        'erro': tarefa.erro,
+        'download': (
+            reverse('baixar_relatorio', args=[tarefa.id])
+            if tarefa.status == 'CONCLUIDA' else None
+        ),
+    }
+
+
+@login_required
+def baixar_relatorio(request, tarefa_id):
+    """
+    Download do arquivo de um relatório concluído.
+    """
+    usuario = request.user
+
+    if not usuario.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    tarefa = get_object_or_404(TarefaRelatorio, id=tarefa_id, status="CONCLUIDA")
+    try:
+        arquivo = open(relatorios.caminho(tarefa), "rb")
+    except FileNotFoundError:
+        raise Http404("Arquivo do relatório não encontrado")
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=tarefa.nome_arquivo,
+        content_type=relatorios.TIPOS_CONTEUDO[tarefa.tipo],
+    )
+
+
+@login_required
+def perfis_requisicoes(request):
+    """
+    Lista os perfis de requisição coletados (ver permuta_aulas.perfilamento).
+    """
+    usuario = request.user
+
+    if not usuario.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    contexto = {
+        "usuario": usuario,
+        "perfis": perfilamento.listar_perfis(),
+        "amostragem": getattr(settings, "PERFILAMENTO_AMOSTRAGEM", 0),
+    }
+    return render(request, "coordenacao/perfis_requisicoes.html", contexto)
+
+
+@login_required
+def perfil_requisicao(request, nome):
+    """
+    Resumo do cProfile e consultas SQL de um perfil de requisição.
+    """
+    usuario = request.user
+
+    if not usuario.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    perfil = perfilamento.ler_perfil(nome)
+    if perfil is None:
+        raise Http404("Perfil não encontrado")
+
+    consultas = sorted(perfil["consultas"], key=lambda consulta: consulta["ms"], reverse=True)
+    contexto = {
+        "usuario": usuario,
+        "meta": perfil["meta"],
+        "resumo": perfil["resumo"],
+        "consultas": consultas,
+    }
+    return render(request, "coordenacao/perfil_requisicao.html", contexto)
+
+
+@login_required
+def baixar_perfil(request, nome):
+    """
+    Download das estatísticas do cProfile (.prof) de um perfil.
+    """
+    if not request.user.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    caminho = perfilamento.caminho_perfil(nome)
+    if caminho is None:
+        raise Http404("Perfil não encontrado")
+    return FileResponse(
+        open(caminho / "perfil.prof", "rb"),
+        as_attachment=True,
+        filename=f"perfil_{nome}.prof",
+        content_type="application/octet-stream",
+    )
+
+
 # ============================================================================
 # API REST
 # ============================================================================
@@ -1027,23 +1046,41 @@ def relatorio_permutas_pdf(request):
 @login_required
 def api_permutas(request):
     """
-    API REST para listar permutas em formato JSON
+    API REST para listar permutas em formato JSON (por padrão, as do
+    período letivo atual; ``?periodo=<id>`` ou ``?periodo=todos``)
     """
     usuario = request.user
     
-    if usuario.is_staff:
-        permutas = Permuta.objects.all()
-    else:
-        try:
-            professor = usuario.professor
-            permutas = Permuta.objects.filter(
-                Q(professor_solicitante=professor) | Q(professor_substituto=professor)
-            )
-        except Professor.DoesNotExist:
+    professor = None
+    if not usuario.is_staff:
+        professor = request.professor
+        if professor is None:
             return JsonResponse({'error': 'Professor não encontrado'}, status=404)
-    
+
+    permutas = Permuta.objects.all()
+    periodo, _ = periodos.escolher_periodo(request)
+    if periodo is not None:
+        permutas = permutas.filter(periodo=periodo)
+    if professor is None:
+        marca = marca_dagua(permutas)
+    else:
+        marca = marca_dagua_do_professor(permutas, professor)
+        permutas = permutas.filter(
+            Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+        )
+
+    return resposta_condicional(
+        request,
+        [marca],
+        lambda: JsonResponse(_lista_permutas(permutas)),
+        usuario.pk,
+        periodo.pk if periodo else None,
+    )
+
+
+def _lista_permutas(permutas):
     data = []
-    for permuta in permutas.order_by('-data_solicitacao')[:100]:
+    for permuta in permutas.select_related(*RELACOES_LISTA).order_by('-data_solicitacao')[:100]:
         data.append({
             'id': permuta.id,
             'data_solicitacao': permuta.data_solicitacao.strftime('%Y-%m-%d %H:%M:%S'),
@@ -1060,7 +1097,7 @@ def api_permutas(request):
             },
             'turma': {
                 'codigo': permuta.horario.turma.codigo_turma,
-                'descricao': permuta.horario.turma.descricao,
+                'descricao': str(permuta.horario.turma),
             },
             'disciplina': {
                 'nome': permuta.horario.disciplina.nome,
@@ -1078,8 +1115,8 @@ def api_permutas(request):
             'url_detalhes': reverse('detalhe_permuta', args=[permuta.id]),
             'url_pdf': reverse('comprovante_permuta_pdf', args=[permuta.id]),
         })
-    
-    return JsonResponse({'count': len(data), 'results': data}, safe=False)
+
+    return {'count': len(data), 'results': data}
 
 
 @login_required
@@ -1089,22 +1126,30 @@ def api_permuta_detalhe(request, permuta_id):
     """
     usuario = request.user
     
-    try:
-        if usuario.is_staff:
-            permuta = Permuta.objects.get(id=permuta_id)
-        else:
-            professor = usuario.professor
-            permuta = Permuta.objects.get(
-                Q(id=permuta_id) & (
-                    Q(professor_solicitante=professor) | Q(professor_substituto=professor)
-                )
-            )
-    except Professor.DoesNotExist:
+    professor = request.professor
+    if not usuario.is_staff and professor is None:
         return JsonResponse({'error': 'Professor não encontrado'}, status=404)
-    except Permuta.DoesNotExist:
+
+    permutas = Permuta.objects.filter(id=permuta_id)
+    if not usuario.is_staff:
+        permutas = permutas.filter(
+            Q(professor_solicitante=professor) | Q(professor_substituto=professor)
+        )
+
+    marca = marca_dagua(permutas)
+    if not marca[1]:
         return JsonResponse({'error': 'Permuta não encontrada'}, status=404)
-    
-    data = {
+
+    return resposta_condicional(
+        request,
+        [marca],
+        lambda: JsonResponse(_detalhe_permuta(permutas.select_related(*RELACOES_COMPROVANTE).get())),
+        usuario.pk,
+    )
+
+
+def _detalhe_permuta(permuta):
+    return {
         'id': permuta.id,
         'data_solicitacao': permuta.data_solicitacao.strftime('%Y-%m-%d %H:%M:%S'),
         'data_aula': permuta.data_aula.strftime('%Y-%m-%d'),
@@ -1112,17 +1157,17 @@ def api_permuta_detalhe(request, permuta_id):
             'id': permuta.professor_solicitante.id,
             'nome': permuta.professor_solicitante.nome,
             'siape': permuta.professor_solicitante.matricula_siape,
-            'email': permuta.professor_solicitante.email,
+            'email': permuta.professor_solicitante.user.email,
         },
         'substituto': {
             'id': permuta.professor_substituto.id,
             'nome': permuta.professor_substituto.nome,
             'siape': permuta.professor_substituto.matricula_siape,
-            'email': permuta.professor_substituto.email,
+            'email': permuta.professor_substituto.user.email,
         },
         'turma': {
             'codigo': permuta.horario.turma.codigo_turma,
-            'descricao': permuta.horario.turma.descricao,
+            'descricao': str(permuta.horario.turma),
         },
         'disciplina': {
             'id': permuta.horario.disciplina.id,
@@ -1152,11 +1197,59 @@ def api_permuta_detalhe(request, permuta_id):
             'confirmar': reverse('confirmar_permuta_substituto', args=[permuta.id]) if permuta.status == 'PENDENTE' and permuta.tem_reposicao() else None,
         }
     }
-    
-    return JsonResponse(data)
 
 
 @login_required
+def api_buscar_permutas(request):
+    """
+    API REST de busca textual nas permutas (motivo, professores, turma,
+    disciplina e observação da reposição), ordenada por relevância.
+    """
+    usuario = request.user
+    termo = request.GET.get('q', '').strip()
+
+    professor = None
+    if not usuario.is_staff:
+        professor = request.professor
+        if professor is None:
+            return JsonResponse({'error': 'Professor não encontrado'}, status=404)
+
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 50)), 200))
+    except ValueError:
+        limite = 50
+
+    ids = buscar_permutas_ids(termo, professor=professor, limite=limite)
+    permutas = Permuta.objects.select_related(
+        'professor_solicitante__user',
+        'professor_substituto__user',
+        'horario__turma',
+        'horario__disciplina',
+    ).in_bulk(ids)
+
+    data = []
+    for permuta_id in ids:
+        permuta = permutas.get(permuta_id)
+        if permuta is None:
+            continue
+        data.append({
+            'id': permuta.id,
+            'data_aula': permuta.data_aula.strftime('%Y-%m-%d'),
+            'solicitante': permuta.professor_solicitante.nome,
+            'substituto': permuta.professor_substituto.nome,
+            'turma': permuta.horario.turma.codigo_turma,
+            'disciplina': permuta.horario.disciplina.nome,
+            'status': permuta.status,
+            'status_display': permuta.get_status_display(),
+            'motivo': permuta.motivo,
+            'url_detalhes': reverse('detalhe_permuta', args=[permuta.id]),
+        })
+
+    return JsonResponse({'q': termo, 'count': len(data), 'results': data})
+
+
+@login_required
+@usar_replica
 def api_estatisticas(request):
     """
     API REST para estatísticas das permutas
@@ -1165,39 +1258,109 @@ def api_estatisticas(request):
     
     if not usuario.is_staff:
         return JsonResponse({'error': 'Acesso restrito'}, status=403)
-    
+
     hoje = timezone.now().date()
-    
-    # Estatísticas gerais
-    total = Permuta.objects.count()
-    aprovadas = Permuta.objects.filter(status='APROVADA').count()
-    pendentes = Permuta.objects.filter(status='PENDENTE').count()
-    canceladas = Permuta.objects.filter(status='CANCELADA').count()
-    
-    # Permutas por mês
-    permutas_por_mes = []
-    for i in range(5, -1, -1):
-        mes = hoje - timedelta(days=30*i)
-        count = Permuta.objects.filter(
-            data_solicitacao__month=mes.month,
-            data_solicitacao__year=mes.year
-        ).count()
-        permutas_por_mes.append({
-            'mes': mes.strftime('%Y-%m'),
-            'quantidade': count
-        })
-    
+    versao = analise.versao_dos_dados()
+    return resposta_condicional(
+        request,
+        list(versao),
+        lambda: JsonResponse(_estatisticas(analise.obter_retrato(versao), hoje, versao[0][0])),
+        hoje,
+    )
+
+
+def _estatisticas(retrato, hoje, ultima_modificacao):
+    dados = analise.indicadores(retrato, hoje)
+    por_status = dados['por_status']
+
     data = {
-        'total_permutas': total,
-        'aprovadas': aprovadas,
-        'pendentes': pendentes,
-        'canceladas': canceladas,
-        'taxa_aprovacao': round((aprovadas / total * 100) if total > 0 else 0, 2),
-        'permutas_por_mes': permutas_por_mes,
-        'timestamp': datetime.now().isoformat(),
+        'total_permutas': dados['total_permutas'],
+        'aprovadas': por_status['APROVADA'],
+        'pendentes': por_status['PENDENTE'],
+        'recusadas': por_status['RECUSADA'],
+        'canceladas': por_status['CANCELADA'],
+        'taxa_aprovacao': dados['taxa_aprovacao'],
+        'permutas_por_mes': [
+            {'mes': item['mes'].strftime('%Y-%m'), 'quantidade': item['quantidade']}
+            for item in dados['permutas_por_mes']
+        ],
+        'permutas_por_dia': dados['permutas_por_dia'],
+        'top_professores': [
+            {'id': prof.id, 'nome': prof.nome, 'total_permutas': prof.total_permutas}
+            for prof in dados['top_professores']
+        ],
+        'top_disciplinas': [
+            {'id': disc.id, 'nome': disc.nome, 'total_permutas': disc.total_permutas}
+            for disc in dados['top_disciplinas']
+        ],
+        'sem_reposicao': dados['total_sem_reposicao'],
+        'latencia_decisao_horas': dados['latencia_decisao_horas'],
+        'atraso_reposicao_dias': dados['atraso_reposicao_dias'],
+        # Momento da última alteração dos dados (o mesmo do Last-Modified)
+        'timestamp': ultima_modificacao.isoformat() if ultima_modificacao else None,
     }
-    
-    return JsonResponse(data)
+    return data
+
+
+@login_required
+def api_sincronizar(request):
+    """
+    API REST de sincronização incremental: permutas, reposições e
+    notificações criadas, alteradas ou removidas após ``?since=<id>``.
+
+    O cliente guarda ``proximo`` e o envia como ``since`` na próxima chamada;
+    enquanto ``mais`` for verdadeiro, há mais alterações a buscar.
+    Ao remover uma permuta, o cliente descarta também a reposição dela.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetro since inválido'}, status=400)
+
+    return JsonResponse(alteracoes_desde(request.user, request.professor, max(since, 0)))
+
+
+@login_required
+def api_horarios_reposicao(request, permuta_id):
+    """
+    API REST com as próximas datas/horários em que a turma e o professor
+    solicitante estão livres para a reposição da permuta.
+
+    Parâmetros: ``quantidade`` (sugestões) e ``dias`` (horizonte da busca).
+    """
+    usuario = request.user
+
+    permutas = Permuta.objects.select_related("horario__turma")
+    if not usuario.is_staff:
+        if request.professor is None:
+            return JsonResponse({'error': 'Professor não encontrado'}, status=404)
+        permutas = permutas.filter(professor_solicitante=request.professor)
+    permuta = permutas.filter(id=permuta_id).first()
+    if permuta is None:
+        return JsonResponse({'error': 'Permuta não encontrada'}, status=404)
+
+    try:
+        quantidade = int(request.GET.get('quantidade', SUGESTOES_PADRAO))
+        dias = int(request.GET.get('dias', HORIZONTE_PADRAO))
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros quantidade e dias devem ser inteiros'}, status=400)
+    quantidade = min(max(quantidade, 1), SUGESTOES_MAXIMO)
+    dias = min(max(dias, 1), HORIZONTE_MAXIMO)
+
+    sugestoes = horarios_livres(permuta, quantidade=quantidade, dias=dias)
+    return JsonResponse({
+        'permuta': permuta.id,
+        'turma': permuta.horario.turma.codigo_turma,
+        'sugestoes': [
+            {
+                'data': sugestao['data'].isoformat(),
+                'dia_semana': sugestao['dia_semana'],
+                'hora_inicio': sugestao['hora_inicio'].strftime('%H:%M'),
+                'hora_fim': sugestao['hora_fim'].strftime('%H:%M'),
+            }
+            for sugestao in sugestoes
+        ],
+    })
 
 
 # ============================================================================
@@ -1228,22 +1391,29 @@ def api_notificacoes_nao_lidas(request):
     """
     API REST para listar notificações não lidas
     """
-    notificacoes = Notificacao.objects.filter(
-        usuario=request.user,
-        lida=False
-    ).order_by('-criada_em')[:10]
-    
+    notificacoes = Notificacao.objects.filter(usuario=request.user)
+    return resposta_condicional(
+        request,
+        [marca_dagua(notificacoes)],
+        lambda: JsonResponse(_notificacoes_nao_lidas(notificacoes)),
+        request.user.pk,
+    )
+
+
+def _notificacoes_nao_lidas(notificacoes):
+    nao_lidas = notificacoes.filter(lida=False).order_by('-data_criacao')[:10]
+
     data = []
-    for notif in notificacoes:
+    for notif in nao_lidas:
         data.append({
             'id': notif.id,
             'mensagem': notif.mensagem,
-            'criada_em': notif.criada_em.strftime('%d/%m/%Y %H:%M'),
+            'criada_em': notif.data_criacao.strftime('%d/%m/%Y %H:%M'),
             'link': notif.link,
             'url_ler': reverse('ler_notificacao', args=[notif.id]),
         })
-    
-    return JsonResponse({'count': len(data), 'notificacoes': data})
+
+    return {'count': len(data), 'notificacoes': data}
 
 
 # ============================================================================
@@ -1253,17 +1423,18 @@ def api_notificacoes_nao_lidas(request):
 @login_required
 def comprovante_permuta_pdf(request, permuta_id):
     """
-    Gera um comprovante profissional em PDF com os dados da permuta.
+    Serve o comprovante em PDF da permuta.
+    O arquivo é gerado uma única vez para cada versão dos dados e reaproveitado
+    do cache em disco nas próximas requisições.
     """
     usuario = request.user
 
-    professor = None
-    try:
-        professor = usuario.professor
-    except Professor.DoesNotExist:
-        professor = None
+    professor = request.professor
 
-    permuta = get_object_or_404(Permuta, id=permuta_id)
+    permuta = get_object_or_404(
+        Permuta.objects.select_related(*RELACOES_COMPROVANTE),
+        id=permuta_id,
+    )
 
     if not (
         (professor and permuta.professor_solicitante == professor)
@@ -1276,139 +1447,52 @@ def comprovante_permuta_pdf(request, permuta_id):
         )
         return redirect("home")
 
-    response = HttpResponse(content_type="application/pdf")
-    filename = f"comprovante_permuta_{permuta.id}.pdf"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    caminho, chave = obter_comprovante(permuta)
+    return resposta_comprovante(
+        request,
+        caminho,
+        chave,
+        f"comprovante_permuta_{permuta.id}.pdf",
+    )
 
-    # Create the PDF object
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
 
-    # Cabeçalho com gradiente
-    p.setFillColor(colors.HexColor('#28a745'))
-    p.rect(0, height-100, width, 100, fill=1)
-    
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(50, height-50, "Sistema de Permuta de Aulas")
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height-75, "Comprovante de Permuta")
-
-    # Data de emissão
-    p.setFont("Helvetica", 10)
-    p.drawRightString(width-50, height-40, f"Emissão: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-
-    # Código da permuta
-    p.setFillColor(colors.HexColor('#dc3545'))
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(50, height-150, f"Permuta #{permuta.id}")
-    
-    # Status
-    status_colors = {
-        'PENDENTE': '#ffc107',
-        'APROVADA': '#28a745',
-        'CANCELADA': '#dc3545',
-    }
-    status_color = status_colors.get(permuta.status, '#6c757d')
-    p.setFillColor(colors.HexColor(status_color))
-    p.setFont("Helvetica-Bold", 14)
-    p.drawRightString(width-50, height-150, f"Status: {permuta.get_status_display()}")
-
-    y = height - 200
-
-    # Função para desenhar seções
-    def draw_section(title, y_pos):
-        p.setFillColor(colors.HexColor('#28a745'))
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, y_pos, title)
-        p.setFillColor(colors.HexColor('#dc3545'))
-        p.line(50, y_pos-5, width-50, y_pos-5)
-        return y_pos - 30
-
-    # Seção: Professor Solicitante
-    y = draw_section("Professor Solicitante", y)
-    p.setFillColor(colors.black)
-    p.setFont("Helvetica", 11)
-    p.drawString(70, y, f"Nome: {permuta.professor_solicitante.nome}")
-    y -= 20
-    p.drawString(70, y, f"Matrícula SIAPE: {permuta.professor_solicitante.matricula_siape}")
-    y -= 30
-
-    # Seção: Professor Substituto
-    y = draw_section("Professor Substituto", y)
-    p.setFont("Helvetica", 11)
-    p.drawString(70, y, f"Nome: {permuta.professor_substituto.nome}")
-    y -= 20
-    p.drawString(70, y, f"Matrícula SIAPE: {permuta.professor_substituto.matricula_siape}")
-    y -= 30
-
-    # Seção: Dados da Aula
-    y = draw_section("Dados da Aula", y)
-    p.setFont("Helvetica", 11)
-    p.drawString(70, y, f"Turma: {permuta.horario.turma.codigo_turma}")
-    y -= 20
-    p.drawString(70, y, f"Disciplina: {permuta.horario.disciplina.nome}")
-    y -= 20
-    p.drawString(70, y, f"Dia da semana: {permuta.horario.get_dia_semana_display()}")
-    y -= 20
-    p.drawString(70, y, f"Horário: {permuta.horario.hora_inicio} - {permuta.horario.hora_fim}")
-    y -= 20
-    p.drawString(70, y, f"Data da aula permutada: {permuta.data_aula.strftime('%d/%m/%Y')}")
-    y -= 30
-
-    # Seção: Datas
-    y = draw_section("Datas", y)
-    p.setFont("Helvetica", 11)
-    p.drawString(70, y, f"Data da solicitação: {permuta.data_solicitacao.strftime('%d/%m/%Y %H:%M')}")
-    y -= 20
-    if permuta.data_decisao:
-        p.drawString(70, y, f"Data da decisão: {permuta.data_decisao.strftime('%d/%m/%Y %H:%M')}")
-        y -= 20
-    if permuta.usuario_decisor:
-        decisor = permuta.usuario_decisor.get_full_name() or permuta.usuario_decisor.username
-        p.drawString(70, y, f"Decidida por: {decisor}")
-        y -= 20
-    y -= 10
-
-    # Seção: Reposição
-    y = draw_section("Reposição", y)
-    p.setFont("Helvetica", 11)
-    if permuta.tem_reposicao():
-        p.drawString(70, y, f"Data da reposição: {permuta.reposicao.data_reposicao.strftime('%d/%m/%Y')}")
-        y -= 20
-        if permuta.reposicao.observacao:
-            p.drawString(70, y, f"Observações: {permuta.reposicao.observacao[:80]}")
-            y -= 20
-    else:
-        p.drawString(70, y, "Não há reposição registrada para esta permuta.")
-        y -= 20
+@login_required
+def exportar_comprovantes_zip(request):
+    """
+    Exporta em um único ZIP os comprovantes das permutas filtradas.
+    Apenas para staff/coordenação.
 
-    # Seção: Motivo
-    y = draw_section("Motivo da Permuta", y)
-    p.setFont("Helvetica", 11)
-    
-    # Quebrar motivo em linhas
-    motivo = permuta.motivo or "Não informado"
-    palavras = motivo.split()
-    linha = ""
-    for palavra in palavras:
-        if len(linha) + len(palavra) + 1 <= 80:
-            linha += (" " if linha else "") + palavra
-        else:
-            p.drawString(70, y, linha)
-            y -= 15
-            linha = palavra
-    if linha:
-        p.drawString(70, y, linha)
-        y -= 20
-
-    # Rodapé
-    p.setFillColor(colors.HexColor('#6c757d'))
-    p.setFont("Helvetica-Oblique", 8)
-    p.drawString(50, 50, "Este documento é um comprovante oficial do Sistema de Permuta de Aulas.")
-    p.drawRightString(width-50, 50, f"Página 1 de 1")
-
-    p.showPage()
-    p.save()
-
-    return response
\ No newline at end of file
+    Com ``?fila=1`` o ZIP é enfileirado como os relatórios e gerado pelo
+    comando processar_relatorios: para lotes muito grandes, que prenderiam
+    um worker da aplicação (e a conexão do navegador) até o fim.
+    """
+    if request.GET.get("fila"):
+        return _solicitar_relatorio(request, "ZIP")
+    return _transmitir_comprovantes_zip(request)
+
+
+@usar_replica
+def _transmitir_comprovantes_zip(request):
+    usuario = request.user
+
+    if not usuario.is_staff:
+        messages.error(request, "Acesso restrito à coordenação.")
+        return redirect("home")
+
+    filtros = FiltroPermutasForm(request.GET)
+    if not filtros.is_valid():
+        return JsonResponse({'error': 'Filtros inválidos', 'detalhes': filtros.errors}, status=400)
+    if filtros.periodo_arquivado():
+        return JsonResponse({'error': 'Não há comprovantes de períodos arquivados'}, status=400)
+
+    permutas = filtros.filtrar(
+        Permuta.objects.select_related(*RELACOES_COMPROVANTE)
+    ).order_by("id")
+
+    hoje = timezone.now().date()
+    response = StreamingHttpResponse(
+        gerar_zip_comprovantes(permutas.iterator(chunk_size=500)),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="comprovantes_{hoje.strftime("%Y%m%d")}.zip"'
+    return response
@@ -1,5 +1,92 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 
 admin.site.site_header = "Sistema de Permuta de Aulas - Administração"
 admin.site.site_title = "Administração - Sistema de Permuta de Aulas"
 admin.site.index_title = "Painel de Administração"
+
+
+class ContagemLimitadaPaginator(Paginator):
+    """
+    Paginator que conta no máximo ``limite_contagem`` registros.
+
+    Em tabelas grandes o COUNT(*) completo é a consulta mais cara da listagem
+    do admin; aqui a contagem para no limite e as páginas além dele deixam
+    de ser oferecidas (use filtros ou a busca para chegar lá).
+    """
+
+    limite_contagem = 10000
+
+    @cached_property
+    def count(self):
+        limitado = self.object_list.order_by()[: self.limite_contagem + 1]
+        return min(limitado.count(), self.limite_contagem)
+
+
+class FiltroTexto(admin.SimpleListFilter):
+    """
+    Filtro lateral com uma caixa de texto, em vez de listar todas as opções.
+    As subclasses definem title, parameter_name e queryset().
+    """
+
+    template = "admin/filtro_texto.html"
+
+    def lookups(self, request, model_admin):
+        # Uma opção fictícia, só para o Django exibir o filtro
+        return ((),)
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+    def choices(self, changelist):
+        todos = next(super().choices(changelist))
+        # Demais parâmetros da listagem, repassados como campos ocultos
+        todos["parametros"] = [
+            (chave, valor)
+            for chave, valores in changelist.get_filters_params().items()
+            if chave != self.parameter_name
+            for valor in (valores if isinstance(valores, list) else [valores])
+        ]
+        yield todos
+
+
+class FiltroNomeProfessor(FiltroTexto):
+    """
+    Filtra pelo nome ou usuário do professor ligado ao campo ``campo_professor``.
+    """
+
+    title = "professor"
+    parameter_name = "professor_nome"
+    campo_professor = "professor"
+
+    def queryset(self, request, queryset):
+        termo = (self.value() or "").strip()
+        if not termo:
+            return queryset
+        campo = self.campo_professor
+        filtro = Q()
+        for parte in termo.split():
+            filtro &= (
+                Q(**{f"{campo}__user__first_name__icontains": parte})
+                | Q(**{f"{campo}__user__last_name__icontains": parte})
+                | Q(**{f"{campo}__user__username__icontains": parte})
+            )
+        return queryset.filter(filtro)
+
+
+class FiltroCodigoTurma(FiltroTexto):
+    """
+    Filtra pelo código da turma do horário.
+    """
+
+    title = "turma"
+    parameter_name = "turma_codigo"
+    campo_turma = "turma"
+
+    def queryset(self, request, queryset):
+        termo = (self.value() or "").strip()
+        if not termo:
+            return queryset
+        return queryset.filter(**{f"{self.campo_turma}__codigo_turma__icontains": termo})
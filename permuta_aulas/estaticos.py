@@ -0,0 +1,155 @@
+"""
+Arquivos estáticos: nomes com hash, variantes pré-comprimidas e cache longo.
+
+- ArmazenamentoEstatico: no collectstatic, gera os nomes com hash do
+  ManifestStaticFilesStorage e grava ao lado de cada arquivo de texto as
+  versões .gz e .br (brotli é opcional; sem o pacote, só .gz).
+- ArquivosEstaticosMiddleware: serve STATIC_ROOT escolhendo a variante
+  comprimida aceita pelo navegador. Arquivos com hash no nome nunca mudam de
+  conteúdo e recebem ``Cache-Control: immutable`` por um ano.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    StaticFilesStorage,
+    staticfiles_storage,
+)
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+EXTENSOES_COMPRIMIVEIS = (".css", ".js", ".svg", ".txt", ".json", ".html", ".map")
+TAMANHO_MINIMO = 256
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_SEM_HASH = "public, max-age=300"
+
+
+def codificacoes_aceitas(cabecalho):
+    """
+    {codificação: q} do cabeçalho Accept-Encoding (RFC 9110). Sem ``;q=``
+    vale 1; ``*`` vale para as codificações não listadas.
+    """
+    aceitas = {}
+    for item in cabecalho.split(","):
+        nome, *parametros = [parte.strip() for parte in item.split(";")]
+        if not nome:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            chave, _, valor = parametro.partition("=")
+            if chave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceitas[nome.lower()] = q
+    return aceitas
+
+
+def _comprimir(caminho):
+    with open(caminho, "rb") as arquivo:
+        conteudo = arquivo.read()
+    if len(conteudo) < TAMANHO_MINIMO:
+        return
+
+    # mtime=0: o .gz é idêntico entre execuções do collectstatic
+    with open(caminho + ".gz", "wb") as destino:
+        destino.write(gzip.compress(conteudo, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(caminho + ".br", "wb") as destino:
+            destino.write(brotli.compress(conteudo, quality=11))
+
+
+class ArmazenamentoEstatico(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage que também grava variantes .gz/.br.
+
+    Sem manifest (collectstatic ainda não executado) as URLs usam o nome
+    original, em vez de derrubar a página com ValueError.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for nome in self.hashed_files.values():
+            if nome.endswith(EXTENSOES_COMPRIMIVEIS):
+                _comprimir(self.path(nome))
+        for nome in paths:
+            if nome.endswith(EXTENSOES_COMPRIMIVEIS) and self.exists(nome):
+                _comprimir(self.path(nome))
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force=force)
+        except ValueError:
+            return StaticFilesStorage.url(self, name)
+
+
+class ArquivosEstaticosMiddleware:
+    """
+    Serve os arquivos de STATIC_ROOT antes do restante da pilha de
+    middlewares (sessão, autenticação etc.), já comprimidos.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixo = "/" + settings.STATIC_URL.lstrip("/")
+        self.raiz = settings.STATIC_ROOT
+        self._imutaveis = None
+
+    def __call__(self, request):
+        if self.raiz and request.path.startswith(self.prefixo) and request.method in ("GET", "HEAD"):
+            resposta = self.servir(request, request.path[len(self.prefixo):])
+            if resposta is not None:
+                return resposta
+        return self.get_response(request)
+
+    def imutaveis(self):
+        if self._imutaveis is None:
+            self._imutaveis = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._imutaveis
+
+    def servir(self, request, nome):
+        """
+        Resposta com o arquivo, ou None se ele não estiver em STATIC_ROOT
+        (em desenvolvimento, quem serve é o app staticfiles).
+        """
+        try:
+            caminho = safe_join(self.raiz, nome)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(caminho):
+            return None
+
+        tipo, _ = mimetypes.guess_type(caminho)
+        aceitas = codificacoes_aceitas(request.headers.get("Accept-Encoding", ""))
+        codificacao = None
+        arquivo = caminho
+        melhor = 0
+        # Maior q aceito; no empate, br antes de gzip
+        for extensao, nome_codificacao in ((".br", "br"), (".gz", "gzip")):
+            q = aceitas.get(nome_codificacao, aceitas.get("*", 0))
+            if q > melhor and os.path.isfile(caminho + extensao):
+                arquivo = caminho + extensao
+                codificacao = nome_codificacao
+                melhor = q
+
+        resposta = FileResponse(open(arquivo, "rb"), content_type=tipo or "application/octet-stream")
+        if codificacao:
+            resposta["Content-Encoding"] = codificacao
+        patch_vary_headers(resposta, ("Accept-Encoding",))
+        resposta["Cache-Control"] = CACHE_IMUTAVEL if nome in self.imutaveis() else CACHE_SEM_HASH
+        return resposta
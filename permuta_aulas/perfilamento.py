@@ -0,0 +1,208 @@
+"""
+Perfilamento sob demanda das requisições da coordenação (staff).
+
+Para usuários staff, a requisição é executada sob o cProfile quando pedida
+explicitamente (parâmetro ``?_perfil=1`` ou cabeçalho ``X-Perfil: 1``) ou
+sorteada pela amostragem PERFILAMENTO_AMOSTRAGEM (fração de 0 a 1). Cada
+perfil vira um diretório em PERFILAMENTO_DIR com:
+
+- ``meta.json``: rota, usuário, status, tempo total e tempo em SQL;
+- ``perfil.prof``: estatísticas do cProfile (pstats, snakeviz etc.);
+- ``resumo.txt``: as funções mais custosas, por tempo acumulado;
+- ``sql.json``: as consultas executadas, com a duração de cada uma.
+
+Os perfis são listados na página da coordenação (ver perfis_requisicoes).
+Só um perfil é coletado por vez; requisições simultâneas seguem sem
+perfilamento. O corpo de respostas em streaming é gerado depois e não entra
+no perfil.
+"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import shutil
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PARAMETRO = "_perfil"
+CABECALHO = "HTTP_X_PERFIL"
+FUNCOES_RESUMO = 60
+NOME_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$")
+
+_lock = threading.Lock()
+
+
+def diretorio():
+    return Path(getattr(settings, "PERFILAMENTO_DIR", settings.BASE_DIR / "cache" / "perfis"))
+
+
+def _solicitado(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_staff:
+        return False
+    if request.GET.get(PARAMETRO) == "1" or request.META.get(CABECALHO) == "1":
+        return True
+    amostragem = getattr(settings, "PERFILAMENTO_AMOSTRAGEM", 0)
+    return amostragem > 0 and random.random() < amostragem
+
+
+class _RegistroSQL:
+    """
+    execute_wrapper que anota cada consulta e a sua duração.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append({
+                "banco": self.alias,
+                "sql": sql,
+                "muitas": many,
+                "ms": round((time.perf_counter() - inicio) * 1000, 3),
+            })
+
+
+class PerfilamentoMiddleware:
+    """
+    Executa a requisição sob o cProfile quando solicitado (ver o módulo).
+    Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _solicitado(request) or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._perfilar(request)
+        finally:
+            _lock.release()
+
+    def _perfilar(self, request):
+        registros = [_RegistroSQL(conexao.alias) for conexao in connections.all()]
+        perfil = cProfile.Profile()
+        with ExitStack() as pilha:
+            for conexao, registro in zip(connections.all(), registros):
+                pilha.enter_context(conexao.execute_wrapper(registro))
+            inicio = time.perf_counter()
+            perfil.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                perfil.disable()
+                duracao = time.perf_counter() - inicio
+
+        consultas = [consulta for registro in registros for consulta in registro.consultas]
+        try:
+            nome = gravar_perfil(request, response, perfil, consultas, duracao)
+        except OSError:
+            logger.exception("Erro ao gravar perfil de %s", request.path)
+        else:
+            response["X-Perfil"] = nome
+        return response
+
+
+def gravar_perfil(request, response, perfil, consultas, duracao):
+    """
+    Grava os arquivos do perfil e retorna o nome do diretório.
+    """
+    agora = datetime.now()
+    nome = f"{agora:%Y%m%d-%H%M%S}-{random.getrandbits(24):06x}"
+    destino = diretorio() / nome
+    destino.mkdir(parents=True)
+
+    perfil.dump_stats(destino / "perfil.prof")
+    resumo = io.StringIO()
+    pstats.Stats(perfil, stream=resumo).sort_stats("cumulative").print_stats(FUNCOES_RESUMO)
+    (destino / "resumo.txt").write_text(resumo.getvalue(), encoding="utf-8")
+    (destino / "sql.json").write_text(
+        json.dumps(consultas, ensure_ascii=False, indent=1), encoding="utf-8"
+    )
+    meta = {
+        "nome": nome,
+        "criado_em": agora.isoformat(timespec="seconds"),
+        "metodo": request.method,
+        "caminho": request.get_full_path(),
+        "usuario": request.user.get_username(),
+        "status": response.status_code,
+        "duracao_ms": round(duracao * 1000, 1),
+        "consultas": len(consultas),
+        "sql_ms": round(sum(consulta["ms"] for consulta in consultas), 1),
+    }
+    (destino / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    limpar_antigos()
+    return nome
+
+
+def limpar_antigos():
+    """
+    Mantém só os PERFILAMENTO_MAXIMO perfis mais recentes.
+    """
+    maximo = getattr(settings, "PERFILAMENTO_MAXIMO", 200)
+    for antigo in sorted(listar_nomes(), reverse=True)[maximo:]:
+        shutil.rmtree(diretorio() / antigo, ignore_errors=True)
+
+
+def listar_nomes():
+    base = diretorio()
+    if not base.is_dir():
+        return []
+    return [item.name for item in base.iterdir() if NOME_RE.match(item.name)]
+
+
+def listar_perfis():
+    """
+    Metadados dos perfis gravados, mais recentes primeiro.
+    """
+    perfis = []
+    for nome in sorted(listar_nomes(), reverse=True):
+        try:
+            perfis.append(json.loads((diretorio() / nome / "meta.json").read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return perfis
+
+
+def caminho_perfil(nome):
+    """
+    Diretório do perfil, ou None se o nome for inválido ou não existir.
+    """
+    if not NOME_RE.match(nome):
+        return None
+    caminho = diretorio() / nome
+    return caminho if caminho.is_dir() else None
+
+
+def ler_perfil(nome):
+    """
+    Metadados, resumo e consultas do perfil, ou None.
+    """
+    caminho = caminho_perfil(nome)
+    if caminho is None:
+        return None
+    try:
+        return {
+            "meta": json.loads((caminho / "meta.json").read_text(encoding="utf-8")),
+            "resumo": (caminho / "resumo.txt").read_text(encoding="utf-8"),
+            "consultas": json.loads((caminho / "sql.json").read_text(encoding="utf-8")),
+        }
+    except (OSError, ValueError):
+        return None
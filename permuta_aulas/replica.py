@@ -0,0 +1,179 @@
+"""
+Réplica de leitura para as consultas pesadas da coordenação.
+
+As leituras feitas dentro de ``em_replica()`` (views marcadas com
+``@usar_replica``: estatísticas e exportações; geração dos relatórios; feed
+de calendário) vão para o alias REPLICA. Gravações, leituras dentro de
+transações no banco principal e todo o resto continuam no default, de modo
+que quem acabou de gravar lê o que gravou.
+
+Com SQLite a réplica é um segundo arquivo, copiado do principal pelo comando
+``atualizar_replica`` (API de backup online do SQLite): os dados lidos dela
+ficam defasados até a próxima cópia. Enquanto o arquivo não existir, ou se o
+alias não estiver em DATABASES, as leituras vão para o default. Nos testes a
+réplica espelha o default (TEST MIRROR) e as leituras também vão para ele.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+PAGINAS_POR_PASSO = 1024
+
+_estado = threading.local()
+
+
+def _sqlite(alias):
+    return connections[alias].vendor == "sqlite"
+
+
+def alias_leitura():
+    """
+    Alias das leituras marcadas: REPLICA, ou o default se não houver réplica
+    separada disponível.
+    """
+    if REPLICA not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+    nome = connections[REPLICA].settings_dict["NAME"]
+    if str(nome) == str(connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]):
+        # Espelho do default (testes)
+        return DEFAULT_DB_ALIAS
+    if _sqlite(REPLICA) and not os.path.exists(nome):
+        # Ainda não copiada: o SQLite criaria um banco vazio
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+def atualizada_em():
+    """
+    Momento (timestamp) dos dados da réplica SQLite, ou None quando não há
+    como saber (réplica de servidor ou sem réplica separada).
+    """
+    if alias_leitura() != REPLICA or not _sqlite(REPLICA):
+        return None
+    return os.path.getmtime(connections[REPLICA].settings_dict["NAME"])
+
+
+def atualizada_desde(momento):
+    """
+    Se as leituras marcadas já enxergam o que foi gravado em ``momento``.
+    """
+    atualizada = atualizada_em()
+    return atualizada is None or atualizada >= momento
+
+
+def na_replica():
+    return getattr(_estado, "profundidade", 0) > 0
+
+
+@contextmanager
+def em_replica():
+    """
+    As leituras dentro do bloco vão para a réplica (ver o módulo).
+    """
+    _estado.profundidade = getattr(_estado, "profundidade", 0) + 1
+    try:
+        yield
+    finally:
+        _estado.profundidade -= 1
+
+
+def _conteudo_na_replica(conteudo):
+    # Cada pedaço da resposta em streaming é gerado dentro de em_replica(),
+    # sem deixar o estado ligado entre um pedaço e outro
+    iterador = iter(conteudo)
+    while True:
+        with em_replica():
+            try:
+                parte = next(iterador)
+            except StopIteration:
+                return
+        yield parte
+
+
+def usar_replica(view):
+    """
+    Executa a view (e o corpo de respostas em streaming) lendo da réplica.
+    Deve vir depois do @login_required, para a autenticação ler do default.
+    """
+    @wraps(view)
+    def envolvida(request, *args, **kwargs):
+        with em_replica():
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _conteudo_na_replica(response.streaming_content)
+        return response
+
+    return envolvida
+
+
+class RoteadorReplica:
+    """
+    Envia para a réplica as leituras feitas dentro de em_replica(), exceto
+    dentro de transações no default; as gravações vão sempre para o default.
+    """
+
+    def db_for_read(self, model, **hints):
+        instancia = hints.get("instance")
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db
+        if not na_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias_leitura()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Os dois bancos têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O esquema da réplica vem junto com a cópia
+        return db == DEFAULT_DB_ALIAS
+
+
+def atualizar_replica(paginas=PAGINAS_POR_PASSO):
+    """
+    Copia o banco principal para a réplica SQLite. A cópia é feita em um
+    arquivo temporário, ``paginas`` páginas por passo (entre os passos o
+    principal aceita gravações), e renomeada sobre a réplica no final, então
+    as leituras nunca veem uma cópia pela metade. Retorna o tamanho em bytes.
+    """
+    if REPLICA not in settings.DATABASES:
+        raise ImproperlyConfigured(f"Não há o banco '{REPLICA}' em DATABASES.")
+    if not (_sqlite(DEFAULT_DB_ALIAS) and _sqlite(REPLICA)):
+        raise ImproperlyConfigured(
+            "A cópia só funciona com SQLite; em outros bancos use a replicação do servidor."
+        )
+
+    destino = Path(connections[REPLICA].settings_dict["NAME"])
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_name(destino.name + ".tmp")
+    inicio = time.time()
+
+    origem = connections[DEFAULT_DB_ALIAS]
+    origem.ensure_connection()
+    copia = sqlite3.connect(temporario)
+    try:
+        origem.connection.backup(copia, pages=paginas)
+    except BaseException:
+        copia.close()
+        temporario.unlink(missing_ok=True)
+        raise
+    copia.close()
+    os.replace(temporario, destino)
+    # A data do arquivo marca o momento dos dados (ver atualizada_em)
+    os.utime(destino, (inicio, inicio))
+    # Conexões abertas continuam no arquivo substituído até serem fechadas
+    # (a cada requisição, com CONN_MAX_AGE = 0)
+    connections[REPLICA].close()
+    return destino.stat().st_size
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,11 +49,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'permuta_aulas.estaticos.ArquivosEstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "django.middleware.locale.LocaleMiddleware",
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'permuta_aulas.perfilamento.PerfilamentoMiddleware',
+    'accounts.middleware.ProfessorMiddleware',
+    'audit.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,9 +90,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Réplica de leitura das consultas pesadas (ver permuta_aulas.replica),
+    # copiada do default pelo comando atualizar_replica. Enquanto o arquivo
+    # não existir, as leituras continuam no default.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['permuta_aulas.replica.RoteadorReplica']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -124,6 +140,89 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# Destino do collectstatic, servido por permuta_aulas.estaticos
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "permuta_aulas.estaticos.ArmazenamentoEstatico",
+    },
+}
+
+# Cache em disco dos comprovantes de permuta (PDF)
+COMPROVANTES_CACHE_DIR = BASE_DIR / "cache" / "comprovantes"
+
+# Relatórios gerados pelo comando processar_relatorios (ver permuta.relatorios)
+RELATORIOS_DIR = BASE_DIR / "cache" / "relatorios"
+# Pedidos iguais dentro desta janela (segundos) reaproveitam o mesmo relatório
+RELATORIOS_JANELA_COALESCENCIA = 300
+
+# Perfis de requisição da coordenação (ver permuta_aulas.perfilamento).
+# AMOSTRAGEM: fração das requisições de staff perfiladas sem pedido (0 = só
+# com ?_perfil=1 ou o cabeçalho X-Perfil: 1).
+PERFILAMENTO_DIR = BASE_DIR / "cache" / "perfis"
+PERFILAMENTO_AMOSTRAGEM = 0
+PERFILAMENTO_MAXIMO = 200
+
+# Processos do pool que gera os gráficos do dashboard (ver permuta.graficos).
+# Com 0, os gráficos são gerados no próprio processo da requisição.
+GRAFICOS_PROCESSOS = 2
+
+# Notificações e emails disparados após o commit rodam em uma thread de fundo.
+# Com False, rodam na própria requisição (útil em testes e depuração).
+NOTIFICACOES_ASSINCRONAS = True
+
+# Cache local do processo: feeds ICS e, com SESSAO_EM_CACHE e
+# PROFESSOR_EM_CACHE, sessões, usuário autenticado (accounts.backends) e
+# professor do usuário (accounts.perfil).
+# Com vários processos, troque por um cache compartilhado (Redis/Memcached)
+# para que logout e alterações de usuário valham em todos imediatamente.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "permuta-aulas",
+    },
+}
+
+# Sessão e usuário autenticado lidos do cache, sem consultas ao banco por
+# requisição (a sessão continua gravada no banco). Com False, os dois são
+# lidos do banco a cada requisição, como no padrão do Django.
+# Só vale com um cache compartilhado entre os processos: no LocMemCache, o
+# logout e a desativação de um usuário não chegam aos outros workers, que
+# continuam aceitando a sessão por até accounts.backends.TEMPO_CACHE segundos.
+SESSAO_EM_CACHE = False
+
+# Professor do usuário logado (com o User dele) lido do cache, sem consulta
+# por requisição (ver accounts.perfil). Mesma restrição: no LocMemCache, um
+# professor alterado continuaria desatualizado nos outros workers por até
+# accounts.perfil.TEMPO_CACHE segundos. Com False, o professor é lido do
+# banco uma vez por requisição.
+PROFESSOR_EM_CACHE = False
+
+CACHES_LOCAIS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+for _opcao, _ativa in (("SESSAO_EM_CACHE", SESSAO_EM_CACHE), ("PROFESSOR_EM_CACHE", PROFESSOR_EM_CACHE)):
+    if _ativa and CACHES["default"]["BACKEND"] in CACHES_LOCAIS:
+        raise ImproperlyConfigured(
+            f"{_opcao} exige um cache compartilhado entre os processos "
+            "(Redis/Memcached) em CACHES['default']."
+        )
+
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db"
+    if SESSAO_EM_CACHE
+    else "django.contrib.sessions.backends.db"
+)
+# O ModelBackend continua na lista para as sessões abertas antes da mudança
+AUTHENTICATION_BACKENDS = [
+    *(["accounts.backends.ModelBackendEmCache"] if SESSAO_EM_CACHE else []),
+    "django.contrib.auth.backends.ModelBackend",
+]
 
 # Configurações de autenticação
 LOGIN_URL = '/login/'  # URL para página de login
@@ -8,6 +8,7 @@ from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 
+from audit.views import historico_permuta, historico_usuario
 from permuta.views import (
     # Páginas principais
     home,
@@ -20,14 +21,18 @@ from permuta.views import (
     # Professor - Horários
     meus_horarios,
     solicitar_permuta,
+    solicitar_ausencia,
     calendario_horarios,
     api_eventos_calendario,
+    trocar_endereco_calendario,
+    feed_calendario,
     
     # Professor - Permutas
     minhas_permutas,
     detalhe_permuta,
     cancelar_permuta,
     comprovante_permuta_pdf,
+    exportar_comprovantes_zip,
     
     # Professor - Reposições
     registrar_reposicao,
@@ -41,12 +46,23 @@ from permuta.views import (
     dashboard_estatisticas,
     relatorio_permutas_excel,
     relatorio_permutas_pdf,
+    exportar_permutas_csv,
+    exportar_permutas_jsonl,
+    acompanhar_relatorio,
+    baixar_relatorio,
+    perfis_requisicoes,
+    perfil_requisicao,
+    baixar_perfil,
     
     # API
     api_permutas,
     api_permuta_detalhe,
+    api_horarios_reposicao,
+    api_sincronizar,
+    api_buscar_permutas,
     api_estatisticas,
     api_notificacoes_nao_lidas,
+    api_relatorio,
     
     # Notificações
     ler_notificacao,
@@ -99,11 +115,26 @@ urlpatterns = [
         api_eventos_calendario,
         name="api_eventos_calendario",
     ),
+    path(
+        "professor/calendario/trocar-endereco/",
+        trocar_endereco_calendario,
+        name="trocar_endereco_calendario",
+    ),
+    path(
+        "calendario/<str:token>/aulas.ics",
+        feed_calendario,
+        name="feed_calendario",
+    ),
     path(
         "professor/horarios/<int:horario_id>/solicitar-permuta/",
         solicitar_permuta,
         name="solicitar_permuta",
     ),
+    path(
+        "professor/ausencia/",
+        solicitar_ausencia,
+        name="solicitar_ausencia",
+    ),
 
     # ========================================================================
     # PROFESSOR - PERMUTAS
@@ -175,6 +206,46 @@ urlpatterns = [
         relatorio_permutas_pdf,
         name="relatorio_permutas_pdf",
     ),
+    path(
+        "coordenacao/exportar/permutas.csv",
+        exportar_permutas_csv,
+        name="exportar_permutas_csv",
+    ),
+    path(
+        "coordenacao/exportar/permutas.jsonl",
+        exportar_permutas_jsonl,
+        name="exportar_permutas_jsonl",
+    ),
+    path(
+        "coordenacao/relatorios/<int:tarefa_id>/",
+        acompanhar_relatorio,
+        name="acompanhar_relatorio",
+    ),
+    path(
+        "coordenacao/relatorios/<int:tarefa_id>/download/",
+        baixar_relatorio,
+        name="baixar_relatorio",
+    ),
+    path(
+        "coordenacao/perfis/",
+        perfis_requisicoes,
+        name="perfis_requisicoes",
+    ),
+    path(
+        "coordenacao/perfis/<str:nome>/",
+        perfil_requisicao,
+        name="perfil_requisicao",
+    ),
+    path(
+        "coordenacao/perfis/<str:nome>/download/",
+        baixar_perfil,
+        name="baixar_perfil",
+    ),
+    path(
+        "coordenacao/comprovantes/exportar/",
+        exportar_comprovantes_zip,
+        name="exportar_comprovantes_zip",
+    ),
 
     # ========================================================================
     # API
@@ -184,11 +255,21 @@ urlpatterns = [
         api_permutas,
         name="api_permutas",
     ),
+    path(
+        "api/permutas/busca/",
+        api_buscar_permutas,
+        name="api_buscar_permutas",
+    ),
     path(
         "api/permutas/<int:permuta_id>/",
         api_permuta_detalhe,
         name="api_permuta_detalhe",
     ),
+    path(
+        "api/permutas/<int:permuta_id>/horarios-reposicao/",
+        api_horarios_reposicao,
+        name="api_horarios_reposicao",
+    ),
     path(
         "api/estatisticas/",
         api_estatisticas,
@@ -199,6 +280,30 @@ urlpatterns = [
         api_notificacoes_nao_lidas,
         name="api_notificacoes",
     ),
+    path(
+        "api/sincronizacao/",
+        api_sincronizar,
+        name="api_sincronizar",
+    ),
+    path(
+        "api/relatorios/<int:tarefa_id>/",
+        api_relatorio,
+        name="api_relatorio",
+    ),
+
+    # ========================================================================
+    # AUDITORIA
+    # ========================================================================
+    path(
+        "api/permutas/<int:permuta_id>/historico/",
+        historico_permuta,
+        name="historico_permuta",
+    ),
+    path(
+        "api/auditoria/usuarios/<int:usuario_id>/",
+        historico_usuario,
+        name="historico_usuario",
+    ),
 
     # ========================================================================
     # NOTIFICAÇÕES